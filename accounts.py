@@ -0,0 +1,183 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+from dotenv import dotenv_values
+
+from http_transport import make_session, session_options, use_session
+
+
+# ==========================================
+# CONTAS DO SUPERVISOR MULTI-CONTA
+# ==========================================
+# Cada conta (sub-conta da Binance) tem:
+# - config própria: ambiente do processo + .env da conta + "env" do accounts.json
+# - diretório de dados próprio (DATA_DIR): DBs, snapshots e livro de exposição
+# - uma Session HTTP com pool de conexões, compartilhada pelas estratégias da conta
+# - um orçamento de requisições (balde de fichas) no lugar do throttle de cada cliente ccxt
+#
+# accounts.json:
+# {"accounts": [
+#   {"name": "principal", "env_file": "contas/principal.env", "strategies": ["grid_btc", "trend"],
+#    "rate_limit": 20, "burst": 40, "pool_size": 10, "env": {"MAX_BTC_USD": "50"}}
+# ]}
+
+ACCOUNT_NAME = re.compile(r"^[A-Za-z0-9_-]+$")
+# MODO_SIMULACAO ausente: o padrão de cada bot (bot_trend simula; os grids operam na conta real)
+SIMULATION_DEFAULTS = {"grid_btc": "false", "grid_ada": "false", "trend": "true"}
+
+
+class RateBudget:
+    """
+    Balde de fichas da conta, na unidade de custo do ccxt (1 = uma requisição de peso base).
+    acquire(cost) é instalado como `throttle` dos clientes ccxt da conta: todas as
+    estratégias disputam o mesmo orçamento, e uma conta não consome o de outra.
+    Quem chega com o balde vazio reserva a vez (saldo negativo) e dorme o necessário.
+    """
+
+    def __init__(self, rate, burst=None, wait_histogram=None, account=""):
+        self.rate = float(rate)
+        self.capacity = float(burst or rate)
+        self._tokens = self.capacity
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+        self._wait = wait_histogram
+        self._account = account
+
+    def acquire(self, cost=None):
+        cost = float(cost or 1)
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._stamp) * self.rate)
+            self._stamp = now
+            self._tokens -= cost
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+        if self._wait:
+            self._wait.observe(wait, account=self._account)
+        return wait
+
+
+class AccountLogger(logging.LoggerAdapter):
+    """
+    Logger da estratégia dentro do supervisor: acrescenta account/strategy ao registro
+    (prefixo no texto, campos no JSON) sem sobrescrever o extra de quem chama.
+    """
+
+    def process(self, msg, kwargs):
+        kwargs["extra"] = {**self.extra, **(kwargs.get("extra") or {})}
+        return msg, kwargs
+
+
+class Account:
+    def __init__(self, name, env, strategies, rate_limit=20, burst=None, pool_size=None, metrics=None,
+                 config_base=None, config_overrides=None):
+        self.name = name
+        self.env = env
+        # Recarga do .env da conta: o que fica abaixo dele e o que fica acima (ConfigWatcher)
+        self.config_base = env if config_base is None else config_base
+        self.config_overrides = config_overrides or {}
+        self.strategies = list(strategies)
+        self.data_dir = env["DATA_DIR"]
+
+        # Pool de conexões keep-alive da conta (HTTP_* da conta; pool_size do accounts.json tem prioridade)
+        options = session_options(env)
+        if pool_size:
+            options["pool_size"] = int(pool_size)
+        self.session = make_session(f"binance_{name}", metrics=metrics, **options)
+
+        wait = None
+        if metrics is not None:
+            wait = metrics.histogram(
+                "rate_budget_wait_seconds", "Espera pelo orçamento de requisições da conta", ("account",),
+                buckets=(0, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+            )
+        self.budget = RateBudget(rate_limit, burst, wait, account=name)
+
+    def logger(self, strategy):
+        return AccountLogger(
+            logging.getLogger(f"{strategy}.{self.name}"), {"account": self.name, "strategy": strategy}
+        )
+
+    def attach(self, client, metrics=None):
+        """
+        Liga um cliente ccxt recém-criado à conta: Session compartilhada e orçamento de requisições.
+        `metrics` (registro do bot) também passa a receber as métricas de transporte da conta.
+        """
+        self.session.transport_stats.attach(metrics)
+        use_session(client, self.session)
+        client.throttle = self.budget.acquire
+        return client
+
+
+def load_accounts(path, known_strategies, metrics=None):
+    """
+    Lê o accounts.json e monta as contas. ValueError com a primeira inconsistência encontrada.
+    """
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    entries = data.get("accounts") if isinstance(data, dict) else data
+    if not entries:
+        raise ValueError(f"{path}: nenhuma conta configurada")
+
+    base_dir = os.path.dirname(os.path.abspath(path))
+    accounts, names = [], set()
+    for entry in entries:
+        name = str(entry.get("name", ""))
+        if not ACCOUNT_NAME.match(name):
+            raise ValueError(f"Nome de conta inválido: {name!r} (use letras, números, _ ou -)")
+        if name in names:
+            raise ValueError(f"Conta duplicada: {name}")
+        names.add(name)
+
+        strategies = entry.get("strategies") or []
+        unknown = [s for s in strategies if s not in known_strategies]
+        if not strategies or unknown:
+            raise ValueError(
+                f"Conta {name}: estratégias inválidas {unknown or strategies} "
+                f"(disponíveis: {', '.join(sorted(known_strategies))})"
+            )
+
+        env_file = entry.get("env_file")
+        if env_file:
+            env_file = os.path.join(base_dir, env_file)
+            if not os.path.exists(env_file):
+                raise ValueError(f"Conta {name}: arquivo {env_file} não encontrado")
+        data_dir = os.path.join(base_dir, entry.get("data_dir") or os.path.join("contas", name))
+        os.makedirs(data_dir, exist_ok=True)
+
+        # Ambiente do processo < padrões da conta < .env da conta < "env" do accounts.json
+        base = dict(os.environ)
+        base.update({
+            "DATA_DIR": data_dir,
+            "CONFIG_FILE": env_file or "",
+            "METRICS_PORT": "0",
+            "TREND_METRICS_PORT": "0",
+        })
+        overrides = {k: str(v) for k, v in (entry.get("env") or {}).items()}
+        env = dict(base)
+        if env_file:
+            env.update({k: v for k, v in dotenv_values(env_file).items() if v is not None})
+        env.update(overrides)
+
+        live = [
+            s for s in strategies
+            if env.get("MODO_SIMULACAO", SIMULATION_DEFAULTS.get(s, "false")).lower() != "true"
+        ]
+        if live and not (env.get("BINANCE_API_KEY") and env.get("BINANCE_SECRET_KEY")):
+            raise ValueError(f"Conta {name}: BINANCE_API_KEY/BINANCE_SECRET_KEY ausentes ({', '.join(live)})")
+
+        accounts.append(Account(
+            name, env, strategies,
+            rate_limit=float(entry.get("rate_limit", 20)),
+            burst=entry.get("burst"),
+            pool_size=entry.get("pool_size"),
+            metrics=metrics,
+            config_base=base,
+            config_overrides=overrides,
+        ))
+    return accounts
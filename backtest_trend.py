@@ -0,0 +1,421 @@
+import argparse
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+from trend_scanner import CandleStore, adx, atr, supertrend, timeframe_seconds
+
+
+# ==========================================
+# BACKTEST + WALK-FORWARD DO TREND BOT
+# ==========================================
+# Reproduz as regras do TrendBot.step() candle a candle (no fechamento):
+# - líquido: compra quando o SuperTrend vira para alta e o ADX > ADX_THRESHOLD,
+#   gastando RISK_PER_TRADE do saldo livre; stop inicial = linha do SuperTrend
+# - comprado: vende na inversão do SuperTrend ou no preço abaixo do stop;
+#   senão o stop sobe junto com a linha do SuperTrend (trailing)
+# Os indicadores são os mesmos do bot (trend_scanner reproduz ta/calculate_supertrend),
+# recalculados em cada candle sobre a janela de 100 candles que o bot busca (as
+# janelas viram linhas das matrizes), e a simulação é vetorizada: cada linha é uma
+# combinação de parâmetros.
+#
+# Walk-forward: janelas de treino/teste que andam no tempo; em cada treino escolhe
+# a combinação de maior Sharpe, avaliada no teste seguinte (fora da amostra).
+# As combinações são avaliadas em paralelo (um processo por SUPERTREND_PERIOD).
+#
+# python backtest_trend.py --fetch-days 730                 # baixa histórico + backtest da config atual
+# python backtest_trend.py --optimize --workers 8           # walk-forward na grade padrão
+
+INITIAL_BALANCE = 1000.0
+MIN_ORDER_USD = 5.0
+WARMUP_BARS = 100           # o bot calcula os indicadores sobre 100 candles
+ADX_WINDOW = 14
+WINDOW_CHUNK = 20000        # janelas por bloco no cálculo dos indicadores (limita a memória)
+
+DEFAULT_PERIODS = (7, 10, 14, 20)
+DEFAULT_MULTIPLIERS = (2.0, 2.5, 3.0, 3.5, 4.0)
+DEFAULT_THRESHOLDS = (20, 25, 30)
+
+
+# ==========================================
+# HISTÓRICO LOCAL
+# ==========================================
+
+def download_history(exchange, store, symbol, timeframe, days, logger=None):
+    """
+    Completa o armazém com os candles dos últimos `days` dias (páginas de 1000, a partir do último gravado).
+    """
+    tf_ms = timeframe_seconds(timeframe) * 1000
+    now_ms = int(time.time() * 1000)
+    last = store.last_timestamps(timeframe).get(symbol)
+    since = max(last or 0, now_ms - int(days * 86400 * 1000))
+    total = 0
+    while since < now_ms:
+        rows = exchange.fetch_ohlcv(symbol, timeframe, since=since, limit=1000)
+        if not rows:
+            break
+        store.save(symbol, timeframe, rows)
+        total += len(rows)
+        since = int(rows[-1][0]) + tf_ms
+        if len(rows) < 1000:
+            break
+    store.commit()
+    if logger:
+        logger.info(f"Histórico {symbol} {timeframe}: {total} candles baixados")
+    return total
+
+
+def load_history(store, symbol, timeframe):
+    """
+    (ts, high, low, close) dos candles já fechados, em ordem cronológica.
+    """
+    tf_ms = timeframe_seconds(timeframe) * 1000
+    rows = store.history(symbol, timeframe)
+    now_ms = int(time.time() * 1000)
+    rows = [r for r in rows if r[0] + tf_ms <= now_ms]
+    if not rows:
+        return np.empty(0), np.empty(0), np.empty(0), np.empty(0)
+    data = np.array(rows, dtype=float)
+    return data[:, 0], data[:, 2], data[:, 3], data[:, 4]
+
+
+def load_csv(path):
+    data = np.genfromtxt(path, delimiter=",", names=True)
+    return data["timestamp"], data["high"], data["low"], data["close"]
+
+
+# ==========================================
+# SIMULAÇÃO VETORIZADA
+# ==========================================
+
+def indicators(high, low, close, period, multipliers, window=WARMUP_BARS):
+    """
+    Como o bot: em cada candle t os indicadores saem dos `window` candles que terminam
+    em t (fetch_ohlcv limit=100) — sementes de Wilder (ATR, ADX) e bandas do SuperTrend
+    dependem do início da janela. Cada janela é uma linha; fica o fim de cada uma.
+    Retorna linha, tendência e tendência do candle anterior (da mesma janela, como
+    df.iloc[-2]) por multiplicador, (L, T), e o ADX (T,); antes de window - 1 sem sinal.
+    """
+    from numpy.lib.stride_tricks import sliding_window_view
+
+    n, rows = len(close), len(multipliers)
+    line = np.full((rows, n), np.nan)
+    uptrend = np.zeros((rows, n), dtype=bool)
+    prev_uptrend = np.zeros((rows, n), dtype=bool)
+    adx_values = np.full(n, np.nan)
+    if n < window:
+        return line, uptrend, prev_uptrend, adx_values
+
+    views = [sliding_window_view(x, window) for x in (high, low, close)]
+    for first in range(0, n - window + 1, WINDOW_CHUNK):
+        h, l, c = (v[first:first + WINDOW_CHUNK] for v in views)
+        at = slice(first + window - 1, first + window - 1 + len(c))
+        adx_values[at] = adx(h, l, c, ADX_WINDOW)[:, -1]
+        atr_values = atr(h, l, c, period)
+        for k, multiplier in enumerate(multipliers):
+            st_line, st_up = supertrend(h, l, c, atr_values, float(multiplier))
+            line[k, at] = st_line[:, -1]
+            uptrend[k, at] = st_up[:, -1]
+            prev_uptrend[k, at] = st_up[:, -2]
+    return line, uptrend, prev_uptrend, adx_values
+
+
+def simulate(close, line, uptrend, prev_uptrend, adx_values, thresholds, risks, fee, starts, length, rows=None):
+    """
+    Regras do TrendBot.step() para várias simulações de uma vez, cada uma andando
+    `length` candles a partir do seu candle inicial (`starts`: int ou um por simulação).
+    close/adx_values: (T,); line/uptrend/prev_uptrend: (L, T), `rows` diz a linha de cada simulação
+    (padrão: uma simulação por linha); thresholds/risks: um por simulação.
+    Retorna (equity (R, length), entradas por simulação).
+    """
+    thresholds = np.asarray(thresholds, dtype=float)
+    risks = np.asarray(risks, dtype=float)
+    n = len(thresholds)
+    rows = np.arange(n) if rows is None else np.asarray(rows)
+    starts = np.broadcast_to(np.asarray(starts), (n,))
+
+    cash = np.full(n, INITIAL_BALANCE)
+    qty = np.zeros(n)
+    stop = np.zeros(n)
+    in_position = np.zeros(n, dtype=bool)
+    entries = np.zeros(n, dtype=int)
+    equity = np.empty((n, length))
+
+    for j in range(length):
+        t = starts + j
+        price = close[t]
+        up = uptrend[rows, t]
+        level = line[rows, t]
+        held = in_position.copy()
+
+        # Comprado: inversão de tendência, stop loss ou trailing até a linha do SuperTrend
+        sell = held & (~up | (price < stop))
+        cash = np.where(sell, cash + qty * price * (1 - fee), cash)
+        qty = np.where(sell, 0.0, qty)
+        in_position &= ~sell
+        stop = np.where(in_position & (level > stop), level, stop)
+
+        # Líquido: virada para alta com ADX acima do limite (taxa da compra sai no ativo)
+        cost = cash * risks
+        buy = ~held & up & ~prev_uptrend[rows, t] & (adx_values[t] > thresholds) & (cost >= MIN_ORDER_USD)
+        qty = np.where(buy, cost / price * (1 - fee), qty)
+        cash = np.where(buy, cash - cost, cash)
+        stop = np.where(buy, level, stop)
+        in_position |= buy
+        entries += buy
+
+        equity[:, j] = cash + qty * price
+    return equity, entries
+
+
+def performance(equity, bars_per_year):
+    """
+    Sharpe anualizado, drawdown máximo e retorno total de cada linha da curva de capital.
+    """
+    curve = np.concatenate([np.full((equity.shape[0], 1), INITIAL_BALANCE), equity], axis=1)
+    returns = curve[:, 1:] / curve[:, :-1] - 1
+    std = returns.std(axis=1)
+    sharpe = np.divide(returns.mean(axis=1), std, out=np.zeros_like(std), where=std > 0) * np.sqrt(bars_per_year)
+    drawdown = (1 - curve / np.maximum.accumulate(curve, axis=1)).max(axis=1)
+    return sharpe, drawdown, curve[:, -1] / INITIAL_BALANCE - 1
+
+
+# ==========================================
+# WALK-FORWARD (PROCESSOS EM PARALELO)
+# ==========================================
+
+_history = {}
+
+
+def _init_worker(high, low, close):
+    _history.update(high=high, low=low, close=close)
+
+
+def _evaluate_period(period, combos, folds, fee, bars_per_year, min_trades):
+    """
+    No processo filho: todas as combinações (multiplicador, ADX, risco) de um SUPERTREND_PERIOD
+    em todas as janelas, numa única simulação por fase (janelas × combinações linhas).
+    Retorna (Sharpe de treino, curva de teste, entradas no teste), indexados por [janela, combinação].
+    """
+    # SuperTrend uma vez por multiplicador, compartilhado pelas combinações de ADX/risco
+    multipliers, row = np.unique([c[0] for c in combos], return_inverse=True)
+    line, uptrend, prev_uptrend, adx_values = indicators(
+        _history["high"], _history["low"], _history["close"], period, multipliers
+    )
+
+    shape = (len(folds), len(combos))
+    rows = np.tile(row, len(folds))
+    thresholds = np.tile([c[1] for c in combos], len(folds))
+    risks = np.tile([c[2] for c in combos], len(folds))
+
+    def run(starts, length):
+        return simulate(
+            _history["close"], line, uptrend, prev_uptrend, adx_values, thresholds, risks, fee,
+            np.repeat(starts, len(combos)), length, rows=rows,
+        )
+
+    train_start, train_end, test_end = (np.array(x) for x in zip(*folds))
+    equity, entries = run(train_start, int(train_end[0] - train_start[0]))
+    sharpe, _drawdown, _ret = performance(equity, bars_per_year)
+    scores = np.where(entries >= min_trades, sharpe, -np.inf).reshape(shape)
+
+    # Teste de todas as combinações (o processo principal fica só com a escolhida de cada janela)
+    test_equity, test_entries = run(train_end, int(test_end[0] - train_end[0]))
+    return period, scores, test_equity.reshape(shape + (-1,)), test_entries.reshape(shape)
+
+
+def make_folds(length, train_bars, test_bars, warmup=WARMUP_BARS):
+    folds, start = [], warmup
+    while start + train_bars + test_bars <= length:
+        folds.append((start, start + train_bars, start + train_bars + test_bars))
+        start += test_bars
+    return folds
+
+
+def backtest(high, low, close, params, fee, start, end):
+    period, multiplier, threshold, risk = params
+    line, uptrend, prev_uptrend, adx_values = indicators(high, low, close, period, [multiplier])
+    return simulate(close, line, uptrend, prev_uptrend, adx_values, [threshold], [risk], fee, start, end - start)
+
+
+def walk_forward(high, low, close, grid, train_bars, test_bars, fee, bars_per_year, workers=None, min_trades=3):
+    """
+    grid: {period: [(multiplier, adx_threshold, risk), ...]}.
+    Retorna (folds com os parâmetros escolhidos e o desempenho fora da amostra, curva OOS encadeada,
+    janelas puladas). Janela em que nenhuma combinação chega a min_trades entradas no treino
+    não tem parâmetro escolhido: fica fora dos resultados e da curva OOS.
+    """
+    folds = make_folds(len(close), train_bars, test_bars)
+    if not folds:
+        raise ValueError(f"histórico curto: {len(close)} candles para treino {train_bars} + teste {test_bars}")
+
+    evaluated = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(high, low, close)) as pool:
+        futures = [
+            pool.submit(_evaluate_period, period, combos, folds, fee, bars_per_year, min_trades)
+            for period, combos in grid.items()
+        ]
+        for future in futures:
+            period, scores, test_equity, test_entries = future.result()
+            evaluated[period] = (scores, test_equity, test_entries)
+
+    results, oos_curve, skipped, capital = [], [], [], INITIAL_BALANCE
+    for k, (train_start, train_end, test_end) in enumerate(folds):
+        best_score, period, i = max(
+            (evaluated[period][0][k, i], period, i) for period, combos in grid.items() for i in range(len(combos))
+        )
+        if not np.isfinite(best_score):
+            skipped.append({"train": (train_start, train_end), "test": (train_end, test_end)})
+            continue
+        best = (period,) + tuple(grid[period][i])
+        equity = evaluated[period][1][k, i]
+        entries = evaluated[period][2][k, i]
+        sharpe, drawdown, ret = performance(equity[None, :], bars_per_year)
+        # Cada janela de teste começa com o saldo final da anterior
+        oos_curve.append(equity / INITIAL_BALANCE * capital)
+        capital = oos_curve[-1][-1]
+        results.append({
+            "train": (train_start, train_end),
+            "test": (train_end, test_end),
+            "params": best,
+            "train_sharpe": float(best_score),
+            "sharpe": float(sharpe[0]),
+            "drawdown": float(drawdown[0]),
+            "return": float(ret[0]),
+            "trades": int(entries),
+        })
+    return results, np.concatenate(oos_curve) if oos_curve else np.empty(0), skipped
+
+
+def parse_list(text, cast):
+    return tuple(cast(x) for x in text.split(",") if x.strip())
+
+
+def fmt_ts(ms):
+    return datetime.fromtimestamp(ms / 1000).strftime("%Y-%m-%d")
+
+
+def main():
+    from dotenv import load_dotenv
+
+    from log_setup import setup_logging
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Backtest e walk-forward do TrendBot (SuperTrend + ADX)")
+    parser.add_argument("--symbol", default=os.getenv("SYMBOL_TREND", "BTC/USDT"))
+    parser.add_argument("--timeframe", default=os.getenv("TREND_TIMEFRAME", "1h"))
+    parser.add_argument("--csv", help="candles em CSV (timestamp,open,high,low,close,volume) no lugar do armazém")
+    parser.add_argument("--fetch-days", type=float, default=0, help="baixa/completa N dias de histórico antes")
+    parser.add_argument("--fee", type=float, default=float(os.getenv("SIM_TAKER_FEE", 0.001)))
+    parser.add_argument("--optimize", action="store_true", help="walk-forward na grade de parâmetros")
+    parser.add_argument("--train-days", type=float, default=90)
+    parser.add_argument("--test-days", type=float, default=30)
+    parser.add_argument("--periods", default=",".join(map(str, DEFAULT_PERIODS)))
+    parser.add_argument("--multipliers", default=",".join(map(str, DEFAULT_MULTIPLIERS)))
+    parser.add_argument("--thresholds", default=",".join(map(str, DEFAULT_THRESHOLDS)))
+    parser.add_argument("--risks", default=os.getenv("TREND_RISK_PER_TRADE", "0.10"))
+    parser.add_argument("--min-trades", type=int, default=3, help="mínimo de entradas no treino")
+    parser.add_argument("--workers", type=int, default=None, help="processos (padrão: núcleos da máquina)")
+    parser.add_argument("--output", help="arquivo JSON com o resultado")
+    args = parser.parse_args()
+
+    logger = setup_logging("TrendBacktest", os.getenv("TREND_BACKTEST_LOG_FILE", "trend_backtest.log"), prefix="[BT] ")
+    if args.csv:
+        ts, high, low, close = load_csv(args.csv)
+    else:
+        store = CandleStore(os.getenv("BACKTEST_CANDLE_DB", os.path.join(os.getenv("DATA_DIR", ""), "backtest_candles.db")))
+        if args.fetch_days:
+            from fast_start import ccxt
+            from http_transport import session_options, shared_session, use_session
+
+            exchange = ccxt.binance({'enableRateLimit': True, 'options': {'defaultType': 'spot'}})
+            use_session(exchange, shared_session("binance", **session_options(os.environ)))
+            download_history(exchange, store, args.symbol, args.timeframe, args.fetch_days, logger)
+        ts, high, low, close = load_history(store, args.symbol, args.timeframe)
+        store.close()
+    if len(close) <= WARMUP_BARS + 1:
+        logger.error(f"Histórico insuficiente: {len(close)} candles de {args.symbol} {args.timeframe}")
+        return
+
+    bars_per_year = 365 * 86400 / timeframe_seconds(args.timeframe)
+    print(f"{args.symbol} {args.timeframe}: {len(close)} candles de {fmt_ts(ts[0])} a {fmt_ts(ts[-1])}")
+    report = {"symbol": args.symbol, "timeframe": args.timeframe, "candles": len(close), "fee": args.fee}
+
+    # Config atual (.env) sobre todo o histórico
+    current = (
+        int(os.getenv("TREND_SUPERTREND_PERIOD", 10)),
+        float(os.getenv("TREND_SUPERTREND_MULTIPLIER", 3.0)),
+        float(os.getenv("TREND_ADX_THRESHOLD", 25)),
+        float(os.getenv("TREND_RISK_PER_TRADE", 0.10)),
+    )
+    equity, entries = backtest(high, low, close, current, args.fee, WARMUP_BARS, len(close))
+    sharpe, drawdown, ret = performance(equity, bars_per_year)
+    print(
+        f"Config atual {current}: Sharpe {sharpe[0]:.2f} | drawdown {drawdown[0] * 100:.1f}% | "
+        f"retorno {ret[0] * 100:.1f}% | {entries[0]} entradas"
+    )
+    report["current"] = {"params": current, "sharpe": float(sharpe[0]), "drawdown": float(drawdown[0]),
+                         "return": float(ret[0]), "trades": int(entries[0])}
+
+    if args.optimize:
+        bars_per_day = 86400 / timeframe_seconds(args.timeframe)
+        combos = list(itertools.product(
+            parse_list(args.multipliers, float), parse_list(args.thresholds, float), parse_list(args.risks, float)
+        ))
+        grid = {period: combos for period in parse_list(args.periods, int)}
+        started = time.perf_counter()
+        folds, curve, skipped = walk_forward(
+            high, low, close, grid,
+            int(args.train_days * bars_per_day), int(args.test_days * bars_per_day),
+            args.fee, bars_per_year, args.workers, args.min_trades,
+        )
+        elapsed = time.perf_counter() - started
+        print(
+            f"\nWalk-forward: {len(grid) * len(combos)} combinações × {len(folds) + len(skipped)} janelas "
+            f"em {elapsed:.1f}s"
+        )
+        for f in skipped:
+            print(
+                f"  teste {fmt_ts(ts[f['test'][0]])}..{fmt_ts(ts[f['test'][1] - 1])} | pulada: nenhuma combinação "
+                f"com {args.min_trades}+ entradas no treino"
+            )
+        report["walk_forward"] = {"folds": folds, "skipped": skipped, "seconds": elapsed}
+        if not folds:
+            logger.error("Walk-forward sem janelas válidas (reduza --min-trades ou aumente --train-days)")
+        else:
+            for f in folds:
+                period, multiplier, threshold, risk = f["params"]
+                print(
+                    f"  teste {fmt_ts(ts[f['test'][0]])}..{fmt_ts(ts[f['test'][1] - 1])} | "
+                    f"período {period} mult {multiplier} ADX {threshold:g} risco {risk:g} | "
+                    f"treino Sharpe {f['train_sharpe']:.2f} -> teste Sharpe {f['sharpe']:.2f}, "
+                    f"DD {f['drawdown'] * 100:.1f}%, {f['trades']} entradas"
+                )
+            sharpe, drawdown, ret = performance(curve[None, :], bars_per_year)
+            trades = sum(f["trades"] for f in folds)
+            print(
+                f"Fora da amostra: Sharpe {sharpe[0]:.2f} | drawdown {drawdown[0] * 100:.1f}% | "
+                f"retorno {ret[0] * 100:.1f}% | {trades} entradas"
+            )
+            last = folds[-1]["params"]
+            print(
+                f"Parâmetros da última janela (.env): TREND_SUPERTREND_PERIOD={last[0]} "
+                f"TREND_SUPERTREND_MULTIPLIER={last[1]} TREND_ADX_THRESHOLD={last[2]:g} TREND_RISK_PER_TRADE={last[3]:g}"
+            )
+            report["walk_forward"]["oos"] = {
+                "sharpe": float(sharpe[0]), "drawdown": float(drawdown[0]), "return": float(ret[0]), "trades": trades,
+            }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResultado salvo em {args.output}")
+
+
+if __name__ == "__main__":
+    main()
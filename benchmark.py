@@ -0,0 +1,434 @@
+import argparse
+import json
+import logging
+import os
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from book_ticker import BookTicker
+from fee_normalizer import FeeNormalizer
+from sim_exchange import SimExchange, RecordedPriceFeed
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+# ==========================================
+# INSTRUMENTAÇÃO (CHAMADAS À EXCHANGE / SQL)
+# ==========================================
+
+class CountingExchange:
+    """
+    Proxy que conta as chamadas feitas à exchange (fake) por método.
+    """
+
+    def __init__(self, client):
+        self._client = client
+        self.calls = defaultdict(int)
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+
+        def counted(*args, **kwargs):
+            self.calls[name] += 1
+            return attr(*args, **kwargs)
+
+        return counted
+
+
+class StatementCounter:
+    """
+    Conta statements SQL executados em todas as conexões abertas durante o benchmark.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self._connections = []
+        self._original_connect = sqlite3.connect
+
+    def _trace(self, _sql):
+        self.count += 1
+
+    def attach(self, conn):
+        conn.set_trace_callback(self._trace)
+        self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def patch_connect(self):
+        original = self._original_connect
+
+        def connect(*args, **kwargs):
+            return self.attach(original(*args, **kwargs))
+
+        sqlite3.connect = connect
+        try:
+            yield
+        finally:
+            sqlite3.connect = original
+
+
+def fake_exchange(price, quote_balance=1_000_000.0, base_balance=10.0):
+    feed = RecordedPriceFeed([{'last': price, 'bid': price - 1, 'ask': price + 1}])
+    sim = SimExchange(None, feed, balances={'USDT': quote_balance, 'BTC': base_balance})
+    return CountingExchange(sim)
+
+
+# ==========================================
+# MONTAGEM DO GRIDBOT SEM REDE
+# ==========================================
+
+def make_grid_bot(levels, price=60000.0, ledger=True):
+    """
+    Cria um GridBot com config do .env padrão, DB local no diretório atual e exchange fake.
+    ledger=False desliga o livro global de exposição (cálculo local).
+    """
+    from bot_grid_btc import GridBot
+
+    if ledger:
+        os.environ.pop('EXPOSURE_LEDGER_DB', None)
+    else:
+        os.environ['EXPOSURE_LEDGER_DB'] = ''
+
+    os.environ.update({
+        'MODO_SIMULACAO': 'false',
+        'TELEGRAM_TOKEN': '',
+        'TELEGRAM_CHAT_ID': '',
+        'GRID_LEVELS': str(levels),
+        # Faixa larga o suficiente para caber todos os níveis abaixo do preço
+        'GRID_LOWER_PRICE': str(price - 100 * levels - 200),
+        'GRID_UPPER_PRICE': str(price + 100),
+        'AMOUNT_PER_GRID_USDT': '15',
+        'MAX_BTC_USD': '1e12',
+        'BUY_OFFSET': '10',
+        'METRICS_PORT': '0',
+        'METRICS_SNAPSHOT_SECONDS': '0',
+    })
+
+    bot = GridBot.__new__(GridBot)
+    bot.account = None
+    bot.logger = logging.getLogger("GridBotBench")
+    bot.logger.disabled = True
+    bot._load_config()
+    bot._setup_metrics()
+    bot._init_db()
+    bot.exchange = fake_exchange(price)
+    bot.fees = FeeNormalizer(bot.exchange, bot.BASE_ASSET, bot.QUOTE_ASSET, bot.logger)
+    bot.book = BookTicker(bot.SYMBOL, 0.01)
+    bot.min_amount = 0.00001
+    bot.min_cost = 5
+    bot.grid_paused_low_balance = False
+    return bot
+
+
+def seed_open_orders(bot, n, price):
+    now = datetime.now().isoformat()
+    rows = []
+    for i in range(n):
+        side = 'BUY' if i % 2 == 0 else 'SELL'
+        # Longe do preço atual: mede o caminho "nenhuma ordem executada"
+        level = price - 5000 - i if side == 'BUY' else price + 5000 + i
+        rows.append((i, f"BENCH_{i}", level, side, 0.0003, 'OPEN', now))
+    bot.cursor.executemany(
+        "INSERT INTO active_grids (grid_index, order_id, price, side, amount, status, updated_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        rows
+    )
+    bot.conn.commit()
+
+
+def seed_filled_orders(conn, n):
+    start = datetime.now() - timedelta(days=365)
+    rows = []
+    for i in range(n):
+        ts = (start + timedelta(seconds=i * 300)).isoformat()
+        side = 'BUY' if i % 2 == 0 else 'SELL'
+        rows.append((i % 30, f"F_{i}", side, 60000.0 + (i % 50), 0.0003, 0.0000003, 'BTC', ts, i % 4 == 0))
+    conn.executemany(
+        "INSERT INTO filled_orders (grid_index, order_id, side, price, amount, fee, fee_currency, timestamp, used_in_cycle) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        rows
+    )
+    conn.commit()
+
+
+def seed_year_of_profits(conn, per_day=100):
+    start = datetime.now() - timedelta(days=365)
+    profits, real = [], []
+    for i in range(365 * per_day):
+        ts = (start + timedelta(seconds=i * 86400 // per_day)).isoformat()
+        gross = random.uniform(0.05, 0.2)
+        net = gross - 0.03
+        profits.append((gross, ts))
+        real.append((f"R_{i}", gross, net, 60000.0, 60600.0, 0.0003, 0.015, 0.015, ts))
+    conn.executemany("INSERT INTO profits (profit_usdt, timestamp) VALUES (?, ?)", profits)
+    conn.executemany(
+        "INSERT INTO real_profits (order_id, gross_profit, net_profit, buy_price, sell_price, amount, buy_fee, sell_fee, timestamp) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        real
+    )
+    conn.commit()
+
+    # Relatório lê dos rollups: deixa-os prontos para medir o estado estável
+    import profit_rollups
+    profit_rollups.backfill(conn, 'BTC/USDT')
+
+
+def random_candles(n, start_price=60000.0):
+    import pandas as pd
+
+    rnd = random.Random(42)
+    rows, price = [], start_price
+    for i in range(n):
+        o = price
+        price = max(1.0, price * (1 + rnd.gauss(0, 0.004)))
+        h = max(o, price) * (1 + abs(rnd.gauss(0, 0.002)))
+        l = min(o, price) * (1 - abs(rnd.gauss(0, 0.002)))
+        rows.append([i * 3_600_000, o, h, l, price, rnd.uniform(1, 100)])
+    return pd.DataFrame(rows, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+
+
+# ==========================================
+# EXECUÇÃO DOS CENÁRIOS
+# ==========================================
+
+def measure(name, setup, fn, repeat=5):
+    """
+    Roda fn `repeat` vezes medindo tempo, e uma vez extra sob tracemalloc para pico de memória.
+    setup() devolve (ctx, exchange, stmt_counter) e é chamado antes de cada rodada.
+    """
+    times, calls, stmts = [], [], []
+
+    for _ in range(repeat):
+        ctx, exchange, counter = setup()
+        base_calls = sum(exchange.calls.values()) if exchange else 0
+        base_stmts = counter.count
+        with counter.patch_connect():
+            t0 = time.perf_counter()
+            fn(ctx)
+            times.append(time.perf_counter() - t0)
+        calls.append((sum(exchange.calls.values()) - base_calls) if exchange else 0)
+        stmts.append(counter.count - base_stmts)
+
+    ctx, _exchange, counter = setup()
+    tracemalloc.start()
+    with counter.patch_connect():
+        fn(ctx)
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    result = {
+        'name': name,
+        'wall_ms_min': round(min(times) * 1000, 3),
+        'wall_ms_median': round(statistics.median(times) * 1000, 3),
+        'exchange_calls': calls[-1],
+        'db_statements': stmts[-1],
+        'peak_mem_kb': round(peak / 1024, 1),
+    }
+    print(
+        f"{name:45s} {result['wall_ms_median']:10.2f} ms  "
+        f"calls={result['exchange_calls']:6d}  sql={result['db_statements']:7d}  "
+        f"peak={result['peak_mem_kb']:10.1f} KB"
+    )
+    return result
+
+
+def bench_check_orders(n_open, repeat):
+    price = 60000.0
+
+    def setup():
+        if os.path.exists("grid_data.db"):
+            os.remove("grid_data.db")
+        bot = make_grid_bot(levels=max(n_open, 10), price=price)
+        seed_open_orders(bot, n_open, price)
+        counter = StatementCounter()
+        counter.attach(bot.conn)
+        return bot, bot.exchange, counter
+
+    return measure(f"GridBot.check_orders [{n_open} OPEN]", setup, lambda bot: bot.check_orders(), repeat)
+
+
+def bench_initialize_grid(levels, repeat):
+    price = 60000.0
+
+    def setup():
+        if os.path.exists("grid_data.db"):
+            os.remove("grid_data.db")
+        bot = make_grid_bot(levels=levels, price=price)
+        counter = StatementCounter()
+        counter.attach(bot.conn)
+        return bot, bot.exchange, counter
+
+    return measure(f"GridBot.initialize_grid [{levels} níveis]", setup, lambda bot: bot.initialize_grid(), repeat)
+
+
+def bench_exposure(n_open, repeat):
+    """
+    Leitura da exposição pelos dois caminhos reais: livro global (uma linha de
+    exposure_totals, na conexão do livro) e cálculo local (BUYs OPEN + saldo livre).
+    Lotes abertos já estão em memória nos dois: o histórico de fills não é lido.
+    """
+    price = 60000.0
+    results = []
+    for ledger in (True, False):
+        def setup():
+            if os.path.exists("grid_data.db"):
+                os.remove("grid_data.db")
+            bot = make_grid_bot(levels=max(n_open, 10), price=price, ledger=ledger)
+            seed_open_orders(bot, n_open, price)
+            counter = StatementCounter()
+            counter.attach(bot.conn)
+            if bot.exposure is not None:
+                bot._sync_exposure()
+                counter.attach(bot.exposure.conn)
+            return bot, bot.exchange, counter
+
+        label = "livro" if ledger else "local"
+        results.append(measure(
+            f"get_total_btc_exposure_usd [{label}, {n_open} OPEN]", setup,
+            lambda bot: bot.get_total_btc_exposure_usd(price), repeat
+        ))
+    return results
+
+
+def bench_rebuild_real_profits(n_rows, repeat):
+    import lot_ledger
+
+    if os.path.exists("grid_data.db"):
+        os.remove("grid_data.db")
+    seeded = make_grid_bot(levels=30)
+    seed_filled_orders(seeded.conn, n_rows)
+    seeded.conn.close()
+
+    def setup():
+        bot = make_grid_bot(levels=30)
+        counter = StatementCounter()
+        counter.attach(bot.conn)
+        return bot, bot.exchange, counter
+
+    return measure(
+        f"lot_ledger.rebuild_real_profits [{n_rows} fills]", setup,
+        lambda bot: lot_ledger.rebuild_real_profits(bot.conn, bot.SYMBOL, mode=bot.LOT_MATCHING), repeat
+    )
+
+
+def bench_supertrend(n_candles, repeat):
+    from bot_trend import TrendBot
+
+    base_df = random_candles(n_candles)
+
+    def setup():
+        bot = TrendBot.__new__(TrendBot)
+        bot.SUPERTREND_PERIOD = 10
+        bot.SUPERTREND_MULTIPLIER = 3.0
+        return (bot, base_df.copy()), None, StatementCounter()
+
+    return measure(
+        f"TrendBot.calculate_supertrend [{n_candles} candles]", setup,
+        lambda ctx: ctx[0].calculate_supertrend(ctx[1]), repeat
+    )
+
+
+def bench_build_report(per_day, repeat):
+    import send_daily_profit
+
+    if os.path.exists("grid_data.db"):
+        os.remove("grid_data.db")
+    seeded = make_grid_bot(levels=30)
+    seed_year_of_profits(seeded.conn, per_day)
+    seeded.conn.close()
+
+    def setup():
+        return None, None, StatementCounter()
+
+    return measure(
+        f"send_daily_profit.build_report [1 ano, {per_day}/dia]", setup,
+        lambda _ctx: send_daily_profit.build_report(), repeat
+    )
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, text=True
+        ).strip()
+    except Exception:
+        return "unknown"
+
+
+def compare(current, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {r['name']: r for r in json.load(f)['results']}
+
+    print(f"\n=== Comparação com {baseline_path} ===")
+    for r in current:
+        old = baseline.get(r['name'])
+        if not old:
+            continue
+        delta = (r['wall_ms_median'] / old['wall_ms_median'] - 1) * 100 if old['wall_ms_median'] else 0.0
+        print(
+            f"{r['name']:45s} {old['wall_ms_median']:10.2f} -> {r['wall_ms_median']:10.2f} ms "
+            f"({delta:+.1f}%)  calls {old['exchange_calls']} -> {r['exchange_calls']}  "
+            f"sql {old['db_statements']} -> {r['db_statements']}"
+        )
+
+
+# ==========================================
+# MAIN
+# ==========================================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks dos hot paths do grid e trend bot")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--quick", action="store_true", help="pula os cenários grandes")
+    parser.add_argument("--output", help="arquivo JSON de saída (padrão: bench_results/<commit>.json)")
+    parser.add_argument("--compare", help="JSON de uma rodada anterior para comparação")
+    args = parser.parse_args()
+
+    sys.path.insert(0, REPO_DIR)
+    logging.disable(logging.CRITICAL)
+    commit = git_commit()
+    output = os.path.abspath(args.output or os.path.join(REPO_DIR, "bench_results", f"{commit}.json"))
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+
+        for n in (10, 100, 1000):
+            results.append(bench_check_orders(n, args.repeat))
+        for levels in (30, 300):
+            if args.quick and levels > 30:
+                continue
+            results.append(bench_initialize_grid(levels, args.repeat))
+        results.extend(bench_exposure(1000, args.repeat))
+        results.append(bench_rebuild_real_profits(10_000 if args.quick else 100_000, args.repeat))
+        for n in (1_000, 100_000):
+            if args.quick and n > 1_000:
+                continue
+            results.append(bench_supertrend(n, 1 if n > 1_000 else args.repeat))
+        results.append(bench_build_report(10 if args.quick else 100, args.repeat))
+
+        os.chdir(REPO_DIR)
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({
+            'commit': commit,
+            'generated_at': datetime.now().isoformat(),
+            'python': sys.version.split()[0],
+            'results': results,
+        }, f, indent=2)
+    print(f"\nResultados salvos em {output}")
+
+    if args.compare:
+        compare(results, args.compare)
@@ -0,0 +1,149 @@
+import time
+
+
+# ==========================================
+# TOPO DO LIVRO (MELHOR BID / ASK)
+# ==========================================
+# Preço do último trade oscila entre bid e ask; para precificar ordens
+# maker e inferir execuções o que importa é o topo do livro.
+# Fontes aceitas (todas atualizam o mesmo objeto, sem alocar por mensagem):
+# - stream bookTicker da Binance  {"u": id, "b": bid, "B": qtd, "a": ask, "A": qtd}
+# - snapshot leve fetch_order_book(limit=5)   (nonce = sequência)
+# - ticker ccxt (bid/ask/bidVolume/askVolume) (timestamp = sequência)
+
+
+def tick_size(market, default=0.01):
+    """
+    Tamanho do tick a partir do mercado ccxt (precision em TICK_SIZE ou em casas decimais).
+    """
+    precision = ((market or {}).get("precision") or {}).get("price")
+    if precision is None:
+        return default
+    precision = float(precision)
+    if precision >= 1 and precision.is_integer():
+        return 10 ** -int(precision)
+    return precision
+
+
+class BookTicker:
+    __slots__ = (
+        "symbol", "tick", "bid", "ask", "bid_qty", "ask_qty", "last",
+        "seq", "updated_at", "updates", "dropped", "crossed",
+    )
+
+    def __init__(self, symbol, tick=0.01):
+        self.symbol = symbol
+        self.tick = float(tick)
+        self.bid = 0.0
+        self.ask = 0.0
+        self.bid_qty = 0.0
+        self.ask_qty = 0.0
+        self.last = 0.0
+        self.seq = -1
+        self.updated_at = 0.0
+        self.updates = 0
+        self.dropped = 0      # fora de ordem / duplicadas
+        self.crossed = 0      # bid >= ask (descartadas)
+
+    # --------------------------------------
+    # ATUALIZAÇÃO EM LUGAR
+    # --------------------------------------
+    def update(self, bid, ask, bid_qty=0.0, ask_qty=0.0, seq=None):
+        """
+        Aplica um topo de livro. Retorna False se descartado:
+        sequência mais antiga que a atual, repetida (só renova o horário) ou livro cruzado.
+        """
+        if seq is not None and seq <= self.seq:
+            if seq == self.seq:
+                self.updated_at = time.monotonic()
+            self.dropped += 1
+            return False
+        bid = float(bid or 0.0)
+        ask = float(ask or 0.0)
+        # bid == ask é aceito (feeds gravados sem livro usam o last nos dois lados)
+        if bid <= 0.0 or ask <= 0.0 or bid > ask:
+            self.crossed += 1
+            return False
+
+        if seq is not None:
+            self.seq = seq
+        self.bid = bid
+        self.ask = ask
+        self.bid_qty = float(bid_qty or 0.0)
+        self.ask_qty = float(ask_qty or 0.0)
+        self.updated_at = time.monotonic()
+        self.updates += 1
+        return True
+
+    def apply_stream(self, msg):
+        return self.update(msg["b"], msg["a"], msg.get("B"), msg.get("A"), msg.get("u"))
+
+    def apply_order_book(self, book):
+        bids, asks = book.get("bids") or (), book.get("asks") or ()
+        if not bids or not asks:
+            return False
+        return self.update(bids[0][0], asks[0][0], bids[0][1], asks[0][1], book.get("nonce") or book.get("timestamp"))
+
+    def apply_ticker(self, ticker):
+        last = ticker.get("last")
+        if last:
+            self.last = float(last)
+        bid, ask = ticker.get("bid"), ticker.get("ask")
+        if not bid or not ask:
+            # Ticker sem livro (ex.: gravação antiga): livro degenerado no last
+            bid = ask = last
+        return self.update(bid, ask, ticker.get("bidVolume"), ticker.get("askVolume"), ticker.get("timestamp"))
+
+    def refresh(self, exchange, source="orderbook"):
+        """
+        Snapshot via REST. 'ticker' também avança a SimExchange e passa pelo hub de mercado.
+        """
+        if source == "ticker":
+            return self.apply_ticker(exchange.fetch_ticker(self.symbol))
+        ok = self.apply_order_book(exchange.fetch_order_book(self.symbol, limit=5))
+        if ok:
+            self.last = self.mid
+        return ok
+
+    # --------------------------------------
+    # LEITURA
+    # --------------------------------------
+    @property
+    def mid(self):
+        return (self.bid + self.ask) / 2.0
+
+    @property
+    def spread(self):
+        return self.ask - self.bid
+
+    def age(self):
+        return time.monotonic() - self.updated_at
+
+    def fresh(self, max_age):
+        return self.updated_at > 0 and self.age() <= max_age
+
+    # --------------------------------------
+    # PRECIFICAÇÃO MAKER / INFERÊNCIA DE EXECUÇÃO
+    # --------------------------------------
+    def maker_buy_price(self, price):
+        """
+        BUY nunca acima de ask - tick (senão executa como taker ou é rejeitada como post-only).
+        """
+        if self.ask > 0:
+            return min(float(price), self.ask - self.tick)
+        return float(price)
+
+    def maker_sell_price(self, price):
+        if self.bid > 0:
+            return max(float(price), self.bid + self.tick)
+        return float(price)
+
+    def buy_filled(self, price):
+        """
+        BUY em `price` foi consumida se o livro passou por ela:
+        melhor bid abaixo do nível (nossa ordem seria o melhor bid) ou ask no nível.
+        """
+        return self.bid < price or self.ask <= price
+
+    def sell_filled(self, price):
+        return self.ask > price or self.bid >= price
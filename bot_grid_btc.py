@@ -1,11 +1,27 @@
-import ccxt
+from fast_start import ccxt, StartupReport, prime_markets, save_markets, use_markets
+import atexit
 import time
 import sqlite3
-import logging
-import requests
 import os
 import sys
-from dotenv import load_dotenv
+from sim_exchange import SimExchange, LivePriceFeed, RecordedPriceFeed
+from exchange_recorder import RecordingExchange, ReplayExchange
+from market_data_hub import MarketDataClient, HubExchange
+from metrics import MetricsRegistry, InstrumentedExchange, SQLiteSnapshotter, start_http_server
+from notifier import TelegramNotifier
+from http_transport import session_options, shared_session, use_session
+from profiler import ProfilerControl, PhaseTimer, phase_timed
+from log_setup import setup_logging, set_context
+import profit_rollups
+from grid_archive import GridArchiver, ensure_hot_indexes, default_archive_path
+from lot_ledger import LotLedger, ensure_lot_columns, summarize_cycle
+from fee_normalizer import FeeNormalizer, ensure_fee_columns
+from equity_tracker import EquityTracker, ensure_equity_tables
+from book_ticker import BookTicker, tick_size
+from order_intents import OrderIntentLog, ensure_intent_table
+from exposure_ledger import ExposureLedger, default_ledger_path
+from state_snapshot import SnapshotWriter, SnapshotError, read_snapshot, default_snapshot_path
+from config_watcher import ConfigWatcher, changed_keys, load_env_file, process_environment
 from datetime import datetime, timedelta
 
 
@@ -14,15 +30,40 @@ from datetime import datetime, timedelta
 # ==========================================
 
 class GridBot:
-    def __init__(self):
-        self._setup_logging()
-        self._load_config()
-        self._init_db()
-        self._connect_exchange()
+    # Parâmetros recarregáveis a quente do .env: atributo -> (variável, tipo, padrão)
+    HOT_CONFIG = {
+        'BUY_OFFSET': ('BUY_OFFSET', float, 400),
+        'SELL_OFFSET': ('SELL_OFFSET', float, 600),
+        'MAX_BTC_USD': ('MAX_BTC_USD', float, 12),
+        'BASE_LOWER_PRICE': ('GRID_LOWER_PRICE', float, 50000),
+        'BASE_UPPER_PRICE': ('GRID_UPPER_PRICE', float, 70000),
+        'GRID_LEVELS': ('GRID_LEVELS', int, 10),
+        'INVESTMENT_PER_GRID': ('AMOUNT_PER_GRID_USDT', float, 15),
+    }
+
+    def __init__(self, account=None):
+        # Conta do supervisor multi-conta (None = processo próprio, config do .env)
+        self.account = account
+        # Avisos de partida vão ao Telegram juntos, depois do primeiro check_orders
+        self.startup = StartupReport("GRID BTC", started=None if account is None else time.time())
+        with self.startup.phase("config"):
+            self._setup_logging()
+            self._load_config()
+        with self.startup.phase("metrics"):
+            self._setup_metrics()
+        try:
+            with self.startup.phase("db"):
+                self._init_db()
+            with self.startup.phase("exchange"):
+                self._connect_exchange()
+        except BaseException:
+            # Partida interrompida (inclusive sys.exit): threads de fundo não sobrevivem ao bot
+            self.close()
+            raise
         self.logger.info("Inicializando lógica do GRID V4 (lucro real)...")
-        self.telegram_send("🚀 GRID V4 iniciado (lucro real habilitado).")
+        self.startup.notice("🚀 GRID V4 iniciado (lucro real habilitado).")
         self.logger.info(f"SIMULATION = {self.SIMULATION}")
-        self.telegram_send(f"SIMULATION = {self.SIMULATION}")
+        self.startup.notice(f"SIMULATION = {self.SIMULATION}")
         # Flag para pausar reconstrução de grid quando não há saldo
         self.grid_paused_low_balance = False
 
@@ -30,59 +71,127 @@ class GridBot:
     # LOGGING
     # --------------------------------------
     def _setup_logging(self):
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler("grid_bot.log"),
-                logging.StreamHandler(sys.stdout)
-            ]
-        )
-        self.logger = logging.getLogger("GridBot")
+        if self.account is not None:
+            # Supervisor: log do processo, com conta/estratégia em cada linha
+            self.logger = self.account.logger("grid_btc")
+            return
+        # LOG_* do .env já valem aqui (fila + thread de escrita, rotação com .gz, amostragem)
+        load_env_file('.env')
+        self.logger = setup_logging("GridBot", os.getenv('LOG_FILE', 'grid_bot.log'))
 
     # --------------------------------------
     # CONFIG / ENV
     # --------------------------------------
     def _load_config(self):
-        # Força carregar .env no mesmo diretório
-        load_dotenv(dotenv_path='.env', override=True)
+        if self.account is None:
+            # Força carregar .env no mesmo diretório
+            load_env_file('.env')
+        # Config da conta (supervisor) ou do processo (.env já carregado no ambiente)
+        env = self.env = self.account.env if self.account is not None else os.environ
 
-        self.API_KEY = os.getenv('BINANCE_API_KEY')
-        self.SECRET_KEY = os.getenv('BINANCE_SECRET_KEY')
-        self.TG_TOKEN = os.getenv('TELEGRAM_TOKEN')
-        self.TG_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')
-        self.BUY_OFFSET = float(os.getenv('BUY_OFFSET', 400))
-        self.SELL_OFFSET = float(os.getenv('SELL_OFFSET', 600))
-        self.MAX_BTC_USD = float(os.getenv("MAX_BTC_USD", 12))
+        # Diretório dos arquivos locais (o supervisor usa um por conta)
+        self.DATA_DIR = env.get('DATA_DIR', '')
+
+        self.API_KEY = env.get('BINANCE_API_KEY')
+        self.SECRET_KEY = env.get('BINANCE_SECRET_KEY')
+        self.TG_TOKEN = env.get('TELEGRAM_TOKEN')
+        self.TG_CHAT_ID = env.get('TELEGRAM_CHAT_ID')
 
         # Default agora é 'false'
-        self.SIMULATION = str(os.getenv('MODO_SIMULACAO', 'false')).lower() == 'true'
+        self.SIMULATION = str(env.get('MODO_SIMULACAO', 'false')).lower() == 'true'
+
+        # Exchange simulada (usada somente com MODO_SIMULACAO=true)
+        self.SIM_FEED = env.get('SIM_FEED', 'live')  # 'live' ou caminho de um CSV gravado
+        self.SIM_QUOTE_BALANCE = float(env.get('SIM_QUOTE_BALANCE', 1000))
+        self.SIM_BASE_BALANCE = float(env.get('SIM_BASE_BALANCE', 0))
+        self.SIM_MAKER_FEE = float(env.get('SIM_MAKER_FEE', 0.001))
+        self.SIM_TAKER_FEE = float(env.get('SIM_TAKER_FEE', 0.001))
+        self.SIM_LATENCY_MS = float(env.get('SIM_LATENCY_MS', 0))
+        self.SIM_QUEUE_AHEAD = float(env.get('SIM_QUEUE_AHEAD', 0))
+
+        # Gravação / replay do tráfego com a exchange
+        self.EXCHANGE_RECORD_FILE = env.get('EXCHANGE_RECORD_FILE')
+        self.EXCHANGE_REPLAY_FILE = env.get('EXCHANGE_REPLAY_FILE')
+        self.EXCHANGE_REPLAY_SPEED = float(env.get('EXCHANGE_REPLAY_SPEED', 0))
+
+        # Hub local de dados de mercado (vazio = consulta a exchange direto)
+        self.MARKET_HUB_SOCKET = env.get('MARKET_HUB_SOCKET', '')
+        self.MARKET_HUB_MAX_AGE = float(env.get('MARKET_HUB_MAX_AGE', 5))
+
+        # Cache local do load_markets (0 = sempre busca na exchange)
+        self.MARKETS_CACHE_FILE = env.get('MARKETS_CACHE_FILE', 'markets_cache.json')
+        self.MARKETS_CACHE_HOURS = float(env.get('MARKETS_CACHE_HOURS', 24))
+
+        # Transporte HTTP: pool keep-alive, timeouts conexão/leitura, retry com jitter em GET
+        self.HTTP_OPTIONS = session_options(env)
+
+        # Topo do livro (melhor bid/ask): 'orderbook' (snapshot limit=5), 'ticker' ou 'auto'
+        # 'auto' = ticker em simulação/replay/hub (mesma fonte dos preços simulados), orderbook no real
+        self.BOOK_SOURCE = env.get('BOOK_SOURCE', 'auto').lower()
+        if self.BOOK_SOURCE == 'auto':
+            use_ticker = self.SIMULATION or self.EXCHANGE_REPLAY_FILE or self.MARKET_HUB_SOCKET
+            self.BOOK_SOURCE = 'ticker' if use_ticker else 'orderbook'
+        self.BOOK_MAX_AGE = float(env.get('BOOK_MAX_AGE', 2))
+        # Ordens limite como post-only (LIMIT_MAKER), com preço ajustado para não cruzar o livro
+        self.GRID_POST_ONLY = str(env.get('GRID_POST_ONLY', 'true')).lower() == 'true'
+
+        # Métricas (0 desativa o endpoint HTTP)
+        self.METRICS_PORT = int(env.get('METRICS_PORT', 9101))
+        self.METRICS_SNAPSHOT_SECONDS = float(env.get('METRICS_SNAPSHOT_SECONDS', 60))
+
+        # Profiling sob demanda (SIGUSR1 ou arquivo de controle)
+        self.PROFILE_TRIGGER_FILE = env.get(
+            'PROFILE_TRIGGER_FILE', os.path.join(self.DATA_DIR, 'profile_btc.trigger')
+        )
+        self.PROFILE_SECONDS = float(env.get('PROFILE_SECONDS', 30))
+        self.PROFILE_INTERVAL_MS = float(env.get('PROFILE_INTERVAL_MS', 10))
+        self.SLOW_ITERATION_SECONDS = float(env.get('SLOW_ITERATION_SECONDS', 5))
 
         # Configurações do Grid (base)
-        self.SYMBOL = os.getenv('SYMBOL', 'BTC/USDT')
-
-        # Range base vindo do .env (usado para grid dinâmico)
-        self.BASE_LOWER_PRICE = float(os.getenv('GRID_LOWER_PRICE', 50000))
-        self.BASE_UPPER_PRICE = float(os.getenv('GRID_UPPER_PRICE', 70000))
-        self.GRID_LEVELS = int(os.getenv('GRID_LEVELS', 10))
-        self.INVESTMENT_PER_GRID = float(os.getenv('AMOUNT_PER_GRID_USDT', 15))
-
-        # Range e step derivados
-        self.RANGE_SIZE = self.BASE_UPPER_PRICE - self.BASE_LOWER_PRICE
-        if self.RANGE_SIZE <= 0:
-            raise ValueError("GRID_UPPER_PRICE deve ser MAIOR que GRID_LOWER_PRICE no .env")
+        self.SYMBOL = env.get('SYMBOL', 'BTC/USDT')
+        if self.account is None:
+            set_context(symbol=self.SYMBOL)
 
-        self.grid_step = self.RANGE_SIZE / self.GRID_LEVELS
+        # Range, níveis, offsets, valor por nível e limite de exposição (recarregáveis a quente)
+        self._apply_grid_config(self._parse_grid_config(env))
 
-        # Valores que podem ser recalculados dinamicamente (grid dinâmico)
-        self.LOWER_PRICE = self.BASE_LOWER_PRICE
-        self.UPPER_PRICE = self.BASE_UPPER_PRICE
+        # Recarga a quente do .env (polling de mtime; 0 desativa)
+        self.CONFIG_FILE = env.get('CONFIG_FILE', '.env')
+        self.CONFIG_RELOAD_SECONDS = float(env.get('CONFIG_RELOAD_SECONDS', 5))
 
         # Criar conexão global SQLite
-        self.DB_NAME = "grid_data.db"
+        self.DB_NAME = os.path.join(self.DATA_DIR, "grid_data.db")
         self.conn = sqlite3.connect(self.DB_NAME, timeout=15, check_same_thread=False)
+        # WAL: o relatório lê em paralelo (somente leitura) sem bloquear o bot
+        self.conn.execute("PRAGMA journal_mode=WAL")
         self.cursor = self.conn.cursor()
 
+        # Arquivamento de linhas liquidadas (ARCHIVE_DB vazio = histórico no próprio banco)
+        self.ARCHIVE_DB = env.get('ARCHIVE_DB', default_archive_path(self.DB_NAME)) or None
+        self.ARCHIVE_MIN_AGE_HOURS = float(env.get('ARCHIVE_MIN_AGE_HOURS', 24))
+        self.ARCHIVE_RETENTION_DAYS = float(env.get('ARCHIVE_RETENTION_DAYS', 0))  # 0 = mantém para sempre
+        self.ARCHIVE_INTERVAL_MINUTES = float(env.get('ARCHIVE_INTERVAL_MINUTES', 60))
+        self.ARCHIVE_VACUUM_RATIO = float(env.get('ARCHIVE_VACUUM_RATIO', 0.25))
+
+        # Casamento BUY -> SELL: 'level' (nível abaixo da SELL, depois FIFO) ou 'fifo'
+        self.LOT_MATCHING = env.get('LOT_MATCHING', 'level').lower()
+
+        # Conversão de taxas (BNB etc.) para a moeda quote
+        self.FEE_RATE_TTL_SECONDS = float(env.get('FEE_RATE_TTL_SECONDS', 300))
+        self.FEE_RATE_ASSETS = [a.strip() for a in env.get('FEE_RATE_ASSETS', 'BNB').split(',') if a.strip()]
+
+        # Snapshots de equity (PnL realizado + não realizado) para drawdown; 0 desativa
+        self.EQUITY_SNAPSHOT_SECONDS = float(env.get('EQUITY_SNAPSHOT_SECONDS', 300))
+
+        # Snapshot do estado em memória para reinício/migração (SNAPSHOT_SECONDS=0 desativa a gravação)
+        self.SNAPSHOT_FILE = env.get('SNAPSHOT_FILE', default_snapshot_path(self.DB_NAME))
+        self.SNAPSHOT_SECONDS = float(env.get('SNAPSHOT_SECONDS', 60))
+
+        # Livro global de exposição compartilhado pelos bots da conta (vazio = cálculo local)
+        self.EXPOSURE_LEDGER_DB = env.get(
+            'EXPOSURE_LEDGER_DB', os.path.join(self.DATA_DIR, default_ledger_path(self.SIMULATION))
+        )
+
         # Base e quote do par (ex: BTC / USDT)
         try:
             self.BASE_ASSET, self.QUOTE_ASSET = self.SYMBOL.split('/')
@@ -90,11 +199,94 @@ class GridBot:
             self.logger.error(f"Símbolo inválido: {self.SYMBOL}. Esperado formato BASE/QUOTE (ex: BTC/USDT).")
             sys.exit(1)
 
+    def _parse_grid_config(self, env):
+        """
+        Lê os parâmetros de HOT_CONFIG de um mapeamento (os.environ ou .env recarregado)
+        e valida o conjunto. Tudo ou nada: ValueError se qualquer valor for inválido.
+        """
+        values = {}
+        for attr, (key, cast, default) in self.HOT_CONFIG.items():
+            raw = env.get(key, default)
+            try:
+                values[attr] = cast(raw)
+            except (TypeError, ValueError):
+                raise ValueError(f"{key}={raw!r} inválido") from None
+
+        if values['BASE_UPPER_PRICE'] - values['BASE_LOWER_PRICE'] <= 0:
+            raise ValueError("GRID_UPPER_PRICE deve ser MAIOR que GRID_LOWER_PRICE no .env")
+        if values['GRID_LEVELS'] < 1:
+            raise ValueError(f"{self.HOT_CONFIG['GRID_LEVELS'][0]} deve ser >= 1")
+        if values['INVESTMENT_PER_GRID'] <= 0:
+            raise ValueError(f"{self.HOT_CONFIG['INVESTMENT_PER_GRID'][0]} deve ser > 0")
+        for attr in ('BUY_OFFSET', 'SELL_OFFSET', 'MAX_BTC_USD'):
+            if values[attr] < 0:
+                raise ValueError(f"{self.HOT_CONFIG[attr][0]} não pode ser negativo")
+        return values
+
+    def _apply_grid_config(self, values):
+        range_changed = (
+            values['BASE_LOWER_PRICE'] != getattr(self, 'BASE_LOWER_PRICE', None)
+            or values['BASE_UPPER_PRICE'] != getattr(self, 'BASE_UPPER_PRICE', None)
+        )
+        for attr, value in values.items():
+            setattr(self, attr, value)
+
+        # Range e step derivados
+        self.RANGE_SIZE = self.BASE_UPPER_PRICE - self.BASE_LOWER_PRICE
+        self.grid_step = self.RANGE_SIZE / self.GRID_LEVELS
+
+        # Valores que podem ser recalculados dinamicamente (grid dinâmico); faixa nova no .env recomeça dela
+        if range_changed:
+            self.LOWER_PRICE = self.BASE_LOWER_PRICE
+            self.UPPER_PRICE = self.BASE_UPPER_PRICE
+
+    # --------------------------------------
+    # MÉTRICAS / TELEGRAM
+    # --------------------------------------
+    def _setup_metrics(self):
+        self.metrics = MetricsRegistry(prefix="gridbot_")
+        self.m_loop = self.metrics.histogram("loop_iteration_seconds", "Duração de cada iteração do loop principal")
+        self.m_fill_latency = self.metrics.histogram(
+            "fill_detection_latency_seconds", "Tempo entre a execução na exchange e a detecção pelo bot", ("side",),
+            buckets=(0.5, 1, 2.5, 5, 10, 15, 30, 60, 120, 300, 600)
+        )
+        self.m_place = self.metrics.histogram("order_placement_seconds", "Round-trip de criação de ordem", ("side",))
+        self.m_db_commit = self.metrics.histogram("db_commit_seconds", "Duração das transações SQLite")
+        self.m_fills = self.metrics.counter("fills", "Ordens executadas", ("side",))
+        self.m_open_orders = self.metrics.gauge("open_orders", "Ordens OPEN no grid")
+        self.m_exposure = self.metrics.gauge("exposure_usd", "Exposição do ativo base em USD")
+        self.phases = PhaseTimer(self.logger, self.metrics, self.SLOW_ITERATION_SECONDS)
+
+        self.notifier = TelegramNotifier(
+            self.TG_TOKEN, self.TG_CHAT_ID, self.logger,
+            prefix=self._telegram_prefix("BTC CRIPTO  "), metrics=self.metrics,
+            session=shared_session("telegram", self.metrics, **self.HTTP_OPTIONS),
+        )
+
+        if self.METRICS_PORT:
+            try:
+                start_http_server(self.metrics, self.METRICS_PORT)
+                self.logger.info(f"Métricas em http://127.0.0.1:{self.METRICS_PORT}/metrics")
+            except OSError as e:
+                self.logger.error(f"Não foi possível abrir o endpoint de métricas: {e}")
+        self.snapshotter = None
+        if self.METRICS_SNAPSHOT_SECONDS > 0:
+            self.snapshotter = SQLiteSnapshotter(
+                self.metrics, self.DB_NAME, self.METRICS_SNAPSHOT_SECONDS, self.logger
+            ).start()
+
+    def _telegram_prefix(self, prefix):
+        return prefix if self.account is None else f"[{self.account.name}] {prefix}"
+
+    def _commit(self):
+        with self.m_db_commit.time():
+            self.conn.commit()
+
     # --------------------------------------
     # EXCHANGE
     # --------------------------------------
     def _connect_exchange(self):
-        if not self.API_KEY or not self.SECRET_KEY:
+        if not self.SIMULATION and not self.EXCHANGE_REPLAY_FILE and (not self.API_KEY or not self.SECRET_KEY):
             self.logger.error("Credenciais da API não encontradas. Verifique o .env.")
             sys.exit(1)
 
@@ -111,9 +303,38 @@ class GridBot:
 
         # Desativa hard o fetch de currencies
         self.exchange.options['fetchCurrencies'] = False
+        # Conexões keep-alive compartilhadas no processo (supervisor: Session e orçamento da conta)
+        if self.account is not None:
+            self.account.attach(self.exchange, self.metrics)
+        else:
+            use_session(self.exchange, shared_session("binance", self.metrics, **self.HTTP_OPTIONS))
+
+        # Mercados do cache local: o load_markets abaixo não baixa o exchangeInfo inteiro
+        markets_cached = False
+        if not self.EXCHANGE_REPLAY_FILE:
+            markets_cached = prime_markets(
+                self.exchange, self.MARKETS_CACHE_FILE, [self.SYMBOL], self.MARKETS_CACHE_HOURS, self.logger
+            )
+            if not markets_cached and self.snapshot and self.snapshot.get('market'):
+                markets_cached = use_markets(self.exchange, {self.SYMBOL: self.snapshot['market']})
+                self.logger.info("Mercado carregado do snapshot.")
+
+        # Tickers/candles do hub compartilhado (ordens e saldos continuam direto na exchange)
+        if self.MARKET_HUB_SOCKET and not self.EXCHANGE_REPLAY_FILE:
+            self.logger.info(f"Dados de mercado via hub: {self.MARKET_HUB_SOCKET}")
+            self.exchange = HubExchange(
+                self.exchange, MarketDataClient(self.MARKET_HUB_SOCKET, self.logger),
+                max_ticker_age=self.MARKET_HUB_MAX_AGE,
+            )
+
+        if self.EXCHANGE_REPLAY_FILE:
+            self.logger.info(f"Replay de tráfego da exchange: {self.EXCHANGE_REPLAY_FILE}")
+            self.exchange = ReplayExchange(self.EXCHANGE_REPLAY_FILE, speed=self.EXCHANGE_REPLAY_SPEED)
+        elif self.EXCHANGE_RECORD_FILE:
+            self.logger.info(f"Gravando tráfego da exchange em {self.EXCHANGE_RECORD_FILE}")
+            self.exchange = RecordingExchange(self.exchange, self.EXCHANGE_RECORD_FILE)
 
         self.logger.info("Carregando mercados da Binance...")
-        self.telegram_send("Carregando mercados da Binance...")
 
         try:
             self.markets = self.exchange.load_markets()
@@ -121,8 +342,20 @@ class GridBot:
             self.logger.error(f"Erro ao carregar mercados: {e}")
             self.telegram_send(f"Erro ao carregar mercados: {e}")
             sys.exit(1)
+        if not markets_cached and not self.EXCHANGE_REPLAY_FILE and self.MARKETS_CACHE_HOURS > 0:
+            save_markets(self.MARKETS_CACHE_FILE, self.markets, [self.SYMBOL], self.logger)
+
+        if self.SIMULATION:
+            self._connect_sim_exchange()
+
+        self.exchange = InstrumentedExchange(self.exchange, self.metrics)
+        self.fees = FeeNormalizer(
+            self.exchange, self.BASE_ASSET, self.QUOTE_ASSET, self.logger,
+            ttl=self.FEE_RATE_TTL_SECONDS, assets=self.FEE_RATE_ASSETS,
+        )
 
         market = self.markets[self.SYMBOL]
+        self.book = BookTicker(self.SYMBOL, tick_size(market))
 
         self.min_amount = market['limits']['amount']['min']
         self.min_cost = market['limits']['cost']['min']
@@ -131,7 +364,35 @@ class GridBot:
             self.min_cost = 10
 
         self.logger.info(f"Conectado! Par: {self.SYMBOL} | Min Cost: {self.min_cost}")
-        self.telegram_send(f"Conectado! Par: {self.SYMBOL} | Min Cost: {self.min_cost}")
+        self.startup.notice(f"Conectado! Par: {self.SYMBOL} | Min Cost: {self.min_cost}")
+
+    def _connect_sim_exchange(self):
+        """
+        Em simulação, troca o cliente real pela exchange simulada local.
+        O cliente real continua fornecendo mercados, precisão e (no modo 'live') preços.
+        """
+        if self.SIM_FEED == 'live':
+            feed = LivePriceFeed(self.exchange)
+        else:
+            feed = RecordedPriceFeed.from_csv(self.SIM_FEED)
+
+        self.exchange = SimExchange(
+            self.exchange,
+            feed,
+            balances={self.QUOTE_ASSET: self.SIM_QUOTE_BALANCE, self.BASE_ASSET: self.SIM_BASE_BALANCE},
+            maker_fee=self.SIM_MAKER_FEE,
+            taker_fee=self.SIM_TAKER_FEE,
+            latency_ms=self.SIM_LATENCY_MS,
+            queue_ahead_qty=self.SIM_QUEUE_AHEAD,
+        )
+        self.sim_exchange = self.exchange
+        if self.snapshot and self.snapshot.get('sim'):
+            restored = self.sim_exchange.restore_state(self.snapshot['sim'])
+            self.logger.info(f"[SIM] Saldos e {restored} ordens simuladas restaurados do snapshot.")
+        self.logger.info(
+            f"[SIM] Exchange simulada ativa (feed={self.SIM_FEED}, "
+            f"{self.SIM_QUOTE_BALANCE} {self.QUOTE_ASSET} / {self.SIM_BASE_BALANCE} {self.BASE_ASSET})"
+        )
 
     # --------------------------------------
     # DB
@@ -193,20 +454,91 @@ class GridBot:
             )
         ''')
 
-        self.conn.commit()
+        # Agregados de lucro por hora/dia/total (atualizados junto com cada inserção)
+        profit_rollups.ensure_rollup_tables(self.cursor)
+
+        # Quantidade restante por lote BUY (execução parcial de ciclos)
+        ensure_lot_columns(self.cursor)
+        # Taxa convertida para QUOTE ao lado da taxa bruta
+        ensure_fee_columns(self.cursor, self.BASE_ASSET, self.QUOTE_ASSET)
+
+        # Equity: estado corrente (pico/drawdown) e snapshots periódicos
+        ensure_equity_tables(self.cursor)
+
+        # Intenções de ordem gravadas antes do envio (clientOrderId determinístico)
+        ensure_intent_table(self.cursor)
+
+        # Índices das consultas do loop (status OPEN, BUYs não usadas)
+        ensure_hot_indexes(self.cursor)
+
+        self._commit()
+
+        if profit_rollups.backfill_if_empty(self.conn, self.SYMBOL):
+            self.logger.info("Rollups de lucro reconstruídos a partir do histórico.")
+
+        # Histórico (tabelas frias) fora das tabelas do loop
+        self.archiver = GridArchiver(
+            self.conn, self.logger,
+            archive_path=self.ARCHIVE_DB,
+            min_age_hours=self.ARCHIVE_MIN_AGE_HOURS,
+            retention_days=self.ARCHIVE_RETENTION_DAYS,
+            interval_seconds=self.ARCHIVE_INTERVAL_MINUTES * 60,
+            vacuum_ratio=self.ARCHIVE_VACUUM_RATIO,
+            metrics=self.metrics,
+        )
+        self.archiver.ensure_schema()
+
+        # Snapshot da execução anterior: estado pronto (mesmo ponto do DB) ou semente (DB novo)
+        self.intents = OrderIntentLog(self.conn, self.SYMBOL, self.logger)
+        self.snapshot = self._load_snapshot()
+        from_snapshot = self.snapshot is not None and self.snapshot_mode in ('match', 'seed')
+        self.snapshots = SnapshotWriter(self.SNAPSHOT_FILE, self.SNAPSHOT_SECONDS, self.logger, self.metrics)
+
+        # Lotes BUY abertos em memória (casamento O(log n) e exposição O(1))
+        self.lots = LotLedger(mode=self.LOT_MATCHING)
+        if from_snapshot:
+            loaded = self.lots.load_rows(
+                (r[0], r[1], r[4], r[5], r[9] if r[9] is not None else r[5], r[10] if r[10] is not None else r[6])
+                for r in self.snapshot['lots']
+            )
+        else:
+            loaded = self.lots.load(self.cursor)
+        self.logger.info(f"Lotes BUY abertos carregados: {loaded}")
+
+        # Inventário/custo/realizado correntes; mark-to-market O(1) por ticker
+        self.equity = EquityTracker(
+            self.conn, self.SYMBOL, self.logger,
+            snapshot_seconds=self.EQUITY_SNAPSHOT_SECONDS, metrics=self.metrics,
+        )
+        if from_snapshot:
+            self.equity.restore_state(self.snapshot['equity'])
+        else:
+            self.equity.load(self.lots.open_qty, self.lots.open_cost)
+
+        # Intenções PENDING de uma execução anterior são resolvidas no run()
+        if from_snapshot:
+            pending = self.intents.restore_state(self.snapshot['intents'])
+        else:
+            pending = self.intents.load()
+        if pending:
+            self.logger.warning(f"{pending} intenção(ões) de ordem pendente(s) da execução anterior.")
+        # Ordens recuperadas já executadas: check_orders trata como FILLED
+        self.pending_fills = set()
+
+        # Exposição global por ativo (BUYs abertas + inventário de todos os bots)
+        self.exposure = None
+        if self.EXPOSURE_LEDGER_DB:
+            self.exposure = ExposureLedger(
+                self.EXPOSURE_LEDGER_DB, os.path.abspath(self.DB_NAME), self.BASE_ASSET, self.logger
+            )
 
     # --------------------------------------
     # TELEGRAM
     # --------------------------------------
+    @phase_timed("telegram")
     def telegram_send(self, message):
         try:
-            token = self.TG_TOKEN
-            chat_id = self.TG_CHAT_ID
-            message = f"BTC CRIPTO  {message}"
-            if not token or not chat_id:
-                return
-            url = f"https://api.telegram.org/bot{token}/sendMessage"
-            requests.post(url, json={"chat_id": chat_id, "text": message}, timeout=5)
+            self.notifier.send(message)
         except Exception as e:
             self.logger.error(f"Erro Telegram: {e}")
 
@@ -245,7 +577,11 @@ class GridBot:
         - BUY FILLED sem SELL -> cria SELL (BUY -> SELL)
         - SELL FILLED sem BUY -> cria BUY (SELL -> BUY)
         """
-        self.cursor.execute("SELECT id, grid_index, order_id, price, side, amount, status FROM active_grids")
+        self.cursor.execute("""
+            SELECT id, grid_index, order_id, price, side, amount, status
+            FROM active_grids
+            WHERE status IN ('OPEN', 'FILLED')
+        """)
         rows = self.cursor.fetchall()
 
         if not rows:
@@ -362,9 +698,8 @@ class GridBot:
             self.telegram_send(msg)
             return
 
-        # Obtém preço atual
-        ticker = self.exchange.fetch_ticker(self.SYMBOL)
-        current_price = ticker['last']
+        # Obtém preço atual (melhor bid: BUYs abaixo dele nunca cruzam o livro)
+        current_price = self._refresh_book().bid
 
         self.logger.info(
             f"initialize_grid: current_price={current_price:.2f}, "
@@ -540,9 +875,80 @@ class GridBot:
 
         return avg_price, filled, fee_cost, fee_currency
 
+    def _resolve_order_intents(self):
+        """
+        Resolve intenções PENDING (queda/timeout entre o envio e a gravação)
+        com uma única busca em lote por clientOrderId.
+        - encontrada (aberta ou executada) -> grava em active_grids
+        - não encontrada / cancelada       -> FAILED (pode ser recriada)
+        """
+        if not self.intents.pending:
+            return 0
+        try:
+            found = self.intents.lookup(self.exchange)
+        except Exception as e:
+            self.logger.error(f"Erro ao resolver intenções de ordem: {e}")
+            return 0
+
+        resolved = 0
+        for client_id, (grid_index, side, price, amount, _created) in list(self.intents.pending.items()):
+            order = found.get(client_id)
+            status = (order or {}).get('status')
+            if status in ('open', 'closed'):
+                self.cursor.execute('''
+                    INSERT INTO active_grids (grid_index, order_id, price, side, amount, status, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (grid_index, order['id'], float(order.get('price') or price), side,
+                      float(order.get('amount') or amount), 'OPEN', datetime.now().isoformat()))
+                self.intents.placed(client_id, order['id'])
+                if status == 'closed':
+                    self.pending_fills.add(order['id'])
+                self.logger.info(f"Intenção {client_id} recuperada: {side} nível {grid_index} id={order['id']} ({status})")
+            else:
+                self.intents.failed(client_id, status or "não encontrada na exchange")
+                self._release_exposure(side, grid_index)
+                self.logger.info(f"Intenção {client_id} descartada ({status or 'não enviada'}).")
+            resolved += 1
+
+        self._commit()
+        return resolved
+
+    def _exposure_ref(self, grid_index):
+        return f"buy:{grid_index}"
+
+    def _release_exposure(self, side, grid_index):
+        if self.exposure is not None and side == 'BUY':
+            self.exposure.release(self._exposure_ref(grid_index))
+
+    def _sync_exposure(self):
+        """
+        Reescreve as linhas deste bot no livro global: BUYs OPEN (e intenções BUY pendentes) + lotes abertos.
+        """
+        if self.exposure is None:
+            return
+        orders = {}
+        self.cursor.execute("SELECT grid_index, amount FROM active_grids WHERE side='BUY' AND status='OPEN'")
+        for grid_index, amount in self.cursor.fetchall():
+            ref = self._exposure_ref(grid_index)
+            orders[ref] = orders.get(ref, 0.0) + float(amount)
+        for grid_index, side, _price, amount, _created in self.intents.pending.values():
+            if side == 'BUY':
+                ref = self._exposure_ref(grid_index)
+                orders[ref] = max(orders.get(ref, 0.0), float(amount))
+        self.exposure.sync(orders, self.lots.open_qty)
+
+    def _refresh_book(self, force=False):
+        """
+        Topo do livro atualizado (só consulta a exchange se passou de BOOK_MAX_AGE ou force=True).
+        """
+        if force or not self.book.fresh(self.BOOK_MAX_AGE):
+            self.book.refresh(self.exchange, self.BOOK_SOURCE)
+        return self.book
+
     # --------------------------------------
     # ORDENS
     # --------------------------------------
+    @phase_timed("order_placement")
     def place_order(self, price, side, grid_index):
         """
         Cria ordem REAL ou SIMULADA + grava no SQLite.
@@ -560,6 +966,26 @@ class GridBot:
             self.telegram_send(msg)
             return
 
+        # Envio anterior sem confirmação neste nível: resolve antes de reenviar (evita duplicata)
+        if self.intents.has_pending(grid_index, side):
+            self._resolve_order_intents()
+            if self.intents.has_pending(grid_index, side):
+                self.logger.warning(f"{side} nível {grid_index} com intenção não resolvida; envio adiado.")
+                return
+            self.cursor.execute(
+                "SELECT 1 FROM active_grids WHERE grid_index=? AND side=? AND status='OPEN'", (grid_index, side)
+            )
+            if self.cursor.fetchone():
+                return
+
+        # Post-only: BUY no máximo ask - tick, SELL no mínimo bid + tick
+        if self.GRID_POST_ONLY:
+            book = self._refresh_book()
+            maker_price = book.maker_buy_price(price) if side == 'BUY' else book.maker_sell_price(price)
+            if maker_price != price:
+                self.logger.info(f"{side} nível {grid_index}: preço {price:.8f} ajustado para {maker_price:.8f} (post-only)")
+                price = maker_price
+
         amount_base = self.INVESTMENT_PER_GRID / price
 
         # Ajusta precisões
@@ -575,12 +1001,19 @@ class GridBot:
         # SALDO
         if side == 'BUY':
             # --- Travamento de risco: não ultrapassar MAX_BTC_USD ---
-            ticker = self.exchange.fetch_ticker(self.SYMBOL)
-            current_price = ticker['last']
-            exposure_usd = self.get_total_btc_exposure_usd(current_price)
+            current_price = self._refresh_book().bid
             new_buy_value = cost  # custo desta compra
 
-            if exposure_usd + new_buy_value > self.MAX_BTC_USD:
+            if self.exposure is not None:
+                # Reserva atômica no livro global (limite vale para todos os bots da conta)
+                reserved, exposure_usd = self.exposure.reserve(
+                    self._exposure_ref(grid_index), amount_final, current_price, self.MAX_BTC_USD
+                )
+            else:
+                exposure_usd = self.get_total_btc_exposure_usd(current_price)
+                reserved = exposure_usd + new_buy_value <= self.MAX_BTC_USD
+
+            if not reserved:
                 msg = (
                     f"⛔ BUY bloqueada: Exposição BTC atingiu limite de {self.MAX_BTC_USD} USD.\n"
                     f"Exposição atual: {exposure_usd:.2f} USD\n"
@@ -599,6 +1032,7 @@ class GridBot:
                 )
                 self.logger.warning(msg)
                 self.telegram_send(msg)
+                self._release_exposure(side, grid_index)
                 return
 
         else:  # SELL
@@ -612,34 +1046,64 @@ class GridBot:
                 self.telegram_send(msg)
                 return
 
-        order_id = f"SIM_{int(time.time()*1000)}"
+        # Intenção gravada ANTES do envio; o mesmo clientOrderId identifica a ordem na exchange
+        client_id = self.intents.begin(grid_index, side, price_final, amount_final)
 
-        if not self.SIMULATION:
-            try:
+        # Em simulação self.exchange é a SimExchange (mesma API ccxt)
+        started = time.perf_counter()
+        try:
+            with self.m_place.time(side=side):
+                params = {'newClientOrderId': client_id}
+                if self.GRID_POST_ONLY:
+                    params['postOnly'] = True
                 if side == "BUY":
-                    order = self.exchange.create_limit_buy_order(self.SYMBOL, amount_final, price_final)
+                    order = self.exchange.create_limit_buy_order(self.SYMBOL, amount_final, price_final, params)
                 else:
-                    order = self.exchange.create_limit_sell_order(self.SYMBOL, amount_final, price_final)
-                order_id = order["id"]
+                    order = self.exchange.create_limit_sell_order(self.SYMBOL, amount_final, price_final, params)
+            order_id = order["id"]
+            latency = time.perf_counter() - started
+        except ccxt.OrderImmediatelyFillable as e:
+            # Livro andou entre o snapshot e o envio; o nível é recriado no próximo ciclo
+            self.intents.failed(client_id, e)
+            self._commit()
+            self._release_exposure(side, grid_index)
+            self.logger.warning(f"Ordem {side} post-only rejeitada em {price_final}: {e}")
+            return
+        except ccxt.NetworkError as e:
+            # Resultado desconhecido (timeout / conexão): a intenção fica PENDING e é resolvida por clientOrderId
+            self.logger.error(f"Erro de rede ao criar ordem {client_id}: {e}")
+            self.telegram_send(f"Erro de rede ao criar ordem {side} (será verificada): {e}")
+            return
+        except Exception as e:
+            self.intents.failed(client_id, e)
+            self._commit()
+            self._release_exposure(side, grid_index)
+            self.logger.error(f"Erro ao criar ordem: {e}")
+            self.telegram_send(f"Erro ao criar ordem: {e}")
+            return
 
-                self.telegram_send(
-                    f"📌 Ordem REAL {side} criada\nPreço: {price_final}\nQtd: {amount_final}"
-                )
-                self.logger.info(f"Ordem REAL {side} criada: id={order_id}, price={price_final}, amount={amount_final}")
-            except Exception as e:
-                self.logger.error(f"Erro ao criar ordem real: {e}")
-                self.telegram_send(f"Erro ao criar ordem real: {e}")
-                return
+        if not self.SIMULATION:
+            self.telegram_send(
+                f"📌 Ordem REAL {side} criada\nPreço: {price_final}\nQtd: {amount_final}"
+            )
+            self.logger.info(
+                f"Ordem REAL {side} criada: id={order_id}, price={price_final}, amount={amount_final}",
+                extra={"grid_index": grid_index, "side": side, "order_id": order_id, "latency": round(latency, 4)},
+            )
         else:
-            self.logger.info(f"[SIM] Ordem {side} criada em {price_final} (amount={amount_final})")
+            self.logger.info(
+                f"[SIM] Ordem {side} criada em {price_final} (amount={amount_final}, id={order_id})",
+                extra={"grid_index": grid_index, "side": side, "order_id": order_id, "latency": round(latency, 4)},
+            )
             self.telegram_send(f"[SIM] Ordem {side} criada em {price_final} (amount={amount_final})")
 
-        # Salva no banco como OPEN
+        # Salva no banco como OPEN (mesma transação que fecha a intenção)
         self.cursor.execute('''
             INSERT INTO active_grids (grid_index, order_id, price, side, amount, status, updated_at)
             VALUES (?, ?, ?, ?, ?, ?, ?)
         ''', (grid_index, order_id, float(price_final), side, float(amount_final), 'OPEN', datetime.now().isoformat()))
-        self.conn.commit()
+        self.intents.placed(client_id, order_id)
+        self._commit()
 
     # --------------------------------------
     # VERIFICAÇÃO DE ORDENS
@@ -652,6 +1116,7 @@ class GridBot:
         """
         self.cursor.execute("SELECT * FROM active_grids WHERE status='OPEN'")
         open_orders = self.cursor.fetchall()
+        self.m_open_orders.set(len(open_orders))
 
         # Se não há nenhuma ordem OPEN, reconstruir GRID
         if not open_orders:
@@ -689,9 +1154,15 @@ class GridBot:
             self.initialize_grid()
             return
 
-        ticker = self.exchange.fetch_ticker(self.SYMBOL)
-        curr = ticker['last']
-        self.logger.info(f"Preço atual {self.SYMBOL}: {curr}")
+        with self.phases.phase("ticker_fetch"):
+            book = self._refresh_book(force=True)
+        if book.bid <= 0:
+            self.logger.warning(f"Topo do livro de {self.SYMBOL} indisponível; verificação adiada.")
+            return
+        curr = book.last or book.mid
+        self.logger.info(f"Preço atual {self.SYMBOL}: {curr} (bid {book.bid} / ask {book.ask})")
+        # Inventário marcado pelo bid (valor de saída)
+        self.equity.mark(book.bid)
 
         for row in open_orders:
             row_id = row[0]
@@ -701,43 +1172,47 @@ class GridBot:
             side = row[4]
             amount = row[5]
 
-            filled = (
-                (side == 'BUY' and curr <= price) or
-                (side == 'SELL' and curr >= price)
-            )
+            order_info = None
+            if self.SIMULATION and order_id in self.exchange.orders:
+                # Motor local decide a execução (fila, execução parcial)
+                order_info = self.exchange.fetch_order(order_id, self.SYMBOL)
+                filled = order_info['status'] == 'closed'
+            else:
+                # Nível consumido pelo livro (não pelo último trade)
+                filled = (
+                    order_id in self.pending_fills or
+                    (book.buy_filled(price) if side == 'BUY' else book.sell_filled(price))
+                )
 
             if not filled:
                 continue
+            self.pending_fills.discard(order_id)
+
+            self.phases.start("fill_handling")
 
             # Marca como FILLED
             self.cursor.execute(
                 "UPDATE active_grids SET status='FILLED', updated_at=? WHERE id=?",
                 (datetime.now().isoformat(), row_id)
             )
-            self.conn.commit()
+            self._commit()
 
-            self.logger.info(f"Ordem {side} id={order_id} em {price} marcada como FILLED.")
+            self.logger.info(
+                f"Ordem {side} id={order_id} em {price} marcada como FILLED.",
+                extra={"grid_index": grid_index, "side": side, "order_id": order_id},
+            )
             self.telegram_send(f"✅ Ordem {side} FILLED\nPreço: {price}\nGrid index: {grid_index}")
 
             # Busca detalhes reais da ordem (se não estiver em simulação)
-            order_info = None
             if not self.SIMULATION:
                 order_info = self._fetch_order_safely(order_id)
 
-            exec_price, exec_amount, exec_fee, exec_fee_currency = self._extract_exec_info(
-                order_info, price, amount
-            )
+            self.m_fills.inc(side=side)
+            fill_ts = (order_info or {}).get('lastTradeTimestamp')
+            if fill_ts:
+                self.m_fill_latency.observe(max(0.0, time.time() - fill_ts / 1000.0), side=side)
 
-            # Registra na tabela filled_orders
-            self.cursor.execute(
-                '''
-                INSERT INTO filled_orders
-                (grid_index, order_id, side, price, amount, fee, fee_currency, timestamp, used_in_cycle)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0)
-                ''',
-                (grid_index, order_id, side, exec_price, exec_amount, exec_fee, exec_fee_currency, datetime.now().isoformat())
-            )
-            self.conn.commit()
+            self._record_execution(grid_index, order_id, side, price, amount, order_info)
 
             # Lógica de continuação do grid
             if side == "BUY":
@@ -779,83 +1254,18 @@ class GridBot:
                 buy_price_est = price - self.grid_step
                 profit_est = (price - buy_price_est) * amount
 
+                now = datetime.now()
                 self.cursor.execute(
                     "INSERT INTO profits (profit_usdt, timestamp) VALUES (?, ?)",
-                    (profit_est, datetime.now().isoformat())
+                    (profit_est, now.isoformat())
                 )
-                self.conn.commit()
+                profit_rollups.record_estimated_profit(self.cursor, self.SYMBOL, now, profit_est)
+                self._commit()
 
                 self.logger.info(f"Lucro BRUTO estimado registrado: {profit_est:.4f} USDT.")
                 self.telegram_send(f"💰 Lucro BRUTO estimado: {profit_est:.4f} USDT")
 
-                # 2) Lucro REAL (ciclo BUY -> SELL)
-                buy_grid_index = grid_index - 1
-                self.cursor.execute(
-                    '''
-                    SELECT id, price, amount, fee
-                    FROM filled_orders
-                    WHERE side='BUY'
-                      AND used_in_cycle=0
-                      AND grid_index=?
-                    ORDER BY id ASC
-                    LIMIT 1
-                    ''',
-                    (buy_grid_index,)
-                )
-                buy_row = self.cursor.fetchone()
-
-                if not buy_row:
-                    self.logger.warning(
-                        f"Nenhuma BUY disponível para formar ciclo com SELL id={order_id} grid_index={grid_index}."
-                    )
-                else:
-                    buy_id, buy_price_real, buy_amount_real, buy_fee_real = buy_row
-
-                    # Quantidade efetiva = mínimo entre buy e sell (por segurança)
-                    qty = min(float(buy_amount_real), float(exec_amount))
-
-                    gross_profit_real = (exec_price - buy_price_real) * qty
-                    net_profit_real = gross_profit_real - float(buy_fee_real or 0.0) - float(exec_fee or 0.0)
-
-                    self.cursor.execute(
-                        '''
-                        INSERT INTO real_profits
-                        (order_id, gross_profit, net_profit, buy_price, sell_price,
-                         amount, buy_fee, sell_fee, timestamp)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                        ''',
-                        (
-                            order_id,
-                            float(gross_profit_real),
-                            float(net_profit_real),
-                            float(buy_price_real),
-                            float(exec_price),
-                            float(qty),
-                            float(buy_fee_real or 0.0),
-                            float(exec_fee or 0.0),
-                            datetime.now().isoformat()
-                        )
-                    )
-
-                    # Marca BUY como usada no ciclo
-                    self.cursor.execute(
-                        "UPDATE filled_orders SET used_in_cycle=1 WHERE id=?",
-                        (buy_id,)
-                    )
-
-                    self.conn.commit()
-
-                    msg = (
-                        f"💹 Lucro REAL Grid\n"
-                        f"Bruto: {gross_profit_real:.4f} USDT\n"
-                        f"Líquido (c/ taxas): {net_profit_real:.4f} USDT\n"
-                        f"BUY: {buy_price_real:.2f} | SELL: {exec_price:.2f}\n"
-                        f"Qtd: {qty:.6f}"
-                    )
-                    self.logger.info(msg)
-                    self.telegram_send(msg)
-
-                # 3) Cria BUY abaixo para manter o grid (próximo nível)
+                # 2) Cria BUY abaixo para manter o grid (próximo nível)
                 next_index = grid_index - 1
 
                 if next_index < 0:
@@ -868,8 +1278,7 @@ class GridBot:
                         f"Grid index atual: {grid_index}"
                     )
                 else:
-                    ticker = self.exchange.fetch_ticker(self.SYMBOL)
-                    current_price = ticker['last']
+                    current_price = self._refresh_book().bid
                     new_price = current_price - self.grid_step
 
                     # Respeita LOWER_PRICE
@@ -899,6 +1308,122 @@ class GridBot:
                             )
                             self.place_order(new_price, "BUY", next_index)
 
+            self.phases.stop("fill_handling")
+
+    def _record_execution(self, grid_index, order_id, side, price, amount, order_info):
+        """
+        Registra a execução (total ou parcial) em filled_orders e no livro de lotes;
+        SELL fecha o ciclo e grava o lucro real.
+        """
+        exec_price, exec_amount, exec_fee, exec_fee_currency = self._extract_exec_info(
+            order_info, price, amount
+        )
+        # Taxa em QUOTE (BASE pelo preço de execução, BNB pela cotação em cache)
+        exec_fee_quote = self.fees.to_quote(exec_fee, exec_fee_currency, exec_price)
+
+        # Registra na tabela filled_orders
+        self.cursor.execute(
+            '''
+            INSERT INTO filled_orders
+            (grid_index, order_id, side, price, amount, fee, fee_currency, timestamp, used_in_cycle,
+             remaining_amount, fee_quote)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0, ?, ?)
+            ''',
+            (grid_index, order_id, side, exec_price, exec_amount, exec_fee, exec_fee_currency, datetime.now().isoformat(),
+             exec_amount if side == 'BUY' else 0.0, exec_fee_quote)
+        )
+        fill_id = self.cursor.lastrowid
+        self._commit()
+
+        if side == 'BUY':
+            self.lots.add(fill_id, grid_index, exec_price, exec_amount, exec_fee_quote)
+            self.equity.on_buy(exec_amount, exec_price)
+            # Reserva da BUY vira inventário no livro global
+            if self.exposure is not None:
+                self.exposure.settle(self._exposure_ref(grid_index), inventory=self.lots.open_qty)
+        else:
+            # Lucro REAL (ciclo BUY -> SELL); o bruto estimado fica em check_orders (só fills completos)
+            now = datetime.now()
+            #   - SELL em grid_index consome lotes BUY (nível grid_index - 1 primeiro, depois FIFO)
+            #   - execução parcial: o lote fica com a quantidade restante
+            taken = self.lots.match(self.cursor, exec_amount, grid_index=grid_index - 1)
+            if self.exposure is not None:
+                self.exposure.settle(inventory=self.lots.open_qty)
+            cycle = summarize_cycle(taken, exec_price, exec_amount, exec_fee_quote)
+
+            if not cycle:
+                self.logger.warning(
+                    f"Nenhuma BUY disponível para formar ciclo com SELL id={order_id} grid_index={grid_index}."
+                )
+            else:
+                unmatched = float(exec_amount) - cycle["qty"]
+                if unmatched > 1e-12:
+                    self.logger.warning(
+                        f"SELL id={order_id}: {unmatched:.8f} sem lote BUY correspondente (fora do ciclo)."
+                    )
+
+                self.cursor.execute(
+                    '''
+                    INSERT INTO real_profits
+                    (order_id, gross_profit, net_profit, buy_price, sell_price,
+                     amount, buy_fee, sell_fee, timestamp)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ''',
+                    (
+                        order_id,
+                        float(cycle["gross"]),
+                        float(cycle["net"]),
+                        float(cycle["buy_price"]),
+                        float(exec_price),
+                        float(cycle["qty"]),
+                        float(cycle["buy_fee"]),
+                        float(cycle["sell_fee"]),
+                        now.isoformat()
+                    )
+                )
+                profit_rollups.record_real_profit(
+                    self.cursor, self.SYMBOL, now,
+                    float(cycle["gross"]), float(cycle["net"]),
+                    float(cycle["buy_fee"]) + float(cycle["sell_fee"])
+                )
+
+                # Restante dos lotes já foi gravado por match(); tudo na mesma transação
+                self._commit()
+                self.equity.on_sell(cycle["qty"], cycle["buy_price"] * cycle["qty"], cycle["net"])
+
+                msg = (
+                    f"💹 Lucro REAL Grid\n"
+                    f"Bruto: {cycle['gross']:.4f} USDT\n"
+                    f"Líquido (c/ taxas): {cycle['net']:.4f} USDT\n"
+                    f"BUY: {cycle['buy_price']:.2f} | SELL: {exec_price:.2f}\n"
+                    f"Qtd: {cycle['qty']:.6f} ({cycle['lots']} lote(s))"
+                )
+                self.logger.info(msg)
+                self.telegram_send(msg)
+
+    def _record_partial_fill(self, _id, order_id, order_info):
+        """
+        Ordem cancelada/expirada com execução parcial: a parte executada entra em
+        filled_orders e no livro de lotes como um fill (sem continuar o grid).
+        """
+        filled = float((order_info or {}).get('filled') or 0.0)
+        if filled <= 0:
+            return
+        self.cursor.execute("SELECT grid_index, price, side, amount FROM active_grids WHERE id=?", (_id,))
+        row = self.cursor.fetchone()
+        if row is None:
+            return
+        grid_index, price, side, amount = row
+        # Resposta do cancelamento pode vir sem taxas: busca a ordem completa
+        if not self.SIMULATION and not order_info.get('fee') and not order_info.get('fees'):
+            order_info = self._fetch_order_safely(order_id) or order_info
+        self.logger.warning(
+            f"Ordem {side} id={order_id} cancelada com {filled:.8f} de {amount} executados; registrando o parcial.",
+            extra={"grid_index": grid_index, "side": side, "order_id": order_id},
+        )
+        self.m_fills.inc(side=side)
+        self._record_execution(grid_index, order_id, side, price, amount, order_info)
+
     # --------------------------------------
     # SALDOS
     # --------------------------------------
@@ -913,12 +1438,18 @@ class GridBot:
 
     def get_total_btc_exposure_usd(self, current_price):
         """
-        Soma:
+        Com o livro global (EXPOSURE_LEDGER_DB): BUYs abertas + inventário em BTC
+        de TODOS os bots da conta, lidos de uma linha. Sem ele, cálculo local. Soma:
         - BTC livre na conta
         - BTC em BUYs FILLED sem SELL ainda
         - BTC em BUYs OPEN (reservado)
         Converte tudo para USD usando o preço atual.
         """
+        if self.exposure is not None:
+            exposure_usd = self.exposure.exposure_usd(current_price)
+            self.m_exposure.set(exposure_usd)
+            return exposure_usd
+
         total_btc = 0.0
 
         # 1. BTC livre
@@ -933,18 +1464,15 @@ class GridBot:
         for r in rows:
             total_btc += float(r[0])
 
-        # 3. BTC em BUYs já FILLED (na mão, aguardando SELL)
-        self.cursor.execute("""
-            SELECT amount FROM filled_orders
-            WHERE side='BUY' AND used_in_cycle=0
-        """)
-        rows = self.cursor.fetchall()
-        for r in rows:
-            total_btc += float(r[0])
+        # 3. BTC em lotes BUY ainda não vendidos (somente a quantidade restante)
+        total_btc += self.lots.open_qty
 
         # Converte para USD
-        return total_btc * current_price
+        exposure_usd = total_btc * current_price
+        self.m_exposure.set(exposure_usd)
+        return exposure_usd
 
+    @phase_timed("expiry_scan")
     def cancel_old_open_orders(self, hours=24):
         """
         Cancela todas as ordens OPEN com mais de X horas.
@@ -976,47 +1504,413 @@ class GridBot:
         self.telegram_send(f"⚠️ {len(expired)} ordens travadas > {hours}h. Cancelando e reiniciando GRID...")
 
         for _id, order_id, side in expired:
-            # 1. Tenta cancelar na Binance
-            if not self.SIMULATION:
-                try:
-                    self.exchange.cancel_order(order_id, self.SYMBOL)
-                    self.logger.info(f"Ordem REAL cancelada na Binance: {order_id}")
-                except Exception as e:
-                    self.logger.error(f"Erro ao cancelar ordem {order_id} na Binance: {e}")
-
-            # 2. Remove do SQLite
-            self.cursor.execute("DELETE FROM active_grids WHERE id=?", (_id,))
-            self.conn.commit()
-
-            self.logger.info(f"Ordem removida localmente: {order_id}")
+            self._cancel_grid_order(_id, order_id, force=True)
 
+        # BUYs canceladas liberam a reserva no livro global
+        self._sync_exposure()
         return True
 
+    def _cancel_grid_order(self, _id, order_id, force=False):
+        """
+        Cancela na exchange e marca CANCELED (o arquivamento move para o histórico).
+        Se a exchange recusar, só marca com force=True (ordens expiradas).
+        """
+        ok = True
+        order_info = None
+        if not self.SIMULATION:
+            try:
+                order_info = self.exchange.cancel_order(order_id, self.SYMBOL)
+                self.logger.info(f"Ordem REAL cancelada na Binance: {order_id}")
+            except Exception as e:
+                ok = False
+                self.logger.error(f"Erro ao cancelar ordem {order_id} na Binance: {e}")
+        elif order_id in self.exchange.orders:
+            try:
+                order_info = self.exchange.cancel_order(order_id, self.SYMBOL)
+            except Exception as e:
+                ok = False
+                self.logger.error(f"[SIM] Erro ao cancelar ordem {order_id}: {e}")
+
+        if not ok and not force:
+            return False
+        self.cursor.execute(
+            "UPDATE active_grids SET status='CANCELED', updated_at=? WHERE id=?",
+            (datetime.now().isoformat(), _id)
+        )
+        self._commit()
+        # Parte executada antes do cancelamento não some do PnL nem da exposição
+        self._record_partial_fill(_id, order_id, order_info)
+
+        self.logger.info(f"Ordem cancelada localmente: {order_id}")
+        return ok
+
     # --------------------------------------
-    # LOOP PRINCIPAL
+    # RECARGA DE CONFIGURAÇÃO
     # --------------------------------------
-    def run(self):
-        self.initialize_grid()
-        self.logger.info("Monitorando o Grid...")
-        self.telegram_send("Monitorando o Grid...")
+    def _check_config_reload(self):
+        change = self.config_watcher.poll()
+        if change is None:
+            return False
+        previous, values = change
+        hot_keys = {key for key, _cast, _default in self.HOT_CONFIG.values()}
+        restart_keys = [k for k in changed_keys(previous, values) if k not in hot_keys]
 
-        while True:
-            try:
-                # CANCELAMENTO AUTOMÁTICO POR TEMPO
-                if self.cancel_old_open_orders(hours=12):
-                    self.logger.info("Recriando GRID após cancelamento de ordens antigas...")
-                    self.initialize_grid()
-                    time.sleep(5)
-                    continue
+        try:
+            new = self._parse_grid_config(self.config_watcher.environment(values))
+        except ValueError as e:
+            msg = f"⚠️ .env recarregado com valor inválido ({e}). Configuração anterior mantida."
+            self.logger.error(msg)
+            self.telegram_send(msg)
+            return False
+
+        old = {attr: getattr(self, attr) for attr in new}
+        diff = [attr for attr in new if new[attr] != old[attr]]
+        lines = []
+        if diff:
+            self._apply_grid_config(new)
+            lines += [f"{self.HOT_CONFIG[a][0]}: {old[a]} -> {new[a]}" for a in diff]
+            lines.append(self._rebalance_grid(old))
+        if restart_keys:
+            lines.append(f"Requer reinício (não aplicado): {', '.join(restart_keys)}")
+        if not lines:
+            return False
+        msg = "🔧 Configuração recarregada\n" + "\n".join(lines)
+        self.logger.info(msg.replace("\n", " | "))
+        self.telegram_send(msg)
+        return bool(diff)
+
+    def _rebalance_grid(self, old):
+        """
+        Mínimo de mudanças nas BUYs OPEN após a recarga (SELLs ficam: pertencem a lotes comprados):
+        - nível acima de GRID_LEVELS ou preço fora da faixa -> cancela
+        - limite de exposição menor -> cancela as BUYs mais baixas até caber
+        - novo valor por nível -> recria a BUY no mesmo preço/nível com a nova quantidade
+        - mais níveis -> novas BUYs abaixo da última, no novo step
+        Offsets valem a partir das próximas ordens. Retorna o resumo das ações.
+        """
+        self.cursor.execute("""
+            SELECT id, grid_index, order_id, price, amount FROM active_grids
+            WHERE side='BUY' AND status='OPEN' ORDER BY price DESC
+        """)
+        rows = self.cursor.fetchall()
+        if not rows:
+            return "Sem BUYs abertas: novos valores valem para as próximas ordens."
+
+        cancel, keep = [], []
+        for row in rows:
+            _id, grid_index, order_id, price, amount = row
+            if grid_index > self.GRID_LEVELS or not (self.LOWER_PRICE <= price <= self.UPPER_PRICE):
+                cancel.append(row)
+            else:
+                keep.append(row)
+
+        # Limite menor: a exposição atual, sem as BUYs já descartadas, precisa caber
+        if self.MAX_BTC_USD < old['MAX_BTC_USD'] and keep:
+            current_price = self._refresh_book().bid
+            excess = (
+                self.get_total_btc_exposure_usd(current_price)
+                - sum(r[4] for r in cancel) * current_price
+                - self.MAX_BTC_USD
+            )
+            while excess > 0 and keep:
+                row = keep.pop()
+                cancel.append(row)
+                excess -= row[4] * current_price
+
+        resize = []
+        if self.INVESTMENT_PER_GRID != old['INVESTMENT_PER_GRID']:
+            for row in keep:
+                amount = float(self.exchange.amount_to_precision(self.SYMBOL, self.INVESTMENT_PER_GRID / row[3]))
+                if abs(amount - row[4]) > 1e-12:
+                    resize.append(row)
+
+        canceled = sum(1 for r in cancel if self._cancel_grid_order(r[0], r[2]))
+        replaced = [r for r in resize if self._cancel_grid_order(r[0], r[2])]
+        # Reservas das BUYs canceladas saem do livro antes das novas ordens
+        self._sync_exposure()
+        for _id, grid_index, order_id, price, amount in replaced:
+            self.place_order(price, "BUY", grid_index)
+
+        added = 0
+        if self.GRID_LEVELS > old['GRID_LEVELS'] and keep:
+            grid_index = max(r[1] for r in keep) + 1
+            next_price = keep[-1][3] - self.grid_step
+            while grid_index <= self.GRID_LEVELS and next_price >= self.LOWER_PRICE:
+                self.place_order(next_price, "BUY", grid_index)
+                self.cursor.execute(
+                    "SELECT 1 FROM active_grids WHERE grid_index=? AND side='BUY' AND status='OPEN'", (grid_index,)
+                )
+                if self.cursor.fetchone() is None:
+                    break   # bloqueada por saldo ou limite
+                added += 1
+                grid_index += 1
+                next_price -= self.grid_step
+
+        return f"Ordens: {canceled} BUYs canceladas, {len(replaced)} redimensionadas, {added} novas."
+
+    # --------------------------------------
+    # SNAPSHOT / RESTAURAÇÃO
+    # --------------------------------------
+    def _snapshot_mark(self):
+        """
+        Ponto do DB em que o snapshot foi tirado: muda a cada ordem, execução,
+        cancelamento ou intenção resolvida.
+        """
+        self.cursor.execute("""
+            SELECT (SELECT MAX(id) FROM active_grids), (SELECT MAX(id) FROM filled_orders),
+                   (SELECT MAX(id) FROM order_intents),
+                   (SELECT COUNT(*) FROM order_intents WHERE status='PENDING'),
+                   COUNT(*), TOTAL(id)
+            FROM active_grids WHERE status='OPEN'
+        """)
+        return list(self.cursor.fetchone())
 
-                # Lógica normal do grid
-                self.check_orders()
+    def _collect_snapshot(self):
+        self.cursor.execute("""
+            SELECT id, grid_index, order_id, price, side, amount, status, updated_at
+            FROM active_grids WHERE status IN ('OPEN', 'FILLED')
+        """)
+        orders = self.cursor.fetchall()
+        self.cursor.execute("""
+            SELECT id, grid_index, order_id, side, price, amount, fee, fee_currency, timestamp,
+                   remaining_amount, fee_quote
+            FROM filled_orders WHERE side='BUY' AND used_in_cycle=0
+        """)
+        lots = self.cursor.fetchall()
+        return {
+            'bot': 'grid',
+            'symbol': self.SYMBOL,
+            'saved_at': datetime.now().isoformat(),
+            'mark': self._snapshot_mark(),
+            'grid': {'lower': self.LOWER_PRICE, 'upper': self.UPPER_PRICE,
+                     'step': self.grid_step, 'levels': self.GRID_LEVELS},
+            'orders': orders,
+            'lots': lots,
+            'equity': self.equity.export_state(),
+            'intents': self.intents.export_state(),
+            'market': self.markets.get(self.SYMBOL),
+            'sim': self.sim_exchange.export_state() if self.SIMULATION else None,
+        }
+
+    def _final_snapshot(self):
+        if self.snapshots.maybe_capture(self._collect_snapshot, force=True):
+            self.snapshots.flush()
+
+    def _load_snapshot(self):
+        """
+        Lê o snapshot e define self.snapshot_mode:
+        - 'match': DB no mesmo ponto -> lotes/equity/intenções vêm do arquivo
+        - 'seed' : DB vazio (host novo) -> snapshot grava ordens, lotes e intenções no DB
+        - 'stale': DB mais novo -> DB vale; do snapshot só faixa do grid, mercado e exchange simulada
+        """
+        self.snapshot_mode = None
+        try:
+            snapshot = read_snapshot(self.SNAPSHOT_FILE) if self.SNAPSHOT_FILE else None
+        except (SnapshotError, OSError, ValueError) as e:
+            self.logger.error(f"Snapshot ignorado ({self.SNAPSHOT_FILE}): {e}")
+            return None
+        if snapshot is None:
+            return None
+        if snapshot.get('bot') != 'grid' or snapshot.get('symbol') != self.SYMBOL:
+            self.logger.warning(f"Snapshot de outro bot/par ({snapshot.get('symbol')}) ignorado.")
+            return None
+
+        # Faixa recentrada pelo grid dinâmico (não fica no DB)
+        grid = snapshot['grid']
+        if grid['step'] == self.grid_step and grid['levels'] == self.GRID_LEVELS:
+            self.LOWER_PRICE, self.UPPER_PRICE = grid['lower'], grid['upper']
+
+        self.cursor.execute("SELECT (SELECT COUNT(*) FROM active_grids), (SELECT COUNT(*) FROM filled_orders)")
+        empty_db = self.cursor.fetchone() == (0, 0)
+        if empty_db and (snapshot['orders'] or snapshot['lots']):
+            self._seed_from_snapshot(snapshot)
+            self.snapshot_mode = 'seed'
+        elif self._snapshot_mark() == snapshot['mark']:
+            self.snapshot_mode = 'match'
+        else:
+            self.snapshot_mode = 'stale'
+        self.logger.info(
+            f"Snapshot de {snapshot['saved_at']} carregado ({self.snapshot_mode}): "
+            f"{len(snapshot['orders'])} ordens, {len(snapshot['lots'])} lotes abertos."
+        )
+        return snapshot
+
+    def _seed_from_snapshot(self, snapshot):
+        """
+        Migração de host: recria no DB vazio o estado quente (ids preservados).
+        Histórico (ciclos fechados, rollups) não vai no snapshot: para levar, copie o DB.
+        """
+        for row in snapshot['orders']:
+            self.cursor.execute("""
+                INSERT INTO active_grids (id, grid_index, order_id, price, side, amount, status, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, row)
+        for row in snapshot['lots']:
+            self.cursor.execute("""
+                INSERT INTO filled_orders
+                (id, grid_index, order_id, side, price, amount, fee, fee_currency, timestamp,
+                 remaining_amount, fee_quote, used_in_cycle)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 0)
+            """, row)
+        self.intents.seed(snapshot['intents'])
+        self._commit()
+        self.logger.warning(
+            f"DB vazio: estado semeado a partir do snapshot ({len(snapshot['orders'])} ordens, "
+            f"{len(snapshot['lots'])} lotes)."
+        )
 
-                time.sleep(10)
+    def _reconcile_open_orders(self):
+        """
+        Confirma as ordens OPEN restauradas: uma chamada fetch_open_orders e
+        fetch_order só para as que não estão mais no livro.
+        """
+        try:
+            remote = self.exchange.fetch_open_orders(self.SYMBOL)
+        except Exception as e:
+            self.logger.error(f"Reconciliação: erro ao buscar ordens abertas: {e}")
+            return
+        remote_ids = {str(o['id']) for o in remote}
+
+        self.cursor.execute("SELECT id, grid_index, order_id, side FROM active_grids WHERE status='OPEN'")
+        local = self.cursor.fetchall()
+        confirmed = filled = canceled = 0
+        for _id, grid_index, order_id, side in local:
+            if str(order_id) in remote_ids:
+                confirmed += 1
+                continue
+            order_info = None
+            try:
+                order_info = self.exchange.fetch_order(order_id, self.SYMBOL)
+                status = order_info.get('status')
+            except ccxt.OrderNotFound:
+                status = 'canceled'
             except Exception as e:
-                self.logger.error(f"Erro no loop principal: {e}")
-                self.telegram_send(f"Erro no loop principal: {e}")
-                time.sleep(5)
+                self.logger.warning(f"Reconciliação: ordem {order_id} não verificada ({e})")
+                continue
+            if status == 'closed':
+                # Executada enquanto o bot estava parado: check_orders registra o fill
+                self.pending_fills.add(order_id)
+                filled += 1
+            elif status in ('canceled', 'expired', 'rejected'):
+                self.cursor.execute(
+                    "UPDATE active_grids SET status='CANCELED', updated_at=? WHERE id=?",
+                    (datetime.now().isoformat(), _id)
+                )
+                self._record_partial_fill(_id, order_id, order_info)
+                self._release_exposure(side, grid_index)
+                canceled += 1
+        self._commit()
+
+        known = {str(r[2]) for r in local}
+        unknown = [o for o in remote
+                   if str(o['id']) not in known and o.get('clientOrderId') not in self.intents.pending]
+        msg = (
+            f"Reconciliação do snapshot: {confirmed} confirmadas, {filled} executadas, "
+            f"{canceled} canceladas, {len(unknown)} abertas na exchange sem registro local"
+        )
+        if unknown or canceled:
+            self.logger.warning(msg)
+            self.telegram_send(f"⚠️ {msg}")
+        else:
+            self.logger.info(msg)
+
+    # --------------------------------------
+    # LOOP PRINCIPAL
+    # --------------------------------------
+    def start(self):
+        self.profiler = ProfilerControl(
+            self.logger,
+            trigger_file=self.PROFILE_TRIGGER_FILE,
+            default_seconds=self.PROFILE_SECONDS,
+            interval_ms=self.PROFILE_INTERVAL_MS,
+            name="grid_btc",
+        )
+        with self.startup.phase("archive"), self.phases.phase("archive"):
+            self.archiver.run_once()
+        # Estado restaurado do snapshot: confirma as ordens OPEN contra a exchange
+        if self.snapshot is not None:
+            with self.startup.phase("reconcile"):
+                self._reconcile_open_orders()
+            self.snapshot = None
+        atexit.register(self._final_snapshot)
+        # Base da recarga sem o .env observado (senão uma chave removida manteria o valor antigo)
+        if self.account is not None:
+            base, overrides = self.account.config_base, self.account.config_overrides
+        else:
+            base, overrides = process_environment(), None
+        self.config_watcher = ConfigWatcher(
+            self.CONFIG_FILE, self.CONFIG_RELOAD_SECONDS, self.logger, base=base, overrides=overrides
+        )
+        # Ordens enviadas e não gravadas antes da última parada
+        with self.startup.phase("resume"):
+            self._resolve_order_intents()
+            self.intents.prune()
+            self._commit()
+            self._sync_exposure()
+        with self.startup.phase("grid"):
+            self.initialize_grid()
+        self.logger.info("Monitorando o Grid...")
+        self.startup.notice("Monitorando o Grid...")
+
+    def step(self):
+        """
+        Uma iteração do loop principal; retorna os segundos até a próxima
+        (o supervisor multi-conta agenda as iterações por esse retorno).
+        """
+        iteration_start = time.perf_counter()
+        self.phases.begin_iteration()
+        try:
+            self.profiler.poll()
+
+            with self.phases.phase("archive"):
+                self.archiver.maybe_run()
+
+            # CANCELAMENTO AUTOMÁTICO POR TEMPO
+            if self.cancel_old_open_orders(hours=12):
+                self.logger.info("Recriando GRID após cancelamento de ordens antigas...")
+                self.initialize_grid()
+                return 5
+
+            # Lógica normal do grid
+            self.check_orders()
+            if not self.startup.done:
+                self.telegram_send(self.startup.finish(self.logger, self.metrics))
+            with self.phases.phase("snapshot"):
+                self.snapshots.maybe_capture(self._collect_snapshot)
+            with self.phases.phase("config_reload"):
+                self._check_config_reload()
+
+            return 10
+        except Exception as e:
+            self.logger.error(f"Erro no loop principal: {e}")
+            self.telegram_send(f"Erro no loop principal: {e}")
+            return 5
+        finally:
+            # Iteração com erro também fecha as fases (não vazam para a próxima)
+            self.m_loop.observe(time.perf_counter() - iteration_start)
+            self.phases.end_iteration()
+
+    def close(self):
+        """
+        Para as threads de fundo (métricas, Telegram, snapshot) e fecha as conexões
+        SQLite (descarte no supervisor / partida interrompida no meio).
+        """
+        atexit.unregister(self._final_snapshot)
+        if self.snapshotter is not None:
+            self.snapshotter.stop()
+        self.notifier.stop()
+        snapshots = getattr(self, 'snapshots', None)
+        if snapshots is not None:
+            snapshots.stop()
+        exposure = getattr(self, 'exposure', None)
+        if exposure is not None:
+            exposure.close()
+        self.conn.close()
+
+    def run(self):
+        self.start()
+        while True:
+            time.sleep(self.step())
 
 
 # ==========================================
@@ -1,59 +1,183 @@
-import ccxt
-import pandas as pd
-import numpy as np
+from fast_start import ccxt, StartupReport, preload, prime_markets, save_markets
 import time
-import sqlite3
-import logging
-import requests
 import os
 import sys
 from dotenv import load_dotenv
+from sim_exchange import SimExchange, LivePriceFeed, RecordedPriceFeed
+from exchange_recorder import RecordingExchange, ReplayExchange
+from market_data_hub import MarketDataClient, HubExchange
+from metrics import MetricsRegistry, InstrumentedExchange, SQLiteSnapshotter, start_http_server
+from notifier import TelegramNotifier
+from http_transport import session_options, shared_session, use_session
+from profiler import ProfilerControl, PhaseTimer, phase_timed
+from exposure_ledger import ExposureLedger, default_ledger_path
+from position_store import PositionStore
+from log_setup import setup_logging, set_context
 from datetime import datetime
-from ta.trend import ADXIndicator, EMAIndicator
-from ta.volatility import AverageTrueRange
 
 # ==========================================
 # CLASSE TREND BOT (ESTRATÉGIA SUPER_TREND + ADX)
 # ==========================================
 
 class TrendBot:
-    def __init__(self):
-        self._setup_logging()
-        self._load_config()
-        self._init_db()
-        self._connect_exchange()
+    def __init__(self, account=None):
+        # Conta do supervisor multi-conta (None = processo próprio, config do .env)
+        self.account = account
+        self.startup = StartupReport("TREND", started=None if account is None else time.time())
+        # pandas/ta (~1s de import) carregam em paralelo com DB e load_markets
+        preload("pandas", "ta.trend", "ta.volatility")
+        with self.startup.phase("config"):
+            self._setup_logging()
+            self._load_config()
+        with self.startup.phase("metrics"):
+            self._setup_metrics()
+        self.scanner = None
+        try:
+            with self.startup.phase("db"):
+                self._init_db()
+            with self.startup.phase("exchange"):
+                self._connect_exchange()
+            if self.SCANNER:
+                with self.startup.phase("scanner"):
+                    self._setup_scanner()
+        except BaseException:
+            # Partida interrompida (inclusive sys.exit): threads de fundo não sobrevivem ao bot
+            self.close()
+            raise
         self.running = True
 
     def _setup_logging(self):
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - [TREND] %(message)s',
-            handlers=[
-                logging.FileHandler("trend_bot_v2.log"),
-                logging.StreamHandler(sys.stdout)
-            ]
-        )
-        self.logger = logging.getLogger("TrendBot")
+        if self.account is not None:
+            # Supervisor: log do processo, com conta/estratégia em cada linha
+            self.logger = self.account.logger("trend")
+            return
+        # LOG_* do .env já valem aqui (fila + thread de escrita, rotação com .gz, amostragem)
+        load_dotenv()
+        self.logger = setup_logging("TrendBot", os.getenv('TREND_LOG_FILE', 'trend_bot_v2.log'), prefix="[TREND] ")
 
     def _load_config(self):
-        load_dotenv()
-        self.API_KEY = os.getenv('BINANCE_API_KEY')
-        self.SECRET_KEY = os.getenv('BINANCE_SECRET_KEY')
-        self.TG_TOKEN = os.getenv('TELEGRAM_TOKEN')
-        self.TG_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')
-        self.SIMULATION = os.getenv('MODO_SIMULACAO', 'true').lower() == 'true'
+        if self.account is None:
+            load_dotenv()
+        # Config da conta (supervisor) ou do processo (.env já carregado no ambiente)
+        env = self.env = self.account.env if self.account is not None else os.environ
+        # Diretório dos arquivos locais (o supervisor usa um por conta)
+        self.DATA_DIR = env.get('DATA_DIR', '')
+
+        self.API_KEY = env.get('BINANCE_API_KEY')
+        self.SECRET_KEY = env.get('BINANCE_SECRET_KEY')
+        self.TG_TOKEN = env.get('TELEGRAM_TOKEN')
+        self.TG_CHAT_ID = env.get('TELEGRAM_CHAT_ID')
+        self.SIMULATION = env.get('MODO_SIMULACAO', 'true').lower() == 'true'
         
-        self.SYMBOL = os.getenv('SYMBOL_TREND', 'BTC/USDT')
-        self.TIMEFRAME = os.getenv('TREND_TIMEFRAME', '1h')
-        self.RISK_PER_TRADE = float(os.getenv('TREND_RISK_PER_TRADE', 0.10))
+        self.SYMBOL = env.get('SYMBOL_TREND', 'BTC/USDT')
+        if self.account is None:
+            set_context(symbol=self.SYMBOL)
+        self.TIMEFRAME = env.get('TREND_TIMEFRAME', '1h')
+        # Candles de cada decisão (fetch_ohlcv); o scanner e o intrabar usam a mesma janela
+        self.CANDLE_LIMIT = 100
+        self.RISK_PER_TRADE = float(env.get('TREND_RISK_PER_TRADE', 0.10))
+        # Posições simultâneas, uma por par (com o scanner, o par de entrada muda e as abertas seguem)
+        self.MAX_POSITIONS = max(1, int(env.get('TREND_MAX_POSITIONS', 1)))
         
         # --- PARÂMETROS DA ESTRATÉGIA ---
-        self.SUPERTREND_PERIOD = 10
-        self.SUPERTREND_MULTIPLIER = 3.0
-        self.ADX_THRESHOLD = 25  # Só opera se a força da tendência for maior que 25
+        # (python backtest_trend.py --optimize avalia a grade em walk-forward)
+        self.SUPERTREND_PERIOD = int(env.get('TREND_SUPERTREND_PERIOD', 10))
+        self.SUPERTREND_MULTIPLIER = float(env.get('TREND_SUPERTREND_MULTIPLIER', 3.0))
+        self.ADX_THRESHOLD = float(env.get('TREND_ADX_THRESHOLD', 25))  # Só opera se a força da tendência for maior que isso
+
+        # Intrabar: stop, trailing e sinal avaliados a cada preço do ticker (TREND_TICK_SECONDS);
+        # indicadores completos só no fechamento do candle. false = fetch_ohlcv a cada 10s
+        self.INTRABAR = env.get('TREND_INTRABAR', 'true').lower() == 'true'
+        self.TICK_SECONDS = float(env.get('TREND_TICK_SECONDS', 2))
+        self.CANDLE_SYNC_SECONDS = float(env.get('TREND_CANDLE_SYNC_SECONDS', 60))  # máx./mín. do candle aberto
+
+        # Scanner multi-par: líquido, troca o par operado pelo melhor sinal entre os pares USDT
+        # (TREND_SCANNER=false mantém SYMBOL_TREND fixo)
+        self.SCANNER = env.get('TREND_SCANNER', 'false').lower() == 'true'
+        self.SCAN_MINUTES = float(env.get('TREND_SCAN_MINUTES', 15))
+        self.SCAN_TOP_VOLUME = int(env.get('TREND_SCAN_TOP_VOLUME', 200))  # 0 = todos os pares USDT
+        self.SCAN_CANDLES = int(env.get('TREND_SCAN_CANDLES', 300))  # guardados; sinais na janela do bot
+        self.SCAN_CONCURRENCY = int(env.get('TREND_SCAN_CONCURRENCY', 8))
+        self.CANDLE_DB = env.get('TREND_CANDLE_DB', os.path.join(self.DATA_DIR, 'candles.db'))
         
-        self.DB_NAME = "trend_data.db"
-        self.SIM_BALANCE = 1000.0 
+        self.DB_NAME = os.path.join(self.DATA_DIR, "trend_data.db")
+        # Saldo inicial da simulação; depois o saldo simulado persiste no banco (sim_ledger)
+        self.SIM_BALANCE = float(env.get('TREND_SIM_BALANCE', 1000.0))
+
+        # Exchange simulada (MODO_SIMULACAO)
+        self.SIM_FEED = env.get('SIM_FEED', 'live')
+        self.SIM_MAKER_FEE = float(env.get('SIM_MAKER_FEE', 0.001))
+        self.SIM_TAKER_FEE = float(env.get('SIM_TAKER_FEE', 0.001))
+        self.SIM_LATENCY_MS = float(env.get('SIM_LATENCY_MS', 0))
+
+        # Gravação / replay do tráfego com a exchange
+        self.EXCHANGE_RECORD_FILE = env.get('EXCHANGE_RECORD_FILE')
+        self.EXCHANGE_REPLAY_FILE = env.get('EXCHANGE_REPLAY_FILE')
+        self.EXCHANGE_REPLAY_SPEED = float(env.get('EXCHANGE_REPLAY_SPEED', 0))
+
+        # Hub local de dados de mercado (vazio = consulta a exchange direto)
+        self.MARKET_HUB_SOCKET = env.get('MARKET_HUB_SOCKET', '')
+        self.MARKET_HUB_MAX_AGE = float(env.get('MARKET_HUB_MAX_AGE', 5))
+
+        # Cache local do load_markets (0 = sempre busca na exchange)
+        self.MARKETS_CACHE_FILE = env.get('MARKETS_CACHE_FILE', 'markets_cache.json')
+        self.MARKETS_CACHE_HOURS = float(env.get('MARKETS_CACHE_HOURS', 24))
+
+        # Transporte HTTP: pool keep-alive, timeouts conexão/leitura, retry com jitter em GET
+        self.HTTP_OPTIONS = session_options(env)
+
+        # Métricas (0 desativa o endpoint HTTP)
+        self.METRICS_PORT = int(env.get('TREND_METRICS_PORT', 9103))
+        self.METRICS_SNAPSHOT_SECONDS = float(env.get('METRICS_SNAPSHOT_SECONDS', 60))
+
+        # Profiling sob demanda (SIGUSR1 ou arquivo de controle)
+        self.PROFILE_TRIGGER_FILE = env.get(
+            'TREND_PROFILE_TRIGGER_FILE', os.path.join(self.DATA_DIR, 'profile_trend.trigger')
+        )
+        self.PROFILE_SECONDS = float(env.get('PROFILE_SECONDS', 30))
+        self.PROFILE_INTERVAL_MS = float(env.get('PROFILE_INTERVAL_MS', 10))
+        self.SLOW_ITERATION_SECONDS = float(env.get('SLOW_ITERATION_SECONDS', 5))
+
+        # Livro global de exposição (o mesmo dos grids); limite em MAX_<BASE>_USD ou <BASE>_MAX_USD
+        self.EXPOSURE_LEDGER_DB = env.get(
+            'EXPOSURE_LEDGER_DB', os.path.join(self.DATA_DIR, default_ledger_path(self.SIMULATION))
+        )
+        self._set_symbol(self.SYMBOL)
+
+    def _set_symbol(self, symbol):
+        self.SYMBOL = symbol
+        self.BASE_ASSET = symbol.split('/')[0]
+
+    def exposure_cap(self, asset):
+        cap = self.env.get(f"MAX_{asset}_USD") or self.env.get(f"{asset}_MAX_USD")
+        return float(cap) if cap else None
+
+    def _setup_metrics(self):
+        self.metrics = MetricsRegistry(prefix="trendbot_")
+        self.m_loop = self.metrics.histogram("loop_iteration_seconds", "Duração de cada iteração do loop principal")
+        self.m_place = self.metrics.histogram("order_placement_seconds", "Round-trip de ordens a mercado", ("side",))
+        self.m_db_commit = self.metrics.histogram("db_commit_seconds", "Duração das transações SQLite")
+        self.m_in_position = self.metrics.gauge("in_position", "Número de posições abertas")
+        self.m_exposure = self.metrics.gauge("exposure_usd", "Valor das posições abertas em USD")
+        self.phases = PhaseTimer(self.logger, self.metrics, self.SLOW_ITERATION_SECONDS)
+
+        self.notifier = TelegramNotifier(
+            self.TG_TOKEN, self.TG_CHAT_ID, self.logger, parse_mode="Markdown", metrics=self.metrics,
+            prefix="" if self.account is None else f"[{self.account.name}] ",
+            session=shared_session("telegram", self.metrics, **self.HTTP_OPTIONS),
+        )
+
+        if self.METRICS_PORT:
+            try:
+                start_http_server(self.metrics, self.METRICS_PORT)
+                self.logger.info(f"Métricas em http://127.0.0.1:{self.METRICS_PORT}/metrics")
+            except OSError as e:
+                self.logger.error(f"Não foi possível abrir o endpoint de métricas: {e}")
+        self.snapshotter = None
+        if self.METRICS_SNAPSHOT_SECONDS > 0:
+            self.snapshotter = SQLiteSnapshotter(
+                self.metrics, self.DB_NAME, self.METRICS_SNAPSHOT_SECONDS, self.logger
+            ).start()
 
     def _connect_exchange(self):
         try:
@@ -63,37 +187,112 @@ class TrendBot:
                 'enableRateLimit': True,
                 'options': {'defaultType': 'spot'}
             })
-            self.exchange.load_markets()
+            # Conexões keep-alive compartilhadas no processo (supervisor: Session e orçamento da conta)
+            if self.account is not None:
+                self.account.attach(self.exchange, self.metrics)
+            else:
+                use_session(self.exchange, shared_session("binance", self.metrics, **self.HTTP_OPTIONS))
+            markets_cached = False
+            # O scanner precisa de todos os mercados (o cache guarda só os pares dos bots)
+            if not self.EXCHANGE_REPLAY_FILE and not self.SCANNER:
+                markets_cached = prime_markets(
+                    self.exchange, self.MARKETS_CACHE_FILE, [self.SYMBOL], self.MARKETS_CACHE_HOURS, self.logger
+                )
+            if self.MARKET_HUB_SOCKET and not self.EXCHANGE_REPLAY_FILE:
+                self.exchange = HubExchange(
+                    self.exchange, MarketDataClient(self.MARKET_HUB_SOCKET, self.logger),
+                    max_ticker_age=self.MARKET_HUB_MAX_AGE,
+                )
+            if self.EXCHANGE_REPLAY_FILE:
+                self.exchange = ReplayExchange(self.EXCHANGE_REPLAY_FILE, speed=self.EXCHANGE_REPLAY_SPEED)
+            elif self.EXCHANGE_RECORD_FILE:
+                self.exchange = RecordingExchange(self.exchange, self.EXCHANGE_RECORD_FILE)
+            markets = self.exchange.load_markets()
+            if not markets_cached and not self.EXCHANGE_REPLAY_FILE and self.MARKETS_CACHE_HOURS > 0:
+                save_markets(self.MARKETS_CACHE_FILE, markets, [self.SYMBOL], self.logger)
             self.logger.info(f"Conectado à Binance: {self.SYMBOL}")
         except Exception as e:
             self.logger.error(f"Erro Conexão: {e}")
             sys.exit(1)
 
+        self.sim_exchange = None
+        if self.SIMULATION:
+            # Saldo, ordens e taxas passam pela exchange simulada local
+            feed = LivePriceFeed(self.exchange) if self.SIM_FEED == 'live' else RecordedPriceFeed.from_csv(self.SIM_FEED)
+            quote = self.SYMBOL.split('/')[1]
+            # Primeira execução: TREND_SIM_BALANCE mais o ativo das posições já abertas (migradas)
+            balances = {quote: self.SIM_BALANCE}
+            for symbol, position in self.store.positions.items():
+                asset = symbol.split('/')[0]
+                balances[asset] = balances.get(asset, 0.0) + position['quantity']
+            self.exchange = self.sim_exchange = SimExchange(
+                self.exchange, feed,
+                balances=balances,
+                maker_fee=self.SIM_MAKER_FEE,
+                taker_fee=self.SIM_TAKER_FEE,
+                latency_ms=self.SIM_LATENCY_MS,
+            )
+            if self.store.sim_balances:
+                self.sim_exchange.restore_state({
+                    'free': {a: b[0] for a, b in self.store.sim_balances.items()},
+                    'used': {a: b[1] for a, b in self.store.sim_balances.items()},
+                    'orders': [],
+                })
+                saved = " · ".join(f"{b[0]:.8g} {a}" for a, b in sorted(self.store.sim_balances.items()) if b[0])
+                self.logger.info(f"[SIM] Saldos restaurados do banco: {saved} (TREND_SIM_BALANCE ignorado)")
+
+        self.exchange = InstrumentedExchange(self.exchange, self.metrics)
+
+    def _setup_scanner(self):
+        from trend_scanner import CandleStore, TrendScanner
+
+        self.scanner = TrendScanner(
+            self.exchange, CandleStore(self.CANDLE_DB), self.logger,
+            timeframe=self.TIMEFRAME,
+            candles=self.SCAN_CANDLES,
+            concurrency=self.SCAN_CONCURRENCY,
+            period=self.SUPERTREND_PERIOD,
+            multiplier=self.SUPERTREND_MULTIPLIER,
+            adx_threshold=self.ADX_THRESHOLD,
+            window=self.CANDLE_LIMIT,
+        )
+        self.next_scan = 0.0
+
     def _init_db(self):
-        conn = sqlite3.connect(self.DB_NAME)
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS position_state (
-                id INTEGER PRIMARY KEY,
-                in_position BOOLEAN,
-                entry_price REAL,
-                quantity REAL,
-                stop_loss REAL,
-                highest_price REAL,
-                entry_time TEXT
+        # Posições em memória com uma conexão aberta na execução toda (migra o position_state antigo)
+        self.store = PositionStore(self.DB_NAME, self.logger, self.SYMBOL, commit_histogram=self.m_db_commit)
+        for symbol, position in self.store.positions.items():
+            self.logger.info(
+                f"Posição aberta em {symbol}: {position['quantity']} @ {position['entry_price']} "
+                f"(stop {position['stop_loss']:.2f})"
+            )
+
+        # Posições abertas entram no livro global (contam no limite dos grids do mesmo ativo)
+        self.exposures = {}
+        for symbol in [self.SYMBOL] + self.store.symbols():
+            self.exposure_for(symbol)
+
+    def exposure_for(self, symbol):
+        """
+        Livro global do ativo do par (aberto e sincronizado com a posição no primeiro uso).
+        """
+        if not self.EXPOSURE_LEDGER_DB:
+            return None
+        asset = symbol.split('/')[0]
+        ledger = self.exposures.get(asset)
+        if ledger is None:
+            ledger = self.exposures[asset] = ExposureLedger(
+                self.EXPOSURE_LEDGER_DB, os.path.abspath(self.DB_NAME), asset, self.logger,
+                inventory_ref=f"inventory:{asset}",
             )
-        ''')
-        cursor.execute('SELECT count(*) FROM position_state')
-        if cursor.fetchone()[0] == 0:
-            cursor.execute('INSERT INTO position_state VALUES (1, 0, 0.0, 0.0, 0.0, 0.0, "")')
-        conn.commit()
-        conn.close()
+            position = self.store.get(symbol)
+            ledger.sync({}, position['quantity'] if position else 0.0)
+        return ledger
 
+    @phase_timed("telegram")
     def telegram_send(self, message):
-        if not self.TG_TOKEN or not self.TG_CHAT_ID: return
         try:
-            url = f"https://api.telegram.org/bot{self.TG_TOKEN}/sendMessage"
-            requests.post(url, json={"chat_id": self.TG_CHAT_ID, "text": message, "parse_mode": "Markdown"}, timeout=5)
+            self.notifier.send(message)
         except Exception as e:
             self.logger.error(f"Erro Telegram: {e}")
 
@@ -102,6 +301,8 @@ class TrendBot:
     # ==========================
 
     def calculate_supertrend(self, df):
+        from ta.volatility import AverageTrueRange
+
         # 1. ATR
         atr_indicator = AverageTrueRange(high=df['high'], low=df['low'], close=df['close'], window=self.SUPERTREND_PERIOD)
         df['atr'] = atr_indicator.average_true_range()
@@ -154,21 +355,70 @@ class TrendBot:
         df['In_Uptrend'] = in_uptrend
         return df
 
-    def process_data(self):
+    def candle_data(self, symbol):
+        """
+        Último candle (em formação) e o anterior, recalculando tudo sobre 100 candles.
+        """
+        df = self.process_data(symbol)
+        if df is None:
+            return None
+        return df.iloc[-1], df.iloc[-2]
+
+    def intrabar_data(self, symbol):
+        """
+        Mesmo (curr, prev) do candle_data, mas com um ticker por iteração: os 100 candles
+        só são baixados e recalculados quando o candle fecha (estado próprio por par).
+        """
+        from intrabar import IntrabarTrend
+
+        tracker = self.intrabar.get(symbol)
+        if tracker is None:
+            tracker = self.intrabar[symbol] = IntrabarTrend(
+                self.TIMEFRAME, self.SUPERTREND_PERIOD, self.SUPERTREND_MULTIPLIER, adx_window=14, ema_window=200,
+                window=self.CANDLE_LIMIT,
+            )
+        now_ms = int(time.time() * 1000)
         try:
-            ohlcv = self.exchange.fetch_ohlcv(self.SYMBOL, self.TIMEFRAME, limit=100)
-            df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-            
-            # 1. EMA 200 (Filtro Macro)
-            df['EMA_200'] = EMAIndicator(close=df["close"], window=200).ema_indicator()
-            
-            # 2. ADX (Filtro de Força)
-            adx = ADXIndicator(high=df['high'], low=df['low'], close=df['close'], window=14)
-            df['ADX'] = adx.adx()
-            
-            # 3. SuperTrend (Sinal de Entrada/Saída)
-            df = self.calculate_supertrend(df)
-            
+            if tracker.needs_rebuild(symbol, now_ms):
+                with self.phases.phase("market_data"):
+                    ohlcv = self.exchange.fetch_ohlcv(symbol, self.TIMEFRAME, limit=self.CANDLE_LIMIT)
+                with self.phases.phase("indicators"):
+                    tracker.rebuild(symbol, ohlcv, now_ms)
+                self.next_candle_sync[symbol] = time.monotonic() + self.CANDLE_SYNC_SECONDS
+            elif self.CANDLE_SYNC_SECONDS > 0 and time.monotonic() >= self.next_candle_sync.get(symbol, 0.0):
+                with self.phases.phase("market_data"):
+                    tracker.sync(self.exchange.fetch_ohlcv(symbol, self.TIMEFRAME, limit=1))
+                self.next_candle_sync[symbol] = time.monotonic() + self.CANDLE_SYNC_SECONDS
+
+            with self.phases.phase("ticker"):
+                price = self.exchange.fetch_ticker(symbol)['last']
+            with self.phases.phase("indicators"):
+                return tracker.update(price)
+        except Exception as e:
+            self.logger.error(f"Erro dados: {e}")
+            return None
+
+    def process_data(self, symbol):
+        import pandas as pd
+        from ta.trend import ADXIndicator, EMAIndicator
+
+        try:
+            with self.phases.phase("market_data"):
+                ohlcv = self.exchange.fetch_ohlcv(symbol, self.TIMEFRAME, limit=self.CANDLE_LIMIT)
+
+            with self.phases.phase("indicators"):
+                df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+
+                # 1. EMA 200 (Filtro Macro)
+                df['EMA_200'] = EMAIndicator(close=df["close"], window=200).ema_indicator()
+
+                # 2. ADX (Filtro de Força)
+                adx = ADXIndicator(high=df['high'], low=df['low'], close=df['close'], window=14)
+                df['ADX'] = adx.adx()
+
+                # 3. SuperTrend (Sinal de Entrada/Saída)
+                df = self.calculate_supertrend(df)
+
             return df
         except Exception as e:
             self.logger.error(f"Erro dados: {e}")
@@ -177,152 +427,305 @@ class TrendBot:
     # ==========================
     # GESTÃO DE ESTADO
     # ==========================
-    def get_state(self):
-        conn = sqlite3.connect(self.DB_NAME)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM position_state WHERE id=1')
-        row = cursor.fetchone()
-        conn.close()
-        return dict(row)
-
-    def update_state(self, **kwargs):
-        conn = sqlite3.connect(self.DB_NAME)
-        cursor = conn.cursor()
-        cols = ", ".join([f"{k}=?" for k in kwargs.keys()])
-        vals = list(kwargs.values())
-        sql = f"UPDATE position_state SET {cols} WHERE id=1"
-        cursor.execute(sql, vals)
-        conn.commit()
-        conn.close()
+    def save_sim_balances(self):
+        """
+        Saldo da exchange simulada vai para o banco junto com o próximo flush das posições.
+        """
+        if self.sim_exchange is not None:
+            state = self.sim_exchange.export_state(keep_closed=0)
+            self.store.save_sim_balances(state['free'], state['used'])
 
     # ==========================
     # EXECUÇÃO
     # ==========================
-    def execute_buy(self, price, stop_price):
-        balance = self.SIM_BALANCE if self.SIMULATION else self.exchange.fetch_balance()['USDT']['free']
+    @phase_timed("order_placement")
+    def execute_buy(self, symbol, price, stop_price):
+        asset, quote = symbol.split('/')
+        balance = self.exchange.fetch_balance()[quote]['free']
         cost = balance * self.RISK_PER_TRADE
         amount = cost / price
         
-        amount_final = self.exchange.amount_to_precision(self.SYMBOL, amount)
-        price_final = self.exchange.price_to_precision(self.SYMBOL, price)
+        amount_final = self.exchange.amount_to_precision(symbol, amount)
+        price_final = self.exchange.price_to_precision(symbol, price)
 
         if float(amount_final) * float(price_final) < 5:
             self.logger.warning("Saldo insuficiente.")
             return
 
-        if not self.SIMULATION:
-            try:
-                order = self.exchange.create_market_buy_order(self.SYMBOL, amount_final)
-                price_final = float(order.get('average', price_final))
-            except Exception as e:
-                self.logger.error(f"Erro Compra: {e}")
+        # Reserva no livro global antes da ordem (limite compartilhado com os grids)
+        exposure = self.exposure_for(symbol)
+        ref = f"position:{asset}"
+        cap = self.exposure_cap(asset)
+        if exposure is not None:
+            reserved, exposure_usd = exposure.reserve(ref, float(amount_final), float(price_final), cap)
+            if not reserved:
+                msg = (
+                    f"⛔ Compra bloqueada: exposição {asset} da conta em {exposure_usd:.2f} USD "
+                    f"(limite {cap} USD)."
+                )
+                self.logger.warning(msg)
+                self.telegram_send(msg)
                 return
 
-        self.update_state(
-            in_position=1, 
-            entry_price=float(price_final), 
-            quantity=float(amount_final), 
-            stop_loss=stop_price, # O Stop inicial é a linha do SuperTrend
-            highest_price=float(price_final),
-            entry_time=datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        )
-        msg = f"🚀 **COMPRA (SuperTrend)**\nPreço: {price_final}\nStop Inicial: {stop_price:.2f}"
+        try:
+            with self.m_place.time(side="BUY"):
+                order = self.exchange.create_market_buy_order(symbol, amount_final)
+            price_final = float(order.get('average') or price_final)
+
+            # Taxa cobrada no ativo base reduz a quantidade disponível para venda
+            fee = order.get('fee') or {}
+            amount_final = float(order.get('filled') or amount_final)
+            if fee.get('currency') == asset:
+                amount_final -= float(fee.get('cost') or 0.0)
+        except Exception as e:
+            self.logger.error(f"Erro Compra: {e}")
+            if exposure is not None:
+                exposure.release(ref)
+            return
+
+        if exposure is not None:
+            exposure.settle(ref, inventory=float(amount_final))
+
+        # Saldo simulado e posição nova gravados na mesma transação
+        self.save_sim_balances()
+        with self.phases.phase("state_db"):
+            self.store.open_position(
+                symbol,
+                entry_price=float(price_final),
+                quantity=float(amount_final),
+                stop_loss=stop_price, # O Stop inicial é a linha do SuperTrend
+                entry_time=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            )
+        msg = f"🚀 **COMPRA (SuperTrend)** {symbol}\nPreço: {price_final}\nStop Inicial: {stop_price:.2f}"
         self.logger.info(msg.replace('*','').replace('\n',' '))
         self.telegram_send(msg)
 
-    def execute_sell(self, price, reason, quantity):
-        if not self.SIMULATION:
-            try:
-                self.exchange.create_market_sell_order(self.SYMBOL, quantity)
-            except Exception as e:
-                self.logger.error(f"Erro Venda: {e}")
-                return
+    @phase_timed("order_placement")
+    def execute_sell(self, symbol, price, reason, quantity):
+        try:
+            with self.m_place.time(side="SELL"):
+                order = self.exchange.create_market_sell_order(symbol, quantity)
+            price = float(order.get('average') or price)
+        except Exception as e:
+            self.logger.error(f"Erro Venda: {e}")
+            return
 
-        state = self.get_state()
-        profit = (price - state['entry_price']) / state['entry_price'] * 100
-        
-        self.update_state(in_position=0, entry_price=0.0, quantity=0.0, stop_loss=0.0, highest_price=0.0, entry_time="")
-        
-        if self.SIMULATION:
-            self.SIM_BALANCE += (quantity * price) - (quantity * state['entry_price'])
+        exposure = self.exposure_for(symbol)
+        if exposure is not None:
+            exposure.settle(inventory=0.0)
 
+        self.save_sim_balances()
+        with self.phases.phase("state_db"):
+            position = self.store.close_position(symbol, price, reason)
+        profit = position['profit_pct']
+        
         emoji = "✅" if profit > 0 else "🔻"
-        msg = f"{emoji} **VENDA ({reason})**\nPreço: {price}\nResultado: {profit:.2f}%"
+        label = f" {symbol}" if self.MAX_POSITIONS > 1 else ""
+        msg = f"{emoji} **VENDA ({reason})**{label}\nPreço: {price}\nResultado: {profit:.2f}%"
         self.logger.info(msg.replace('*','').replace('\n',' '))
         self.telegram_send(msg)
 
+    # ==========================
+    # SCANNER MULTI-PAR
+    # ==========================
+    @phase_timed("scanner")
+    def scan_market(self):
+        """
+        Com vaga para posição: varre os pares USDT e passa a buscar entrada no melhor sinal
+        de compra. Posições abertas continuam acompanhadas no próprio par até a saída.
+        """
+        from trend_scanner import top_by_volume, usdt_universe
+
+        self.next_scan = time.monotonic() + self.SCAN_MINUTES * 60
+        if len(self.store.positions) >= self.MAX_POSITIONS:
+            return
+        try:
+            symbols = usdt_universe(self.exchange.load_markets())
+            if self.SCAN_TOP_VOLUME:
+                symbols = top_by_volume(self.exchange, symbols, self.SCAN_TOP_VOLUME)
+            ranking = self.scanner.scan(symbols)
+        except Exception as e:
+            self.logger.error(f"Erro scanner: {e}")
+            return
+
+        top = " · ".join(
+            f"{r['symbol']} ADX {r['adx']:.1f}{' COMPRA' if r['signal'] else ''}" for r in ranking[:5]
+        )
+        self.logger.info(f"🔎 Melhores pares: {top}")
+        best = next((r for r in ranking if r['signal'] and r['symbol'] not in self.store.positions), None)
+        if best is not None and best['symbol'] != self.SYMBOL:
+            self.switch_symbol(best['symbol'])
+
+    def switch_symbol(self, symbol):
+        old = self.SYMBOL
+        self._set_symbol(symbol)
+        if self.account is None:
+            set_context(symbol=symbol)
+        # Ativo antigo sem posição sai do livro (linhas zeradas); o novo é sincronizado no primeiro uso
+        if old not in self.store.positions:
+            ledger = self.exposures.pop(old.split('/')[0], None)
+            if ledger is not None:
+                ledger.sync({}, 0.0)
+                ledger.close()
+            self.intrabar.pop(old, None)
+        self.exposure_for(symbol)
+        msg = f"🔎 Scanner: {old} -> {symbol}"
+        self.logger.info(msg)
+        self.telegram_send(msg)
+
     # ==========================
     # LOOP PRINCIPAL
     # ==========================
-    def run(self):
+    def start(self):
+        # Estado intrabar por par (posições abertas + par de entrada)
+        self.intrabar = {}
+        self.next_candle_sync = {}
+        self.last_stop_notice = {}
+        self.profiler = ProfilerControl(
+            self.logger,
+            trigger_file=self.PROFILE_TRIGGER_FILE,
+            default_seconds=self.PROFILE_SECONDS,
+            interval_ms=self.PROFILE_INTERVAL_MS,
+            name="trend",
+        )
         self.logger.info("🔥 Bot Trend (SuperTrend + ADX) Iniciado!")
-        self.telegram_send("🔥 **BOT TREND V2 (SuperTrend)** Iniciado")
-        
-        while self.running:
-            try:
-                df = self.process_data()
-                if df is None: 
-                    time.sleep(10)
-                    continue
-
-                curr = df.iloc[-1]
-                prev = df.iloc[-2]
-                price = float(curr['close'])
-                state = self.get_state()
-
-                # LOG DE MONITORAMENTO (A cada 1 minuto)
-                if int(time.time()) % 60 == 0:
-                    status = "COMPRADO" if state['in_position'] else "LIQUIDO"
-                    trend_str = "ALTA" if curr['In_Uptrend'] else "BAIXA"
-                    self.logger.info(f"[{status}] Preço: {price:.2f} | Tendência: {trend_str} | ADX: {curr['ADX']:.2f}")
-                    self.telegram_send(f"[{status}] Preço: {price:.2f} | Tendência: {trend_str} | ADX: {curr['ADX']:.2f}")
-
-                # --- MODO COMPRADO ---
-                if state['in_position']:
-                    # 1. Saída Pelo SuperTrend (Inversão de Tendência)
-                    # Se o SuperTrend ficar VERMELHO (False) ou preço cruzar linha
-                    if not curr['In_Uptrend']: 
-                        self.execute_sell(price, "Inversão de Tendência", state['quantity'])
-                    
-                    # 2. Saída por Stop Loss (Segurança)
-                    elif price < state['stop_loss']:
-                         self.execute_sell(price, "Stop Loss Tocado", state['quantity'])
-                    
-                    # 3. Atualizar Stop Móvel (Trailing)
-                    # Se o SuperTrend subir, nós subimos o stop loss para a linha dele
-                    elif curr['SuperTrend'] > state['stop_loss']:
-                        self.update_state(stop_loss=curr['SuperTrend'])
-                        self.logger.info(f"🔒 Stop ajustado para linha SuperTrend: {curr['SuperTrend']:.2f}")
-                        self.telegram_send(f"🔒 Stop ajustado para linha SuperTrend: {curr['SuperTrend']:.2f}")
-
-                # --- MODO LÍQUIDO (Buscando Compra) ---
+        self.startup.notice("🔥 **BOT TREND V2 (SuperTrend)** Iniciado")
+
+    def evaluate(self, symbol):
+        """
+        Sinais de um par: saída / stop móvel se há posição nele, entrada se não há.
+        Retorna o preço atual (None se os dados falharam).
+        """
+        market = self.intrabar_data(symbol) if self.INTRABAR else self.candle_data(symbol)
+        if market is None:
+            return None
+
+        curr, prev = market
+        price = float(curr['close'])
+        position = self.store.get(symbol)
+
+        # LOG DE MONITORAMENTO (A cada 1 minuto)
+        if int(time.time()) % 60 == 0:
+            status = "COMPRADO" if position else "LIQUIDO"
+            label = f" {symbol}" if self.MAX_POSITIONS > 1 else ""
+            trend_str = "ALTA" if curr['In_Uptrend'] else "BAIXA"
+            self.logger.info(f"[{status}]{label} Preço: {price:.2f} | Tendência: {trend_str} | ADX: {curr['ADX']:.2f}")
+            self.telegram_send(f"[{status}]{label} Preço: {price:.2f} | Tendência: {trend_str} | ADX: {curr['ADX']:.2f}")
+
+        # --- MODO COMPRADO ---
+        if position:
+            # 1. Saída Pelo SuperTrend (Inversão de Tendência)
+            # Se o SuperTrend ficar VERMELHO (False) ou preço cruzar linha
+            if not curr['In_Uptrend']: 
+                self.execute_sell(symbol, price, "Inversão de Tendência", position['quantity'])
+
+            # 2. Saída por Stop Loss (Segurança)
+            elif price < position['stop_loss']:
+                 self.execute_sell(symbol, price, "Stop Loss Tocado", position['quantity'])
+
+            # 3. Atualizar Stop Móvel (Trailing)
+            # Se o SuperTrend subir, nós subimos o stop loss para a linha dele
+            # (só em memória; gravado no flush do fim da iteração)
+            elif curr['SuperTrend'] > position['stop_loss']:
+                self.store.update_position(symbol, stop_loss=float(curr['SuperTrend']))
+                self.logger.info(f"🔒 Stop ajustado para linha SuperTrend: {curr['SuperTrend']:.2f}")
+                # Intrabar a linha sobe a cada preço: no Telegram, no máximo um aviso por minuto por par
+                if time.monotonic() - self.last_stop_notice.get(symbol, 0.0) >= 60:
+                    self.last_stop_notice[symbol] = time.monotonic()
+                    label = f"{symbol} " if self.MAX_POSITIONS > 1 else ""
+                    self.telegram_send(f"🔒 {label}Stop ajustado para linha SuperTrend: {curr['SuperTrend']:.2f}")
+
+        # --- MODO LÍQUIDO (Buscando Compra) ---
+        else:
+            # SINAL DE COMPRA:
+            # 1. SuperTrend virou para ALTA (Candle atual verde, anterior era vermelho OU cruzou)
+            sinal_compra = curr['In_Uptrend'] and not prev['In_Uptrend']
+
+            # 2. Se já estava verde, mas preço tocou na linha e subiu (Reentrada)
+            # (Simplificado: vamos focar na virada de mão para ser mais seguro)
+
+            # FILTROS:
+            tendencia_macro = price > curr['EMA_200'] # Opcional: só compra se tiver acima da média de 200
+            forca_tendencia = curr['ADX'] > self.ADX_THRESHOLD
+
+            if sinal_compra:
+                if forca_tendencia:
+                    self.execute_buy(symbol, price, curr['SuperTrend'])
                 else:
-                    # SINAL DE COMPRA:
-                    # 1. SuperTrend virou para ALTA (Candle atual verde, anterior era vermelho OU cruzou)
-                    sinal_compra = curr['In_Uptrend'] and not prev['In_Uptrend']
-                    
-                    # 2. Se já estava verde, mas preço tocou na linha e subiu (Reentrada)
-                    # (Simplificado: vamos focar na virada de mão para ser mais seguro)
-                    
-                    # FILTROS:
-                    tendencia_macro = price > curr['EMA_200'] # Opcional: só compra se tiver acima da média de 200
-                    forca_tendencia = curr['ADX'] > self.ADX_THRESHOLD
-
-                    if sinal_compra:
-                        if forca_tendencia:
-                            self.execute_buy(price, curr['SuperTrend'])
-                        else:
-                            self.logger.info(f"⚠️ Sinal SuperTrend ignorado: ADX fraco ({curr['ADX']:.2f})")
-
-                time.sleep(10)
+                    self.logger.info(f"⚠️ Sinal SuperTrend ignorado: ADX fraco ({curr['ADX']:.2f})")
+
+        return price
 
+    def step(self):
+        """
+        Uma iteração do loop principal; retorna os segundos até a próxima
+        (o supervisor multi-conta agenda as iterações por esse retorno).
+        """
+        iteration_start = time.perf_counter()
+        self.phases.begin_iteration()
+        try:
+            self.profiler.poll()
+
+            if self.scanner is not None and time.monotonic() >= self.next_scan:
+                self.scan_market()
+
+            # Posições abertas (cada uma no seu par) + o par de entrada enquanto houver vaga
+            symbols = self.store.symbols()
+            if self.SYMBOL not in symbols and len(symbols) < self.MAX_POSITIONS:
+                symbols.append(self.SYMBOL)
+            for stale in set(self.intrabar) - set(symbols):
+                del self.intrabar[stale]
+            prices = {}
+            for symbol in symbols:
+                price = self.evaluate(symbol)
+                if price is not None:
+                    prices[symbol] = price
+
+            # Ajustes de stop da iteração: uma transação só (aberturas/saídas já gravaram)
+            with self.phases.phase("state_db"):
+                self.store.flush()
+            self.m_in_position.set(len(self.store.positions))
+            self.m_exposure.set(self.store.exposure_usd(prices))
+
+            if not prices:
+                return 10
+
+            if not self.startup.done:
+                self.telegram_send(self.startup.finish(self.logger, self.metrics))
+            return self.TICK_SECONDS if self.INTRABAR else 10
+        except Exception as e:
+            self.logger.error(f"Loop erro: {e}")
+            return 10
+        finally:
+            # Iteração com erro também fecha as fases (não vazam para a próxima)
+            self.m_loop.observe(time.perf_counter() - iteration_start)
+            self.phases.end_iteration()
+
+    def close(self):
+        """
+        Grava o que estiver pendente, para as threads de fundo e fecha as conexões
+        (fim do run / descarte no supervisor / partida interrompida no meio).
+        """
+        if self.snapshotter is not None:
+            self.snapshotter.stop()
+        self.notifier.stop()
+        store = getattr(self, 'store', None)
+        if store is not None:
+            store.close()
+        for ledger in getattr(self, 'exposures', {}).values():
+            ledger.close()
+        if self.scanner is not None:
+            self.scanner.store.close()
+
+    def run(self):
+        self.start()
+        while self.running:
+            try:
+                time.sleep(self.step())
             except KeyboardInterrupt:
                 self.running = False
-            except Exception as e:
-                self.logger.error(f"Loop erro: {e}")
-                time.sleep(10)
+        self.close()
 
 if __name__ == "__main__":
     bot = TrendBot()
-    bot.run()
\ No newline at end of file
+    bot.run()
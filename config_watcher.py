@@ -0,0 +1,115 @@
+import hashlib
+import os
+import time
+
+from dotenv import dotenv_values, load_dotenv
+
+
+# ==========================================
+# RECARGA A QUENTE DO .env
+# ==========================================
+# Polling de mtime/tamanho (um os.stat a cada N segundos, sem dependências).
+# Mudou -> relê o arquivo; conteúdo diferente -> o bot recebe o mapeamento
+# completo (ambiente + .env), valida tudo antes de trocar e só então aplica.
+# Partida e recarga usam a mesma precedência: o .env sobre o ambiente de antes
+# do load_dotenv (chave removida do .env volta ao padrão, não ao valor antigo).
+
+_process_env = None           # ambiente do processo antes da primeira carga do .env
+
+
+def load_env_file(path=".env"):
+    """
+    load_dotenv(override=True) guardando antes o ambiente do processo (base da recarga).
+    """
+    global _process_env
+    if _process_env is None:
+        _process_env = dict(os.environ)
+    load_dotenv(dotenv_path=path, override=True)
+
+
+def process_environment():
+    """
+    Ambiente do processo sem o .env (o atual, se load_env_file ainda não rodou).
+    """
+    return dict(os.environ if _process_env is None else _process_env)
+
+
+class ConfigWatcher:
+    def __init__(self, path, interval, logger, base=None, overrides=None):
+        self.path = path
+        self.base = base              # config sem o .env (None = ambiente do processo antes do .env)
+        self.overrides = overrides or {}  # acima do .env ("env" do accounts.json)
+        self.interval = float(interval)
+        self.logger = logger
+        self._next = time.monotonic() + self.interval
+        self._signature = self._stat()
+        self._digest = self._hash()
+        self.values = self._read() if self._signature else {}
+
+    @property
+    def enabled(self):
+        return bool(self.path) and self.interval > 0
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _hash(self):
+        try:
+            with open(self.path, "rb") as f:
+                return hashlib.sha1(f.read()).hexdigest()
+        except OSError:
+            return None
+
+    def _read(self):
+        return {k: v for k, v in dotenv_values(self.path).items() if v is not None}
+
+    def poll(self):
+        """
+        Retorna (anterior, novo) com os valores do .env quando o conteúdo mudou; senão None.
+        """
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        if now < self._next:
+            return None
+        self._next = now + self.interval
+
+        signature = self._stat()
+        if signature is None or signature == self._signature:
+            return None
+        self._signature = signature
+        digest = self._hash()
+        if digest == self._digest:
+            return None
+        self._digest = digest
+        try:
+            values = self._read()
+        except Exception as e:
+            self.logger.error(f"Erro ao ler {self.path}: {e}")
+            return None
+        previous, self.values = self.values, values
+        return previous, values
+
+    def environment(self, values):
+        """
+        Mapeamento efetivo, na precedência da partida: base (ambiente do processo ou da conta,
+        sem o .env) < .env (como load_dotenv(override=True)) < overrides.
+        """
+        env = process_environment() if self.base is None else dict(self.base)
+        env.update(values)
+        env.update(self.overrides)
+        return env
+
+
+def changed_keys(previous, values, keys=None):
+    """
+    Chaves do .env cujo valor mudou (opcionalmente restritas a `keys`).
+    """
+    names = set(previous) | set(values)
+    if keys is not None:
+        names &= set(keys)
+    return sorted(k for k in names if previous.get(k) != values.get(k))
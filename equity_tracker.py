@@ -0,0 +1,217 @@
+import sqlite3
+import time
+from datetime import datetime
+
+import profit_rollups
+
+
+# ==========================================
+# EQUITY / PnL NÃO REALIZADO (MARK-TO-MARKET)
+# ==========================================
+# Totais correntes atualizados a cada fill:
+# - inventário (qtd) e custo -> preço médio
+# - PnL realizado (líquido, já com taxas normalizadas)
+# A cada ticker: não realizado = qtd * preço - custo, em O(1).
+# Snapshots periódicos alimentam o relatório de drawdown.
+
+
+def ensure_equity_tables(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS equity_state (
+            symbol TEXT PRIMARY KEY,
+            peak_equity REAL,
+            max_drawdown REAL,
+            updated_at TEXT
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS equity_snapshots (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT,
+            symbol TEXT,
+            price REAL,
+            qty REAL,
+            avg_cost REAL,
+            realized REAL,
+            unrealized REAL,
+            equity REAL,
+            drawdown REAL
+        )
+    ''')
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_equity_snapshots_ts ON equity_snapshots (symbol, timestamp)"
+    )
+
+
+class EquityTracker:
+    """
+    Equity da estratégia = PnL realizado + PnL não realizado do inventário.
+    Pico e drawdown máximo persistem em equity_state (sobrevivem a reinícios).
+    """
+
+    def __init__(self, conn, symbol, logger, snapshot_seconds=300, metrics=None):
+        self.conn = conn
+        self.symbol = symbol
+        self.logger = logger
+        self.snapshot_seconds = float(snapshot_seconds)
+
+        self.qty = 0.0
+        self.cost = 0.0
+        self.realized = 0.0
+        self.price = None
+        self.peak = None
+        self.max_drawdown = 0.0
+        self._last_snapshot = 0.0
+
+        self._gauges = None
+        if metrics is not None:
+            self._gauges = {
+                "realized": metrics.gauge("equity_realized_pnl", "PnL realizado acumulado (quote)"),
+                "unrealized": metrics.gauge("equity_unrealized_pnl", "PnL não realizado do inventário (quote)"),
+                "drawdown": metrics.gauge("equity_drawdown", "Distância do pico de equity (quote)"),
+            }
+
+    # --------------------------------------
+    # CARGA (SEM VARRER HISTÓRICO)
+    # --------------------------------------
+    def load(self, open_qty, open_cost):
+        """
+        Inventário vem do livro de lotes; realizado vem do rollup total (1 linha).
+        """
+        self.qty = float(open_qty)
+        self.cost = float(open_cost)
+        self.realized = profit_rollups.read_totals(self.conn, self.symbol)["net"]
+
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT peak_equity, max_drawdown FROM equity_state WHERE symbol=?", (self.symbol,))
+        row = cursor.fetchone()
+        if row:
+            self.peak, self.max_drawdown = row[0], float(row[1] or 0.0)
+
+    def export_state(self):
+        return {"qty": self.qty, "cost": self.cost, "realized": self.realized,
+                "peak": self.peak, "max_drawdown": self.max_drawdown}
+
+    def restore_state(self, state):
+        """
+        Estado de um snapshot (mesmo ponto do DB): dispensa as leituras do load().
+        """
+        self.qty = float(state["qty"])
+        self.cost = float(state["cost"])
+        self.realized = float(state["realized"])
+        self.peak = state.get("peak")
+        self.max_drawdown = float(state.get("max_drawdown") or 0.0)
+
+    # --------------------------------------
+    # FILLS
+    # --------------------------------------
+    def on_buy(self, qty, price):
+        self.qty += float(qty)
+        self.cost += float(qty) * float(price)
+
+    def on_sell(self, matched_qty, matched_cost, net_profit):
+        self.qty = max(0.0, self.qty - float(matched_qty))
+        self.cost = max(0.0, self.cost - float(matched_cost))
+        self.realized += float(net_profit)
+        if self.price is not None:
+            self.mark(self.price)
+
+    # --------------------------------------
+    # MARK-TO-MARKET
+    # --------------------------------------
+    @property
+    def avg_cost(self):
+        return self.cost / self.qty if self.qty > 0 else 0.0
+
+    @property
+    def unrealized(self):
+        if self.price is None:
+            return 0.0
+        return self.qty * self.price - self.cost
+
+    @property
+    def equity(self):
+        return self.realized + self.unrealized
+
+    def mark(self, price):
+        """
+        Chamado a cada ticker. O(1); grava snapshot só a cada snapshot_seconds.
+        """
+        self.price = float(price)
+        equity = self.equity
+
+        if self.peak is None or equity > self.peak:
+            self.peak = equity
+        drawdown = self.peak - equity
+        if drawdown > self.max_drawdown:
+            self.max_drawdown = drawdown
+
+        if self._gauges:
+            self._gauges["realized"].set(self.realized)
+            self._gauges["unrealized"].set(self.unrealized)
+            self._gauges["drawdown"].set(drawdown)
+
+        if self.snapshot_seconds > 0 and time.monotonic() - self._last_snapshot >= self.snapshot_seconds:
+            self.snapshot(drawdown)
+
+        return equity
+
+    def snapshot(self, drawdown=None):
+        self._last_snapshot = time.monotonic()
+        if self.price is None:
+            return
+        if drawdown is None:
+            drawdown = (self.peak or 0.0) - self.equity
+        now = datetime.now().isoformat()
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute('''
+                INSERT INTO equity_snapshots
+                (timestamp, symbol, price, qty, avg_cost, realized, unrealized, equity, drawdown)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (now, self.symbol, self.price, self.qty, self.avg_cost, self.realized,
+                  self.unrealized, self.equity, drawdown))
+            cursor.execute('''
+                INSERT INTO equity_state (symbol, peak_equity, max_drawdown, updated_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(symbol) DO UPDATE SET
+                    peak_equity = excluded.peak_equity,
+                    max_drawdown = excluded.max_drawdown,
+                    updated_at = excluded.updated_at
+            ''', (self.symbol, self.peak, self.max_drawdown, now))
+            self.conn.commit()
+        except sqlite3.Error as e:
+            self.logger.error(f"Erro ao gravar snapshot de equity: {e}")
+
+
+def read_drawdown(conn: sqlite3.Connection, since: datetime, symbol=None):
+    """
+    Para relatórios: último snapshot, drawdown máximo na janela e desde sempre.
+    Usa o índice (symbol, timestamp); não toca no histórico de ordens.
+    """
+    cursor = conn.cursor()
+    sym_sql, params = ("", ())
+    if symbol:
+        sym_sql, params = (" AND symbol=?", (symbol,))
+
+    cursor.execute(
+        "SELECT unrealized, equity, qty, avg_cost FROM equity_snapshots WHERE 1=1" + sym_sql +
+        " ORDER BY timestamp DESC LIMIT 1", params
+    )
+    last = cursor.fetchone()
+    cursor.execute(
+        "SELECT COALESCE(MAX(drawdown), 0.0) FROM equity_snapshots WHERE timestamp >= ?" + sym_sql,
+        (since.isoformat(),) + params
+    )
+    window_dd = float(cursor.fetchone()[0] or 0.0)
+    cursor.execute("SELECT COALESCE(MAX(max_drawdown), 0.0) FROM equity_state WHERE 1=1" + sym_sql, params)
+    max_dd = float(cursor.fetchone()[0] or 0.0)
+
+    return {
+        "unrealized": float(last[0]) if last else 0.0,
+        "equity": float(last[1]) if last else 0.0,
+        "qty": float(last[2]) if last else 0.0,
+        "avg_cost": float(last[3]) if last else 0.0,
+        "drawdown_window": window_dd,
+        "max_drawdown": max_dd,
+    }
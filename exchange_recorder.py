@@ -0,0 +1,191 @@
+import gzip
+import json
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+
+import ccxt
+
+
+# Métodos puramente locais do ccxt: não geram tráfego, não são gravados
+# e no replay são calculados a partir dos mercados gravados.
+LOCAL_METHODS = {
+    'amount_to_precision', 'price_to_precision', 'cost_to_precision', 'fee_to_precision',
+    'currency_to_precision', 'iso8601', 'parse8601', 'milliseconds', 'seconds',
+    'market', 'market_id', 'safe_market', 'symbol',
+}
+
+
+def _open(path, mode):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def read_records(path):
+    """
+    Lê o arquivo de gravação (JSON lines, opcionalmente .gz).
+    """
+    with _open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+# ==========================================
+# GRAVAÇÃO
+# ==========================================
+
+class RecordingExchange:
+    """
+    Proxy em volta do cliente ccxt que grava cada chamada (método, argumentos,
+    resposta ou erro, horário e duração) em um arquivo append-only JSON lines.
+    Atributos e métodos locais são repassados sem gravação.
+    """
+
+    def __init__(self, client, path):
+        self._client = client
+        self._path = path
+        self._file = _open(path, 'a')
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if name.startswith('_') or name in LOCAL_METHODS or not callable(attr):
+            return attr
+
+        def recorded(*args, **kwargs):
+            started = time.time()
+            t0 = time.perf_counter()
+            entry = {'t': round(started * 1000, 3), 'm': name, 'a': list(args), 'k': kwargs}
+            try:
+                result = attr(*args, **kwargs)
+                entry['r'] = result
+                return result
+            except Exception as e:
+                entry['e'] = {'type': type(e).__name__, 'msg': str(e)}
+                raise
+            finally:
+                entry['d'] = round((time.perf_counter() - t0) * 1000, 3)
+                self._write(entry)
+
+        return recorded
+
+    def _write(self, entry):
+        line = json.dumps(entry, separators=(',', ':'), default=str, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + '\n')
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+# ==========================================
+# REPLAY
+# ==========================================
+
+class ReplayExchange:
+    """
+    Serve as respostas gravadas, na ordem original de cada método, sem rede.
+    - speed=0   -> velocidade máxima
+    - speed=1.0 -> ritmo original entre chamadas (2.0 = duas vezes mais rápido)
+    Argumentos diferentes do gravado são registrados em self.divergences
+    (ou levantam erro com strict=True) para detectar regressões de comportamento.
+    """
+
+    def __init__(self, path, speed=0.0, strict=False):
+        self.speed = float(speed)
+        self.strict = strict
+        self.divergences = []
+        self.calls = defaultdict(int)
+
+        self._queues = defaultdict(deque)
+        self._first_t = None
+        for rec in read_records(path):
+            if self._first_t is None:
+                self._first_t = rec['t']
+            self._queues[rec['m']].append(rec)
+
+        self._start = None
+        self.markets = None
+        self._local = ccxt.binance()
+
+    def _pace(self, rec):
+        if self.speed <= 0 or self._first_t is None:
+            return
+        if self._start is None:
+            self._start = time.perf_counter()
+        target = (rec['t'] - self._first_t) / 1000.0 / self.speed
+        wait = target - (time.perf_counter() - self._start)
+        if wait > 0:
+            time.sleep(wait)
+
+    def _serve(self, name, args, kwargs):
+        queue = self._queues.get(name)
+        if not queue:
+            raise ccxt.ExchangeError(f"Replay: sem respostas gravadas para {name}")
+
+        rec = queue.popleft()
+        self.calls[name] += 1
+        self._pace(rec)
+
+        expected = json.loads(json.dumps([rec['a'], rec['k']], default=str))
+        got = json.loads(json.dumps([list(args), kwargs], default=str))
+        if expected != got:
+            divergence = {'method': name, 'call': self.calls[name], 'expected': expected, 'got': got}
+            self.divergences.append(divergence)
+            if self.strict:
+                raise AssertionError(f"Replay divergente: {divergence}")
+
+        if 'e' in rec:
+            exc_type = getattr(ccxt, rec['e']['type'], ccxt.ExchangeError)
+            if not (isinstance(exc_type, type) and issubclass(exc_type, Exception)):
+                exc_type = ccxt.ExchangeError
+            raise exc_type(rec['e']['msg'])
+
+        return rec['r']
+
+    def load_markets(self, *args, **kwargs):
+        markets = self._serve('load_markets', args, kwargs)
+        self.markets = markets
+        self._local.set_markets(list(markets.values()))
+        return markets
+
+    def remaining(self):
+        """
+        Quantidade de respostas gravadas ainda não consumidas, por método.
+        """
+        return {m: len(q) for m, q in self._queues.items() if q}
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        attr = getattr(self._local, name)
+        if name in LOCAL_METHODS or not callable(attr):
+            return attr
+        # Qualquer outra chamada precisa vir da gravação (nunca vai à rede)
+        return lambda *args, **kwargs: self._serve(name, args, kwargs)
+
+
+# ==========================================
+# RESUMO DE UMA GRAVAÇÃO
+# ==========================================
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Uso: python exchange_recorder.py <arquivo_gravacao>")
+        sys.exit(1)
+
+    stats = defaultdict(lambda: [0, 0.0, 0])
+    for rec in read_records(sys.argv[1]):
+        s = stats[rec['m']]
+        s[0] += 1
+        s[1] += rec.get('d', 0.0)
+        s[2] += 1 if 'e' in rec else 0
+
+    for method, (count, total_ms, errors) in sorted(stats.items(), key=lambda kv: -kv[1][1]):
+        print(f"{method:32s} chamadas={count:6d} total={total_ms:10.1f}ms médio={total_ms / count:8.2f}ms erros={errors}")
@@ -0,0 +1,170 @@
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+
+
+# ==========================================
+# LIVRO GLOBAL DE EXPOSIÇÃO (TODOS OS BOTS DA CONTA)
+# ==========================================
+# Um arquivo SQLite (WAL) compartilhado entre processos. Cada bot registra
+# o que é seu, por ativo base:
+# - BUY aberta no grid   -> reserva 'order' (ref = nível)
+# - inventário comprado  -> linha 'inventory' (lotes do grid / posição do trend)
+# exposure_totals mantém a soma por ativo na mesma transação: checar o limite
+# é ler uma linha. Reservas usam BEGIN IMMEDIATE (atômicas entre processos),
+# então dois bots não ultrapassam o limite ao mesmo tempo.
+
+INVENTORY_REF = "inventory"
+EPSILON = 1e-12
+
+
+def default_ledger_path(simulation=False):
+    return "exposure_ledger_sim.db" if simulation else "exposure_ledger.db"
+
+
+class ExposureLedger:
+    def __init__(self, path, bot_id, asset, logger, timeout=5.0, inventory_ref=INVENTORY_REF):
+        self.path = path
+        self.bot_id = bot_id
+        self.asset = asset
+        # Um bot com vários ativos (trend multi-posição) usa uma referência de inventário por ativo
+        self.inventory_ref = inventory_ref
+        self.logger = logger
+        # Autocommit: as transações são abertas explicitamente (BEGIN IMMEDIATE)
+        self.conn = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(f"PRAGMA busy_timeout={int(timeout * 1000)}")
+        self._ensure_schema()
+
+    def _ensure_schema(self):
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS exposure_reservations (
+                bot TEXT,
+                ref TEXT,
+                asset TEXT,
+                kind TEXT,
+                qty REAL,
+                updated_at TEXT,
+                PRIMARY KEY (bot, ref)
+            )
+        ''')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS exposure_totals (
+                asset TEXT PRIMARY KEY,
+                qty REAL
+            )
+        ''')
+
+    @contextmanager
+    def _tx(self):
+        cur = self.conn.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+        try:
+            yield cur
+            cur.execute("COMMIT")
+        except BaseException:
+            cur.execute("ROLLBACK")
+            raise
+
+    def _total(self, cur):
+        cur.execute("SELECT qty FROM exposure_totals WHERE asset=?", (self.asset,))
+        row = cur.fetchone()
+        return float(row[0]) if row else 0.0
+
+    def _add_total(self, cur, delta):
+        if abs(delta) <= EPSILON:
+            return
+        cur.execute('''
+            INSERT INTO exposure_totals (asset, qty) VALUES (?, ?)
+            ON CONFLICT(asset) DO UPDATE SET qty = qty + excluded.qty
+        ''', (self.asset, delta))
+
+    def _set(self, cur, ref, kind, qty):
+        """
+        Grava a quantidade de uma reserva (0 remove) e ajusta o total pela diferença.
+        """
+        cur.execute("SELECT qty FROM exposure_reservations WHERE bot=? AND ref=?", (self.bot_id, ref))
+        row = cur.fetchone()
+        old = float(row[0]) if row else 0.0
+        qty = max(0.0, float(qty))
+        if qty <= EPSILON:
+            cur.execute("DELETE FROM exposure_reservations WHERE bot=? AND ref=?", (self.bot_id, ref))
+        else:
+            cur.execute('''
+                INSERT INTO exposure_reservations (bot, ref, asset, kind, qty, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(bot, ref) DO UPDATE SET qty=excluded.qty, updated_at=excluded.updated_at
+            ''', (self.bot_id, ref, self.asset, kind, qty, datetime.now().isoformat()))
+        self._add_total(cur, qty - old)
+
+    # --------------------------------------
+    # LEITURA O(1)
+    # --------------------------------------
+    def total_qty(self):
+        return self._total(self.conn.cursor())
+
+    def exposure_usd(self, price):
+        return self.total_qty() * float(price)
+
+    # --------------------------------------
+    # RESERVA / LIBERAÇÃO
+    # --------------------------------------
+    def reserve(self, ref, qty, price, cap_usd):
+        """
+        Reserva qty do ativo se o total global (todos os bots) continuar <= cap_usd.
+        Retorna (ok, exposição_usd_antes_da_reserva).
+        """
+        with self._tx() as cur:
+            cur.execute("SELECT qty FROM exposure_reservations WHERE bot=? AND ref=?", (self.bot_id, ref))
+            row = cur.fetchone()
+            current = self._total(cur) - (float(row[0]) if row else 0.0)
+            exposure_usd = current * float(price)
+            if cap_usd is not None and exposure_usd + float(qty) * float(price) > cap_usd:
+                return False, exposure_usd
+            self._set(cur, ref, "order", qty)
+            return True, exposure_usd
+
+    def release(self, ref):
+        with self._tx() as cur:
+            self._set(cur, ref, "order", 0.0)
+
+    def settle(self, ref=None, inventory=None):
+        """
+        Execução: remove a reserva da ordem (se houver) e grava o inventário atual, numa transação.
+        """
+        with self._tx() as cur:
+            if ref is not None:
+                self._set(cur, ref, "order", 0.0)
+            if inventory is not None:
+                self._set(cur, self.inventory_ref, "inventory", inventory)
+
+    def sync(self, orders, inventory):
+        """
+        Substitui todas as linhas deste bot pelo estado local (boot / após cancelamentos)
+        e recalcula o total do ativo pela soma das reservas (corrige qualquer divergência).
+        orders: {ref: qty}
+        """
+        with self._tx() as cur:
+            cur.execute("DELETE FROM exposure_reservations WHERE bot=? AND asset=?", (self.bot_id, self.asset))
+            for ref, qty in orders.items():
+                self._set(cur, ref, "order", qty)
+            self._set(cur, self.inventory_ref, "inventory", inventory)
+            cur.execute('''
+                INSERT INTO exposure_totals (asset, qty)
+                SELECT ?, COALESCE(SUM(qty), 0.0) FROM exposure_reservations WHERE asset=?
+                ON CONFLICT(asset) DO UPDATE SET qty=excluded.qty
+            ''', (self.asset, self.asset))
+
+    def by_bot(self):
+        """
+        Para relatórios: {bot: qty} do ativo.
+        """
+        cur = self.conn.cursor()
+        cur.execute(
+            "SELECT bot, SUM(qty) FROM exposure_reservations WHERE asset=? GROUP BY bot", (self.asset,)
+        )
+        return {r[0]: float(r[1]) for r in cur.fetchall()}
+
+    def close(self):
+        self.conn.close()
+
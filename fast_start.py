@@ -0,0 +1,241 @@
+import importlib
+import importlib.util
+import json
+import os
+import sys
+import threading
+import time
+import types
+from contextlib import contextmanager
+
+
+# ==========================================
+# PARTIDA RÁPIDA (RESTART DO SYSTEMD)
+# ==========================================
+# - load_ccxt: `import ccxt` carrega ~100 exchanges; aqui só a base, os erros
+#   e a classe da Binance (outras exchanges carregam sob demanda)
+# - preload: imports pesados (pandas/ta) num thread, em paralelo com DB/rede
+# - prime_markets / save_markets: cache em disco do load_markets (só os pares usados)
+# - StartupReport: fases da partida, tempo até a primeira checagem e avisos
+#   de Telegram agrupados numa mensagem só, enviada depois dela
+
+MARKETS_CACHE_VERSION = 1
+
+
+def _process_start_time():
+    """
+    Início do processo (epoch), para incluir o próprio interpretador no tempo de partida.
+    Fora do Linux, usa o momento do import deste módulo.
+    """
+    try:
+        with open("/proc/self/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        start_ticks = int(fields[19])          # campo 22 (starttime), contado após o ")"
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return time.time() - uptime + start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return time.time()
+
+
+PROCESS_START = _process_start_time()
+
+
+# --------------------------------------
+# CCXT ENXUTO
+# --------------------------------------
+def load_ccxt(exchange_ids=("binance",)):
+    """
+    Registra um pacote `ccxt` sem executar ccxt/__init__.py: carrega apenas
+    ccxt.base (Exchange + erros) e as exchanges pedidas. Qualquer outro atributo
+    (ex.: ccxt.kraken) é importado na primeira leitura. Módulos que fazem
+    `import ccxt` depois recebem este mesmo pacote.
+    CCXT_FULL_IMPORT=true (ou falha no carregamento enxuto) usa o import normal.
+    """
+    if "ccxt" in sys.modules:
+        return sys.modules["ccxt"]
+    if os.getenv("CCXT_FULL_IMPORT", "false").lower() == "true":
+        return importlib.import_module("ccxt")
+
+    spec = importlib.util.find_spec("ccxt")
+    if spec is None or not spec.submodule_search_locations:
+        return importlib.import_module("ccxt")
+
+    pkg = types.ModuleType("ccxt")
+    pkg.__path__ = list(spec.submodule_search_locations)
+    pkg.__file__ = spec.origin
+    pkg.__spec__ = spec
+    pkg.__package__ = "ccxt"
+    sys.modules["ccxt"] = pkg
+    try:
+        errors = importlib.import_module("ccxt.base.errors")
+        for name, obj in vars(errors).items():
+            if isinstance(obj, type) and issubclass(obj, Exception):
+                setattr(pkg, name, obj)
+        pkg.errors = errors
+        pkg.Exchange = importlib.import_module("ccxt.base.exchange").Exchange
+        for exchange_id in exchange_ids:
+            setattr(pkg, exchange_id, getattr(importlib.import_module(f"ccxt.{exchange_id}"), exchange_id))
+    except Exception:
+        for name in [m for m in sys.modules if m == "ccxt" or m.startswith("ccxt.")]:
+            del sys.modules[name]
+        return importlib.import_module("ccxt")
+
+    def __getattr__(name):
+        try:
+            module = importlib.import_module(f"ccxt.{name}")
+        except ImportError:
+            raise AttributeError(f"module 'ccxt' has no attribute '{name}'") from None
+        value = getattr(module, name, module)
+        setattr(pkg, name, value)
+        return value
+
+    pkg.__getattr__ = __getattr__
+    return pkg
+
+
+ccxt = load_ccxt()
+
+
+def preload(*modules):
+    """
+    Importa módulos num thread de fundo. Quem importar o mesmo módulo depois
+    espera o import em andamento (lock do import) em vez de começar do zero.
+    """
+    def run():
+        for name in modules:
+            try:
+                importlib.import_module(name)
+            except Exception:
+                pass
+
+    thread = threading.Thread(target=run, name="preload", daemon=True)
+    thread.start()
+    return thread
+
+
+# --------------------------------------
+# CACHE DE MERCADOS
+# --------------------------------------
+def prime_markets(client, path, symbols, max_age_hours, logger=None):
+    """
+    Se o cache em `path` tem menos de max_age_hours e contém todos os `symbols`,
+    entrega os mercados ao cliente ccxt (set_markets): o load_markets seguinte
+    não vai à rede. Retorna True se o cache foi usado.
+    """
+    if not path or max_age_hours <= 0:
+        return False
+    try:
+        if time.time() - os.path.getmtime(path) > max_age_hours * 3600:
+            return False
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != MARKETS_CACHE_VERSION:
+            return False
+        cached = data.get("markets", {})
+        if any(symbol not in cached for symbol in symbols):
+            return False
+        use_markets(client, cached)
+    except FileNotFoundError:
+        return False
+    except Exception as e:
+        if logger:
+            logger.warning(f"Cache de mercados ignorado ({path}): {e}")
+        return False
+    if logger:
+        logger.info(f"Mercados carregados do cache local ({', '.join(symbols)})")
+    return True
+
+
+def use_markets(client, markets):
+    """
+    Entrega mercados já conhecidos (cache, snapshot) ao cliente ccxt no lugar do load_markets.
+    """
+    client.set_markets(markets)
+    # load_markets também sincroniza o relógio; sem ele, faz só essa chamada leve
+    if client.options.get("adjustForTimeDifference"):
+        client.load_time_difference()
+    return True
+
+
+def save_markets(path, markets, symbols, logger=None):
+    """
+    Grava (escrita atômica) os mercados de `symbols`, preservando os demais pares
+    já presentes no arquivo (o cache pode ser compartilhado entre bots).
+    """
+    if not path:
+        return
+    try:
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != MARKETS_CACHE_VERSION:
+                data = {}
+        except (OSError, ValueError):
+            data = {}
+        cached = data.get("markets", {})
+        cached.update({s: markets[s] for s in symbols if s in markets})
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": MARKETS_CACHE_VERSION, "markets": cached}, f, default=str)
+        os.replace(tmp, path)
+    except Exception as e:
+        if logger:
+            logger.warning(f"Falha ao gravar cache de mercados ({path}): {e}")
+
+
+# --------------------------------------
+# RELATÓRIO DE PARTIDA
+# --------------------------------------
+class StartupReport:
+    """
+    Cronometra as fases da partida e segura os avisos de Telegram até a primeira
+    checagem do loop, quando tudo é logado/enviado de uma vez.
+    """
+
+    def __init__(self, name, started=None):
+        """
+        started: início a considerar (padrão: início do processo). O supervisor
+        multi-conta passa o momento da criação do bot.
+        """
+        self.name = name
+        self.started = PROCESS_START if started is None else started
+        self.created = time.time()
+        self.phases = [("imports", self.created - self.started)]
+        self.notices = []
+        self.done = False
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - started))
+
+    def notice(self, message):
+        """
+        Aviso de partida: adiado até finish() (retorna False se a partida já terminou).
+        """
+        if self.done:
+            return False
+        self.notices.append(message)
+        return True
+
+    def finish(self, logger, metrics=None):
+        """
+        Chamado após a primeira checagem. Loga o tempo total e as fases;
+        retorna o texto a enviar ao Telegram (avisos acumulados + tempo de partida).
+        """
+        self.done = True
+        total = time.time() - self.started
+        detail = " | ".join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in self.phases)
+        logger.info(f"Partida concluída em {total:.2f}s até a primeira checagem ({detail})")
+        if metrics is not None:
+            metrics.gauge("startup_seconds", "Tempo do início do processo até a primeira checagem").set(total)
+            phase_gauge = metrics.gauge("startup_phase_seconds", "Duração de cada fase da partida", ("phase",))
+            for name, seconds in self.phases:
+                phase_gauge.set(seconds, phase=name)
+        notices = self.notices + [f"⏱️ {self.name} pronto em {total:.2f}s"]
+        self.notices = []
+        return "\n".join(notices)
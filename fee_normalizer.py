@@ -0,0 +1,103 @@
+import time
+
+
+# ==========================================
+# NORMALIZAÇÃO DE TAXAS PARA A MOEDA QUOTE
+# ==========================================
+# A Binance cobra a taxa na moeda recebida (BASE na compra, QUOTE na venda)
+# ou em BNB. Para o lucro líquido todas precisam estar em QUOTE:
+# - QUOTE: já está
+# - BASE: converte pelo preço da própria execução (sem chamada à API)
+# - outras (BNB...): tabela de cotações com TTL, preenchida por UM fetch_tickers
+
+
+def ensure_fee_columns(cursor, base_asset, quote_asset):
+    """
+    Migração: filled_orders.fee_quote (taxa convertida para QUOTE).
+    Linhas antigas em QUOTE/BASE são convertidas; outras moedas ficam NULL (sem cotação histórica).
+    """
+    cursor.execute("PRAGMA table_info(filled_orders)")
+    if "fee_quote" in [r[1] for r in cursor.fetchall()]:
+        return False
+    cursor.execute("ALTER TABLE filled_orders ADD COLUMN fee_quote REAL")
+    cursor.execute('''
+        UPDATE filled_orders
+        SET fee_quote = CASE
+            WHEN fee_currency IS NULL OR fee_currency = ? THEN COALESCE(fee, 0.0)
+            WHEN fee_currency = ? THEN COALESCE(fee, 0.0) * price
+            ELSE NULL
+        END
+    ''', (quote_asset, base_asset))
+    return True
+
+
+class FeeNormalizer:
+    """
+    Converte taxas para QUOTE no momento da execução.
+    Cotações de outras moedas ficam em cache por ttl segundos; quando uma vence
+    (ou aparece moeda nova), todas as moedas conhecidas são renovadas num único fetch_tickers.
+    """
+
+    def __init__(self, exchange, base_asset, quote_asset, logger, ttl=300, assets=("BNB",)):
+        self.exchange = exchange
+        self.base = base_asset
+        self.quote = quote_asset
+        self.logger = logger
+        self.ttl = float(ttl)
+        self.assets = set(a for a in assets if a and a not in (base_asset, quote_asset))
+        self.rates = {}      # moeda -> cotação em QUOTE
+        self._fetched_at = 0.0
+
+    def _symbols(self):
+        """
+        Par direto (BNB/USDT) quando existe; senão o inverso (USDT/XXX).
+        """
+        markets = getattr(self.exchange, "markets", None) or {}
+        out = {}
+        for asset in self.assets:
+            direct, inverse = f"{asset}/{self.quote}", f"{self.quote}/{asset}"
+            if not markets or direct in markets:
+                out[direct] = (asset, False)
+            elif inverse in markets:
+                out[inverse] = (asset, True)
+        return out
+
+    def refresh(self):
+        symbols = self._symbols()
+        self._fetched_at = time.monotonic()
+        if not symbols:
+            return
+        try:
+            tickers = self.exchange.fetch_tickers(list(symbols))
+        except Exception as e:
+            self.logger.error(f"Erro ao atualizar cotações de taxas: {e}")
+            return
+
+        for symbol, (asset, inverse) in symbols.items():
+            last = float((tickers.get(symbol) or {}).get("last") or 0.0)
+            if last > 0:
+                self.rates[asset] = 1.0 / last if inverse else last
+
+    def rate(self, currency):
+        if currency not in self.assets:
+            self.assets.add(currency)
+            self._fetched_at = 0.0
+        if time.monotonic() - self._fetched_at >= self.ttl:
+            self.refresh()
+        return self.rates.get(currency)
+
+    def to_quote(self, cost, currency, exec_price=None):
+        """
+        Taxa em QUOTE. Sem cotação disponível, devolve o valor bruto (comportamento antigo) e avisa.
+        """
+        cost = float(cost or 0.0)
+        if cost == 0.0 or not currency or currency == self.quote:
+            return cost
+        if currency == self.base and exec_price:
+            return cost * float(exec_price)
+
+        rate = self.rate(currency)
+        if rate is None:
+            self.logger.warning(f"Sem cotação {currency}/{self.quote}; taxa {cost} {currency} usada sem conversão.")
+            return cost
+        return cost * rate
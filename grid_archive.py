@@ -0,0 +1,242 @@
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+
+# ==========================================
+# ARQUIVAMENTO (TABELAS QUENTES x HISTÓRICO)
+# ==========================================
+# active_grids e filled_orders só devem conter estado vivo:
+# - active_grids: ordens OPEN + FILLED que ainda podem gerar contraparte
+# - filled_orders: BUYs ainda não usadas em ciclo
+# O resto vai para tabelas *_history (banco de arquivo anexado via ATTACH),
+# mantendo as consultas do loop com custo constante.
+
+HOT_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_active_grids_status ON active_grids (status, grid_index, side)",
+    "CREATE INDEX IF NOT EXISTS idx_filled_orders_open ON filled_orders (side, used_in_cycle, grid_index)",
+    "CREATE INDEX IF NOT EXISTS idx_filled_orders_order_id ON filled_orders (order_id)",
+)
+
+
+def ensure_hot_indexes(cursor):
+    for sql in HOT_INDEXES:
+        cursor.execute(sql)
+
+
+class GridArchiver:
+    """
+    Move linhas liquidadas das tabelas quentes para o histórico, em lote e
+    numa única transação, com retenção e VACUUM quando o arquivo fragmenta.
+
+    Liquidadas:
+    - active_grids CANCELED
+    - active_grids BUY FILLED cujo fill já foi usado em ciclo (SELL executada)
+    - active_grids SELL FILLED cuja BUY seguinte (grid_index - 1) já foi criada,
+      ou no nível 0 (não há contraparte a recriar)
+    - filled_orders SELL e BUY com used_in_cycle=1
+    Todas só após ARCHIVE_MIN_AGE_HOURS, para manter o passado recente à mão.
+    """
+
+    def __init__(self, conn, logger, archive_path=None, min_age_hours=24, retention_days=0,
+                 interval_seconds=3600, vacuum_ratio=0.25, metrics=None):
+        self.conn = conn
+        self.logger = logger
+        self.archive_path = archive_path
+        self.schema = "archive" if archive_path else "main"
+        self.min_age_hours = float(min_age_hours)
+        self.retention_days = float(retention_days)
+        self.interval_seconds = float(interval_seconds)
+        self.vacuum_ratio = float(vacuum_ratio)
+        self._last_run = 0.0
+
+        self._moved = None
+        if metrics is not None:
+            self._moved = metrics.counter("archived_rows", "Linhas movidas para o histórico", ("table",))
+
+    # --------------------------------------
+    # SCHEMA
+    # --------------------------------------
+    def ensure_schema(self):
+        cursor = self.conn.cursor()
+
+        if self.archive_path:
+            cursor.execute("PRAGMA database_list")
+            if "archive" not in [r[1] for r in cursor.fetchall()]:
+                cursor.execute("ATTACH DATABASE ? AS archive", (self.archive_path,))
+            cursor.execute("PRAGMA archive.journal_mode=WAL")
+
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {self.schema}.active_grids_history (
+                id INTEGER PRIMARY KEY,
+                grid_index INTEGER,
+                order_id TEXT,
+                price REAL,
+                side TEXT,
+                amount REAL,
+                status TEXT,
+                updated_at TEXT,
+                archived_at TEXT
+            )
+        ''')
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {self.schema}.filled_orders_history (
+                id INTEGER PRIMARY KEY,
+                grid_index INTEGER,
+                order_id TEXT,
+                side TEXT,
+                price REAL,
+                amount REAL,
+                fee REAL,
+                fee_currency TEXT,
+                timestamp TEXT,
+                used_in_cycle INTEGER,
+                archived_at TEXT,
+                fee_quote REAL
+            )
+        ''')
+        cursor.execute(f"PRAGMA {self.schema}.table_info(filled_orders_history)")
+        if "fee_quote" not in [r[1] for r in cursor.fetchall()]:
+            cursor.execute(f"ALTER TABLE {self.schema}.filled_orders_history ADD COLUMN fee_quote REAL")
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS {self.schema}.idx_filled_history_order_id "
+            f"ON filled_orders_history (order_id)"
+        )
+        self.conn.commit()
+
+    # --------------------------------------
+    # ARQUIVAMENTO
+    # --------------------------------------
+    def maybe_run(self):
+        """
+        Chamado a cada iteração do loop; só trabalha a cada interval_seconds.
+        """
+        if self.interval_seconds <= 0:
+            return None
+        if time.monotonic() - self._last_run < self.interval_seconds:
+            return None
+        return self.run_once()
+
+    def run_once(self, now=None):
+        self._last_run = time.monotonic()
+        now = now or datetime.now()
+        cutoff = (now - timedelta(hours=self.min_age_hours)).strftime("%Y-%m-%d %H:%M:%S")
+        archived_at = now.isoformat()
+        h = self.schema
+        cursor = self.conn.cursor()
+
+        try:
+            # Ids primeiro: INSERT e DELETE trabalham exatamente sobre o mesmo conjunto
+            cursor.execute("CREATE TEMP TABLE IF NOT EXISTS archive_ids (id INTEGER PRIMARY KEY)")
+            cursor.execute("DELETE FROM temp.archive_ids")
+            cursor.execute(f'''
+                INSERT INTO temp.archive_ids (id)
+                SELECT g.id FROM active_grids g
+                WHERE datetime(COALESCE(g.updated_at, '1970-01-01')) < datetime(?)
+                  AND (
+                    g.status = 'CANCELED'
+                    OR (g.status = 'FILLED' AND g.side = 'BUY' AND (
+                        g.order_id IN (SELECT order_id FROM filled_orders
+                                       WHERE side='BUY' AND used_in_cycle=1)
+                        OR g.order_id IN (SELECT order_id FROM {h}.filled_orders_history
+                                          WHERE side='BUY' AND used_in_cycle=1)
+                    ))
+                    OR (g.status = 'FILLED' AND g.side = 'SELL' AND (
+                        g.grid_index <= 0
+                        OR EXISTS (SELECT 1 FROM active_grids b
+                                   WHERE b.side='BUY' AND b.grid_index = g.grid_index - 1 AND b.id > g.id)
+                        OR EXISTS (SELECT 1 FROM {h}.active_grids_history b
+                                   WHERE b.side='BUY' AND b.grid_index = g.grid_index - 1 AND b.id > g.id)
+                    ))
+                  )
+            ''', (cutoff,))
+
+            # INSERT OR IGNORE: se um arquivamento anterior caiu no meio, repetir é seguro
+            cursor.execute(f'''
+                INSERT OR IGNORE INTO {h}.active_grids_history
+                    (id, grid_index, order_id, price, side, amount, status, updated_at, archived_at)
+                SELECT id, grid_index, order_id, price, side, amount, status, updated_at, ?
+                FROM active_grids WHERE id IN (SELECT id FROM temp.archive_ids)
+            ''', (archived_at,))
+            cursor.execute("DELETE FROM active_grids WHERE id IN (SELECT id FROM temp.archive_ids)")
+            grids_moved = cursor.rowcount
+
+            cursor.execute("DELETE FROM temp.archive_ids")
+            cursor.execute('''
+                INSERT INTO temp.archive_ids (id)
+                SELECT id FROM filled_orders
+                WHERE (side = 'SELL' OR used_in_cycle = 1)
+                  AND datetime(COALESCE(timestamp, '1970-01-01')) < datetime(?)
+            ''', (cutoff,))
+            cursor.execute(f'''
+                INSERT OR IGNORE INTO {h}.filled_orders_history
+                    (id, grid_index, order_id, side, price, amount, fee, fee_currency,
+                     timestamp, used_in_cycle, archived_at, fee_quote)
+                SELECT id, grid_index, order_id, side, price, amount, fee, fee_currency,
+                       timestamp, used_in_cycle, ?, fee_quote
+                FROM filled_orders WHERE id IN (SELECT id FROM temp.archive_ids)
+            ''', (archived_at,))
+            cursor.execute("DELETE FROM filled_orders WHERE id IN (SELECT id FROM temp.archive_ids)")
+            fills_moved = cursor.rowcount
+
+            purged = self._apply_retention(cursor, now)
+            self.conn.commit()
+        except sqlite3.Error as e:
+            self.conn.rollback()
+            self.logger.error(f"Erro no arquivamento: {e}")
+            return None
+
+        if self._moved is not None:
+            self._moved.inc(grids_moved, table="active_grids")
+            self._moved.inc(fills_moved, table="filled_orders")
+
+        if grids_moved or fills_moved or purged:
+            self.logger.info(
+                f"Arquivamento: {grids_moved} active_grids, {fills_moved} filled_orders movidas "
+                f"para o histórico ({purged} removidas pela retenção)."
+            )
+
+        self._vacuum_if_fragmented("main")
+        if self.schema != "main":
+            self._vacuum_if_fragmented(self.schema)
+
+        return grids_moved, fills_moved
+
+    def _apply_retention(self, cursor, now):
+        if self.retention_days <= 0:
+            return 0
+        limit = (now - timedelta(days=self.retention_days)).isoformat()
+        purged = 0
+        for table in ("active_grids_history", "filled_orders_history"):
+            cursor.execute(f"DELETE FROM {self.schema}.{table} WHERE archived_at < ?", (limit,))
+            purged += cursor.rowcount
+        return purged
+
+    def _vacuum_if_fragmented(self, schema):
+        """
+        VACUUM só quando as páginas livres passam de vacuum_ratio do arquivo.
+        """
+        if self.vacuum_ratio <= 0:
+            return
+        cursor = self.conn.cursor()
+        cursor.execute(f"PRAGMA {schema}.page_count")
+        pages = cursor.fetchone()[0]
+        cursor.execute(f"PRAGMA {schema}.freelist_count")
+        free = cursor.fetchone()[0]
+        if not pages or free / pages < self.vacuum_ratio:
+            return
+        try:
+            t0 = time.perf_counter()
+            cursor.execute(f"VACUUM {schema}")
+            self.logger.info(
+                f"VACUUM {schema}: {free}/{pages} páginas livres recuperadas em "
+                f"{(time.perf_counter() - t0) * 1000:.0f}ms"
+            )
+        except sqlite3.Error as e:
+            self.logger.error(f"Erro no VACUUM {schema}: {e}")
+
+
+def default_archive_path(db_name):
+    base, ext = os.path.splitext(db_name)
+    return f"{base}_archive{ext or '.db'}"
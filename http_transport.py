@@ -0,0 +1,202 @@
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+
+# ==========================================
+# TRANSPORTE HTTP COMPARTILHADO
+# ==========================================
+# Sessions requests com pool keep-alive para ccxt, Telegram e relatório:
+# - pool: conexões TCP+TLS reaproveitadas entre chamadas (e entre bots do processo)
+# - timeout separado em conexão e leitura; um timeout único (ccxt, notifier)
+#   vira (min(HTTP_CONNECT_TIMEOUT, t), t)
+# - retry com backoff exponencial + jitter só em métodos idempotentes (GET/HEAD/OPTIONS)
+#   e em falhas de conexão (a requisição nem saiu); POST de ordem nunca é repetido
+# - métricas por session: requisições, conexões abertas e tempo de handshake
+#   (reuso = 1 - http_connections_opened / http_requests)
+
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+RETRY_STATUS = (502, 503, 504)
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def session_options(env):
+    """
+    Parâmetros do transporte a partir de um mapeamento (os.environ ou config da conta).
+    """
+    return {
+        "pool_size": int(env.get("HTTP_POOL_SIZE", 10)),
+        "connect_timeout": float(env.get("HTTP_CONNECT_TIMEOUT", 3.05)),
+        "read_timeout": float(env.get("HTTP_READ_TIMEOUT", 10)),
+        "retries": int(env.get("HTTP_RETRIES", 3)),
+        "backoff": float(env.get("HTTP_BACKOFF", 0.3)),
+    }
+
+
+class JitterRetry(Retry):
+    """
+    Retry do urllib3 com jitter aleatório somado ao backoff exponencial
+    (clientes que falharam juntos não tentam de novo no mesmo instante).
+    """
+
+    def __init__(self, *args, jitter=0.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.jitter = float(jitter)
+
+    def new(self, **kwargs):
+        retry = super().new(**kwargs)
+        retry.jitter = self.jitter
+        return retry
+
+    def get_backoff_time(self):
+        backoff = super().get_backoff_time()
+        return backoff + random.uniform(0, self.jitter) if backoff > 0 else 0.0
+
+
+class TransportStats:
+    """
+    Contadores de uma session, publicados em todos os registros de métricas anexados.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.requests = 0
+        self.connections = 0
+        self.connect_seconds = 0.0
+        self._lock = threading.Lock()
+        self._registries = set()
+        self._observers = ()          # trocado inteiro no attach: leitura sem lock
+
+    def attach(self, registry):
+        if registry is None:
+            return
+        with self._lock:
+            if id(registry) in self._registries:
+                return
+            self._registries.add(id(registry))
+            self._observers += ((
+                registry.counter("http_requests", "Requisições HTTP por session", ("session",)),
+                registry.counter("http_connections_opened", "Conexões TCP/TLS novas por session", ("session",)),
+                registry.histogram(
+                    "http_connect_seconds", "Handshake TCP+TLS de conexões novas", ("session",),
+                    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+                ),
+            ),)
+
+    def on_request(self):
+        with self._lock:
+            self.requests += 1
+        for requests_total, _opened, _connect in self._observers:
+            requests_total.inc(session=self.name)
+
+    def on_connect(self, seconds):
+        with self._lock:
+            self.connections += 1
+            self.connect_seconds += seconds
+        for _requests, opened, connect in self._observers:
+            opened.inc(session=self.name)
+            connect.observe(seconds, session=self.name)
+
+    @property
+    def reuse_ratio(self):
+        return 1.0 - self.connections / self.requests if self.requests else 0.0
+
+
+def _timed_pool_classes(stats):
+    """
+    Pools do urllib3 cuja conexão mede o próprio connect() (TCP + TLS).
+    """
+    def timed(connection_cls):
+        def connect(self):
+            started = time.perf_counter()
+            connection_cls.connect(self)
+            stats.on_connect(time.perf_counter() - started)
+        return type(f"Timed{connection_cls.__name__}", (connection_cls,), {"connect": connect})
+
+    return {
+        "http": type("TimedHTTPConnectionPool", (HTTPConnectionPool,), {"ConnectionCls": timed(HTTPConnection)}),
+        "https": type("TimedHTTPSConnectionPool", (HTTPSConnectionPool,), {"ConnectionCls": timed(HTTPSConnection)}),
+    }
+
+
+class TransportAdapter(HTTPAdapter):
+    def __init__(self, stats, pool_size, connect_timeout, read_timeout, retry):
+        self.stats = stats
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._pool_classes = _timed_pool_classes(stats)
+        super().__init__(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = self._pool_classes
+
+    def send(self, request, timeout=None, **kwargs):
+        if timeout is None:
+            timeout = (self.connect_timeout, self.read_timeout)
+        elif isinstance(timeout, (int, float)):
+            timeout = (min(self.connect_timeout, timeout), timeout)
+        self.stats.on_request()
+        return super().send(request, timeout=timeout, **kwargs)
+
+
+def make_session(name, pool_size=10, connect_timeout=3.05, read_timeout=10, retries=3, backoff=0.3,
+                 metrics=None):
+    """
+    Session nova com pool keep-alive, timeouts (conexão, leitura) e retry com jitter.
+    session.transport_stats guarda os contadores (e publica em `metrics`, se informado).
+    """
+    retry = JitterRetry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        other=0,
+        allowed_methods=IDEMPOTENT_METHODS,
+        status_forcelist=RETRY_STATUS,
+        backoff_factor=backoff,
+        respect_retry_after_header=True,
+        raise_on_status=False,
+        jitter=backoff,
+    )
+    stats = TransportStats(name)
+    stats.attach(metrics)
+    adapter = TransportAdapter(stats, int(pool_size), float(connect_timeout), float(read_timeout), retry)
+
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.transport_stats = stats
+    return session
+
+
+def shared_session(name, metrics=None, **options):
+    """
+    Session única no processo para `name` (ex.: "binance", "telegram"): bots no mesmo
+    processo reaproveitam as mesmas conexões. Opções valem na primeira chamada.
+    """
+    with _shared_lock:
+        session = _shared.get(name)
+        if session is None:
+            session = _shared[name] = make_session(name, **options)
+    session.transport_stats.attach(metrics)
+    return session
+
+
+def use_session(client, session):
+    """
+    Troca a Session de um cliente ccxt (fecha a que ele criou sozinho).
+    """
+    own = getattr(client, "session", None)
+    if own is not None and own is not session:
+        own.close()
+    client.session = session
+    return client
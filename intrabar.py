@@ -0,0 +1,150 @@
+import math
+
+import numpy as np
+
+from trend_scanner import adx, atr, supertrend, timeframe_seconds
+
+
+# ==========================================
+# SUPERTREND / ADX DO CANDLE EM FORMAÇÃO (INTRABAR)
+# ==========================================
+# O TrendBot decide sobre o último candle do fetch_ohlcv (ainda aberto). Aqui os
+# indicadores completos são recalculados só quando um candle fecha; a cada preço
+# (ticker) o candle em formação é atualizado e ATR, bandas do SuperTrend, ADX e EMA
+# avançam um passo a partir do estado dos fechados — O(1) por preço e com o mesmo
+# resultado da última linha do cálculo completo (mesma janela de candles do bot).
+# Máxima/mínima do candle em formação: as do último fetch_ohlcv mais os preços vistos
+# desde então (sync() reaproveita um fetch_ohlcv curto para recuperar extremos perdidos).
+
+
+class IntrabarTrend:
+    def __init__(self, timeframe="1h", period=10, multiplier=3.0, adx_window=14, ema_window=200, window=100):
+        self.timeframe = timeframe
+        self.tf_ms = timeframe_seconds(timeframe) * 1000
+        self.period = int(period)
+        self.multiplier = float(multiplier)
+        self.adx_window = int(adx_window)
+        self.ema_window = int(ema_window)
+        self.window = int(window)          # candles do cálculo do bot (fechados + o em formação)
+        self.symbol = None
+        self.forming_ts = None
+
+    def needs_rebuild(self, symbol, now_ms):
+        return symbol != self.symbol or self.forming_ts is None or now_ms >= self.forming_ts + self.tf_ms
+
+    # --------------------------------------
+    # CANDLE FECHOU: RECÁLCULO COMPLETO
+    # --------------------------------------
+    def rebuild(self, symbol, ohlcv, now_ms):
+        """
+        Estado dos candles fechados a partir de um fetch_ohlcv; o candle em formação
+        é o do horário atual (ou começa no próximo preço, se ainda não veio na resposta).
+        """
+        forming_ts = now_ms // self.tf_ms * self.tf_ms
+        closed = [r for r in ohlcv if r[0] < forming_ts][-(self.window - 1):]
+        minimum = max(self.period, 2 * self.adx_window) + 2
+        if len(closed) < minimum:
+            raise ValueError(f"{symbol}: {len(closed)} candles fechados (mínimo {minimum})")
+
+        data = np.array(closed, dtype=float)
+        high, low, close = data[None, :, 2], data[None, :, 3], data[None, :, 4]
+        atr_values = atr(high, low, close, self.period)
+        _line, uptrend, final_upper, final_lower = supertrend(
+            high, low, close, atr_values, self.multiplier, with_bands=True
+        )
+        adx_values, (trs, dip, din) = adx(high, low, close, self.adx_window, with_state=True)
+
+        self.symbol = symbol
+        self.forming_ts = forming_ts
+        self.closed_count = len(closed)
+        self.prev_high = float(high[0, -1])
+        self.prev_low = float(low[0, -1])
+        self.prev_close = float(close[0, -1])
+        self.prev_atr = float(atr_values[0, -1])
+        self.prev_upper = float(final_upper[0, -1])
+        self.prev_lower = float(final_lower[0, -1])
+        self.prev_uptrend = bool(uptrend[0, -1])
+        self.prev_adx = float(adx_values[0, -1])
+        self.trs, self.dip, self.din = float(trs[0]), float(dip[0]), float(din[0])
+        # EMA sem o corte de min_periods (o candle em formação pode completar a janela)
+        alpha = 2.0 / (self.ema_window + 1)
+        self.prev_ema = float(data[0, 4])
+        for value in data[1:, 4]:
+            self.prev_ema += alpha * (value - self.prev_ema)
+
+        self.high = self.low = None
+        forming = next((r for r in ohlcv if r[0] == forming_ts), None)
+        if forming is not None:
+            self.high, self.low = float(forming[2]), float(forming[3])
+
+    def sync(self, ohlcv):
+        """
+        Extremos do candle em formação vindos de um fetch_ohlcv curto (ticks perdidos entre consultas).
+        """
+        for r in ohlcv:
+            if r[0] == self.forming_ts:
+                self.high = float(r[2]) if self.high is None else max(self.high, float(r[2]))
+                self.low = float(r[3]) if self.low is None else min(self.low, float(r[3]))
+
+    # --------------------------------------
+    # A CADA PREÇO
+    # --------------------------------------
+    def update(self, price):
+        """
+        Indicadores do candle em formação com fechamento em `price`.
+        Retorna (curr, prev) com as mesmas chaves das linhas do DataFrame do bot.
+        """
+        price = float(price)
+        self.high = price if self.high is None else max(self.high, price)
+        self.low = price if self.low is None else min(self.low, price)
+        high, low = self.high, self.low
+        n = self.adx_window
+
+        # ATR (Wilder) e bandas do SuperTrend
+        tr = max(high - low, abs(high - self.prev_close), abs(low - self.prev_close))
+        atr_value = (self.prev_atr * (self.period - 1) + tr) / self.period
+        hl2 = (high + low) / 2
+        basic_upper = hl2 + self.multiplier * atr_value
+        basic_lower = hl2 - self.multiplier * atr_value
+        if basic_upper < self.prev_upper or self.prev_close > self.prev_upper:
+            final_upper = basic_upper
+        else:
+            final_upper = self.prev_upper
+        if basic_lower > self.prev_lower or self.prev_close < self.prev_lower:
+            final_lower = basic_lower
+        else:
+            final_lower = self.prev_lower
+        if self.prev_uptrend:
+            uptrend = not price < self.prev_lower
+        else:
+            uptrend = price > self.prev_upper
+
+        # ADX: um passo das somas suavizadas e da média do DX
+        up, down = high - self.prev_high, self.prev_low - low
+        pos = up if up > down and up > 0 else 0.0
+        neg = down if down > up and down > 0 else 0.0
+        trs = self.trs - self.trs / n + tr
+        dip = self.dip - self.dip / n + pos
+        din = self.din - self.din / n + neg
+        di_pos = 100 * dip / trs if trs != 0 else 0.0
+        di_neg = 100 * din / trs if trs != 0 else 0.0
+        total = di_pos + di_neg
+        dx = 100 * abs(di_pos - di_neg) / total if total != 0 else 0.0
+        adx_value = (self.prev_adx * (n - 1) + dx) / n
+
+        alpha = 2.0 / (self.ema_window + 1)
+        ema_value = self.prev_ema + alpha * (price - self.prev_ema)
+        if self.closed_count + 1 < self.ema_window:
+            ema_value = math.nan
+
+        curr = {
+            "close": price,
+            "high": high,
+            "low": low,
+            "atr": atr_value,
+            "ADX": adx_value,
+            "EMA_200": ema_value,
+            "SuperTrend": final_lower if uptrend else final_upper,
+            "In_Uptrend": uptrend,
+        }
+        return curr, {"close": self.prev_close, "In_Uptrend": self.prev_uptrend, "ADX": self.prev_adx}
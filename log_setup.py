@@ -0,0 +1,277 @@
+import atexit
+import copy
+import glob
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import sys
+import threading
+import time
+from datetime import datetime
+
+
+# ==========================================
+# LOGGING FORA DO CAMINHO CRÍTICO
+# ==========================================
+# O thread do bot só enfileira o LogRecord (QueueHandler). Formatação,
+# escrita em disco/stdout, rotação e compressão rodam no thread do
+# QueueListener / em threads de fundo.
+# - LOG_FORMAT=text|json        formato do arquivo (stdout continua texto)
+# - LOG_MAX_MB / LOG_ROTATE_HOURS / LOG_BACKUP_COUNT   rotação por tamanho e por tempo (.gz)
+# - LOG_SAMPLE="Preço atual=60"  INFO repetitivo: no máximo 1 linha por N segundos (por logger)
+# Campos estruturados vão em extra={...}: symbol, grid_index, side, order_id, latency
+# (account/strategy são preenchidos pelo logger da conta no supervisor).
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - {prefix}%(message)s'
+STRUCTURED_FIELDS = ("account", "strategy", "symbol", "grid_index", "side", "order_id", "latency")
+
+_context = {}            # campos fixos do processo (ex.: symbol), via set_context
+_listener = None
+_lock = threading.Lock()
+
+
+def set_context(**fields):
+    """
+    Campos incluídos em toda linha JSON (ex.: set_context(symbol="BTC/USDT")).
+    """
+    _context.update({k: v for k, v in fields.items() if v is not None})
+
+
+# --------------------------------------
+# FORMATADORES
+# --------------------------------------
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        out = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        out.update(_context)
+        for field in STRUCTURED_FIELDS:
+            value = record.__dict__.get(field)
+            if value is not None:
+                out[field] = value
+        suppressed = record.__dict__.get("suppressed")
+        if suppressed:
+            out["suppressed"] = suppressed
+        if record.exc_text:
+            out["exc"] = record.exc_text
+        return json.dumps(out, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def formatMessage(self, record):
+        # Supervisor multi-conta: "[conta/estratégia] " antes da mensagem
+        account = record.__dict__.get("account")
+        if account:
+            record = copy.copy(record)
+            record.message = f"[{account}/{record.__dict__.get('strategy', '')}] {record.message}"
+        return super().formatMessage(record)
+
+    def format(self, record):
+        line = super().format(record)
+        suppressed = record.__dict__.get("suppressed")
+        return f"{line} (+{suppressed} suprimidas)" if suppressed else line
+
+
+# --------------------------------------
+# HANDLERS
+# --------------------------------------
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    Não formata no thread do bot: só captura o traceback (que não pode cruzar threads).
+    """
+
+    def prepare(self, record):
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class RotatingGzipFileHandler(logging.FileHandler):
+    """
+    Rotaciona por tamanho OU por tempo. O arquivo rotacionado recebe timestamp no nome
+    (sem cascata de renomeações) e é comprimido em .gz num thread de fundo.
+    """
+
+    def __init__(self, filename, max_bytes=50 * 1024 * 1024, interval_seconds=86400, backup_count=14):
+        super().__init__(filename, encoding="utf-8")
+        self.max_bytes = int(max_bytes)
+        self.interval = float(interval_seconds)
+        self.backup_count = int(backup_count)
+        self._next_rollover = time.time() + self.interval if self.interval > 0 else None
+        self._gzip_lock = threading.Lock()
+
+    def emit(self, record):
+        try:
+            if self._should_rollover():
+                self._rollover()
+        except Exception:
+            self.handleError(record)
+        super().emit(record)
+
+    def _should_rollover(self):
+        if self.stream is None:
+            return False
+        if self.max_bytes > 0 and self.stream.tell() >= self.max_bytes:
+            return True
+        return self._next_rollover is not None and time.time() >= self._next_rollover
+
+    def _rollover(self):
+        self.stream.close()
+        self.stream = None
+        rotated = f"{self.baseFilename}.{datetime.now():%Y%m%d-%H%M%S}"
+        n = 1
+        while os.path.exists(rotated) or os.path.exists(rotated + ".gz"):
+            rotated = f"{self.baseFilename}.{datetime.now():%Y%m%d-%H%M%S}.{n}"
+            n += 1
+        if os.path.exists(self.baseFilename):
+            os.replace(self.baseFilename, rotated)
+            threading.Thread(target=self._compress, args=(rotated,), name="log-gzip", daemon=True).start()
+        self.stream = self._open()
+        if self._next_rollover is not None:
+            self._next_rollover = time.time() + self.interval
+
+    def _compress(self, path):
+        with self._gzip_lock:
+            try:
+                with open(path, "rb") as src, gzip.open(path + ".gz.tmp", "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+                os.replace(path + ".gz.tmp", path + ".gz")
+                os.remove(path)
+            except OSError as e:
+                sys.stderr.write(f"Falha ao comprimir {path}: {e}\n")
+                return
+            if self.backup_count > 0:
+                old = sorted(glob.glob(glob.escape(self.baseFilename) + ".*.gz"), key=_mtime)
+                for stale in old[:-self.backup_count]:
+                    try:
+                        os.remove(stale)
+                    except OSError:
+                        pass
+
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return 0.0
+
+
+# --------------------------------------
+# AMOSTRAGEM DE INFO REPETITIVO
+# --------------------------------------
+class SamplingFilter(logging.Filter):
+    """
+    Para mensagens INFO que começam com um prefixo configurado, deixa passar no máximo
+    uma a cada N segundos por (logger, prefixo); a que passa informa quantas foram suprimidas.
+    Roda no thread do bot, então só compara o início de record.msg (sem formatar).
+    """
+
+    def __init__(self, rules):
+        super().__init__()
+        self.rules = tuple(rules.items())
+        self._state = {}     # (logger, prefixo) -> [próximo_permitido, suprimidas]
+
+    def filter(self, record):
+        if record.levelno != logging.INFO or not isinstance(record.msg, str):
+            return True
+        for prefix, seconds in self.rules:
+            if record.msg.startswith(prefix):
+                key = (record.name, prefix)
+                state = self._state.get(key)
+                now = record.created
+                if state is not None and now < state[0]:
+                    state[1] += 1
+                    return False
+                if state is not None and state[1]:
+                    record.suppressed = state[1]
+                self._state[key] = [now + seconds, 0]
+                return True
+        return True
+
+
+def parse_sample_rules(spec):
+    """
+    "Preço atual=60,[SIM] Ordem=5" -> {"Preço atual": 60.0, "[SIM] Ordem": 5.0}
+    """
+    rules = {}
+    for item in (spec or "").split(","):
+        prefix, _, seconds = item.rpartition("=")
+        if prefix.strip() and seconds.strip():
+            rules[prefix.strip()] = float(seconds)
+    return rules
+
+
+# --------------------------------------
+# CONFIGURAÇÃO
+# --------------------------------------
+def setup_logging(name, log_file, prefix="", fmt=None, level=None, max_mb=None,
+                  rotate_hours=None, backup_count=None, sample=None):
+    """
+    Configura o logging do processo (uma vez) e devolve o logger `name`.
+    Parâmetros não informados vêm do ambiente (LOG_*).
+    """
+    global _listener
+    logger = logging.getLogger(name)
+    with _lock:
+        if _listener is not None:
+            return logger
+
+        fmt = (fmt or os.getenv("LOG_FORMAT", "text")).lower()
+        level = level or os.getenv("LOG_LEVEL", "INFO").upper()
+        max_mb = float(max_mb if max_mb is not None else os.getenv("LOG_MAX_MB", 50))
+        rotate_hours = float(rotate_hours if rotate_hours is not None else os.getenv("LOG_ROTATE_HOURS", 24))
+        backup_count = int(backup_count if backup_count is not None else os.getenv("LOG_BACKUP_COUNT", 14))
+        sample = sample if sample is not None else os.getenv("LOG_SAMPLE", "Preço atual=60")
+
+        text = TextFormatter(TEXT_FORMAT.format(prefix=prefix))
+        file_handler = RotatingGzipFileHandler(
+            log_file,
+            max_bytes=max_mb * 1024 * 1024,
+            interval_seconds=rotate_hours * 3600,
+            backup_count=backup_count,
+        )
+        file_handler.setFormatter(JsonFormatter() if fmt == "json" else text)
+        stdout_handler = logging.StreamHandler(sys.stdout)
+        stdout_handler.setFormatter(text)
+
+        log_queue = queue.SimpleQueue()
+        queue_handler = _DeferredQueueHandler(log_queue)
+        rules = parse_sample_rules(sample)
+        if rules:
+            queue_handler.addFilter(SamplingFilter(rules))
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(queue_handler)
+        root.setLevel(level)
+
+        _listener = logging.handlers.QueueListener(
+            log_queue, file_handler, stdout_handler, respect_handler_level=True
+        )
+        _listener.start()
+        atexit.register(shutdown)
+    return logger
+
+
+def shutdown():
+    """
+    Esvazia a fila e fecha os arquivos (chamado no atexit).
+    """
+    global _listener
+    with _lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
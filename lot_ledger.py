@@ -0,0 +1,388 @@
+import heapq
+import os
+import sqlite3
+import sys
+from datetime import datetime
+
+import profit_rollups
+from fee_normalizer import ensure_fee_columns
+
+
+# ==========================================
+# LIVRO DE LOTES (BUY -> SELL)
+# ==========================================
+# Cada BUY executada vira um lote com quantidade restante. Uma SELL consome
+# um ou mais lotes (parcialmente, se preciso) e o ciclo é fechado a partir
+# dos pedaços consumidos. O estado persistido é a coluna remaining_amount de
+# filled_orders; used_in_cycle=1 passa a significar "lote totalmente consumido".
+
+LOT_EPSILON = 1e-12
+MATCH_MODES = ("level", "fifo")
+
+
+def ensure_lot_columns(cursor):
+    """
+    Migração: adiciona filled_orders.remaining_amount e inicializa a partir de used_in_cycle.
+    """
+    cursor.execute("PRAGMA table_info(filled_orders)")
+    columns = [r[1] for r in cursor.fetchall()]
+    if "remaining_amount" in columns:
+        return False
+    cursor.execute("ALTER TABLE filled_orders ADD COLUMN remaining_amount REAL")
+    cursor.execute('''
+        UPDATE filled_orders
+        SET remaining_amount = CASE WHEN side='BUY' AND used_in_cycle=0 THEN amount ELSE 0.0 END
+    ''')
+    return True
+
+
+class Lot:
+    __slots__ = ("fill_id", "grid_index", "price", "amount", "remaining", "fee")
+
+    def __init__(self, fill_id, grid_index, price, amount, remaining, fee):
+        self.fill_id = fill_id
+        self.grid_index = grid_index
+        self.price = float(price)
+        self.amount = float(amount)
+        self.remaining = float(remaining)
+        self.fee = float(fee or 0.0)
+
+    @property
+    def open(self):
+        return self.remaining > LOT_EPSILON
+
+
+class LotLedger:
+    """
+    Lotes BUY abertos em memória, indexados para casamento em O(log n):
+    - heap global por fill_id (FIFO)
+    - heap por grid_index (nível)
+    - dict por fill_id (lote específico)
+    Lotes consumidos saem dos heaps de forma preguiçosa (ao chegarem ao topo).
+    """
+
+    def __init__(self, mode="level"):
+        if mode not in MATCH_MODES:
+            raise ValueError(f"LOT_MATCHING inválido: {mode}. Use um de {MATCH_MODES}")
+        self.mode = mode
+        self.lots = {}
+        self._fifo = []
+        self._by_level = {}
+        self.open_qty = 0.0
+        self.open_cost = 0.0
+
+    # --------------------------------------
+    # CARGA / INSERÇÃO
+    # --------------------------------------
+    def load(self, cursor):
+        cursor.execute('''
+            SELECT id, grid_index, price, amount, COALESCE(remaining_amount, amount), COALESCE(fee_quote, fee)
+            FROM filled_orders
+            WHERE side='BUY' AND used_in_cycle=0
+            ORDER BY id ASC
+        ''')
+        return self.load_rows(cursor.fetchall())
+
+    def load_rows(self, rows):
+        """
+        rows: (fill_id, grid_index, price, amount, remaining, fee) — do DB ou de um snapshot.
+        """
+        for row in rows:
+            self._insert(Lot(*row))
+        return len(self.lots)
+
+    def _insert(self, lot):
+        if not lot.open:
+            return
+        self.lots[lot.fill_id] = lot
+        heapq.heappush(self._fifo, (lot.fill_id, lot))
+        heapq.heappush(self._by_level.setdefault(lot.grid_index, []), (lot.fill_id, lot))
+        self.open_qty += lot.remaining
+        self.open_cost += lot.remaining * lot.price
+
+        # Entradas mortas acumuladas no meio dos heaps: recompacta (custo amortizado)
+        if len(self._fifo) > 2 * len(self.lots) + 64:
+            self._compact()
+
+    def _compact(self):
+        self._fifo = [(lot.fill_id, lot) for lot in self.lots.values()]
+        heapq.heapify(self._fifo)
+        self._by_level = {}
+        for entry in self._fifo:
+            self._by_level.setdefault(entry[1].grid_index, []).append(entry)
+        for heap in self._by_level.values():
+            heapq.heapify(heap)
+
+    def add(self, fill_id, grid_index, price, amount, fee=0.0):
+        """
+        Registra uma BUY executada (a linha de filled_orders já deve existir com remaining_amount=amount).
+        """
+        lot = Lot(fill_id, grid_index, price, amount, amount, fee)
+        self._insert(lot)
+        return lot
+
+    # --------------------------------------
+    # CASAMENTO
+    # --------------------------------------
+    @staticmethod
+    def _peek(heap):
+        while heap and not heap[0][1].open:
+            heapq.heappop(heap)
+        return heap[0][1] if heap else None
+
+    def _take(self, lot, qty, taken):
+        q = min(lot.remaining, qty)
+        lot.remaining -= q
+        if lot.remaining <= LOT_EPSILON:
+            lot.remaining = 0.0
+            self.lots.pop(lot.fill_id, None)
+        self.open_qty = max(0.0, self.open_qty - q)
+        self.open_cost = max(0.0, self.open_cost - q * lot.price)
+        taken.append((lot, q))
+        return qty - q
+
+    def _drain(self, heap, qty, taken):
+        while qty > LOT_EPSILON:
+            lot = self._peek(heap)
+            if lot is None:
+                break
+            qty = self._take(lot, qty, taken)
+        return qty
+
+    def match(self, cursor, qty, grid_index=None, lot_id=None):
+        """
+        Consome `qty` dos lotes abertos e persiste o restante de cada lote tocado (sem commit;
+        cursor=None só altera a memória, usado no replay de rebuild_real_profits).
+        Ordem de prioridade:
+        - lot_id informado: esse lote primeiro
+        - modo 'level': lotes do grid_index informado (mais antigos primeiro)
+        - sobra (ou modo 'fifo'): lotes mais antigos de qualquer nível
+        Retorna [(lot, qty_consumida), ...]; sum(qty) < qty pedida se faltar estoque.
+        """
+        taken = []
+        qty = float(qty)
+
+        if lot_id is not None and lot_id in self.lots:
+            qty = self._take(self.lots[lot_id], qty, taken)
+
+        if self.mode == "level" and grid_index is not None and qty > LOT_EPSILON:
+            heap = self._by_level.get(grid_index)
+            if heap:
+                qty = self._drain(heap, qty, taken)
+                if not heap:
+                    self._by_level.pop(grid_index, None)
+
+        if qty > LOT_EPSILON:
+            self._drain(self._fifo, qty, taken)
+
+        for lot, _q in taken:
+            if cursor is None:
+                break
+            cursor.execute(
+                "UPDATE filled_orders SET remaining_amount=?, used_in_cycle=? WHERE id=?",
+                (lot.remaining, 0 if lot.open else 1, lot.fill_id)
+            )
+        return taken
+
+
+def summarize_cycle(taken, sell_price, sell_amount, sell_fee):
+    """
+    Fecha o ciclo a partir dos pedaços consumidos: taxas proporcionais à quantidade
+    (taxa da BUY pelo pedaço do lote, taxa da SELL pela parte casada).
+    """
+    qty = sum(q for _lot, q in taken)
+    if qty <= 0:
+        return None
+
+    cost = sum(lot.price * q for lot, q in taken)
+    buy_fee = sum(lot.fee * q / lot.amount for lot, q in taken if lot.amount > 0)
+    sell_fee = float(sell_fee or 0.0) * (qty / float(sell_amount)) if sell_amount else 0.0
+    gross = float(sell_price) * qty - cost
+
+    return {
+        "qty": qty,
+        "buy_price": cost / qty,
+        "gross": gross,
+        "buy_fee": buy_fee,
+        "sell_fee": sell_fee,
+        "net": gross - buy_fee - sell_fee,
+        "lots": len(taken),
+    }
+
+
+# ==========================================
+# RECONSTRUÇÃO (MESMO MODO DE CASAMENTO DO BOT)
+# ==========================================
+
+def _fifo_pass(buys, sells):
+    """
+    Casamento FIFO em uma passada vetorizada:
+    - quantidades acumuladas de BUYs e SELLs (cumsum)
+    - pontos de corte = união das duas somas acumuladas
+    - cada segmento entre cortes pertence a um único par (BUY, SELL) via searchsorted
+    - agregação por SELL com bincount
+    Supõe estoque nunca negativo (as SELLs do grid só existem após BUYs).
+    Retorna ([(sell_row, ciclo)], [restante de cada BUY]).
+    """
+    import numpy as np
+
+    b_price = np.array([r[2] for r in buys], dtype=float)
+    b_amt = np.array([r[3] for r in buys], dtype=float)
+    b_fee = np.array([r[4] for r in buys], dtype=float)
+    s_price = np.array([r[2] for r in sells], dtype=float)
+    s_amt = np.array([r[3] for r in sells], dtype=float)
+    s_fee = np.array([r[4] for r in sells], dtype=float)
+
+    b_cum = np.cumsum(b_amt)
+    s_cum = np.cumsum(s_amt)
+    total_b = b_cum[-1] if len(b_cum) else 0.0
+    total_s = s_cum[-1] if len(s_cum) else 0.0
+    matched_total = min(total_b, total_s)
+
+    cuts = np.unique(np.concatenate(([0.0], b_cum, s_cum)))
+    cuts = cuts[cuts <= matched_total + LOT_EPSILON]
+    seg_qty = np.diff(cuts)
+    keep = seg_qty > LOT_EPSILON
+    mid = (cuts[:-1] + cuts[1:])[keep] / 2.0
+    seg_qty = seg_qty[keep]
+
+    bi = np.searchsorted(b_cum, mid, side='right')
+    si = np.searchsorted(s_cum, mid, side='right')
+
+    n_sells = len(sells)
+    qty = np.bincount(si, weights=seg_qty, minlength=n_sells)
+    cost = np.bincount(si, weights=seg_qty * b_price[bi], minlength=n_sells)
+    buy_fee = np.bincount(si, weights=seg_qty * (b_fee[bi] / np.where(b_amt[bi] > 0, b_amt[bi], 1.0)),
+                          minlength=n_sells)
+    sell_fee = np.where(s_amt > 0, s_fee * qty / np.where(s_amt > 0, s_amt, 1.0), 0.0)
+    gross = s_price * qty - cost
+    net = gross - buy_fee - sell_fee
+
+    # Restante de cada BUY = quantidade não coberta pelo total vendido
+    consumed = np.clip(matched_total - (b_cum - b_amt), 0.0, b_amt)
+    remaining = b_amt - consumed
+
+    cycles = []
+    for j, sell in enumerate(sells):
+        if qty[j] <= LOT_EPSILON:
+            continue
+        cycles.append((sell, {
+            "qty": float(qty[j]), "buy_price": float(cost[j] / qty[j]), "gross": float(gross[j]),
+            "buy_fee": float(buy_fee[j]), "sell_fee": float(sell_fee[j]), "net": float(net[j]),
+        }))
+    return cycles, [float(r) for r in remaining]
+
+
+def _replay_pass(rows, mode):
+    """
+    Replay do casamento do bot (LotLedger no mesmo modo) em ordem de id: a SELL do
+    nível i consome primeiro os lotes do nível i - 1, como em check_orders.
+    Retorna ([(sell_row, ciclo)], [restante de cada BUY]).
+    """
+    ledger = LotLedger(mode=mode)
+    lots = []
+    cycles = []
+    for row in rows:
+        fill_id, side, price, amount, fee, grid_index = row[0], row[1], row[2], row[3], row[4], row[7]
+        if side == 'BUY':
+            lots.append(ledger.add(fill_id, grid_index, price, amount, fee))
+        else:
+            level = grid_index - 1 if grid_index is not None else None
+            taken = ledger.match(None, amount, grid_index=level)
+            cycle = summarize_cycle(taken, price, amount, fee)
+            if cycle:
+                cycles.append((row, cycle))
+    return cycles, [lot.remaining for lot in lots]
+
+
+def rebuild_real_profits(conn: sqlite3.Connection, symbol, history_table=None, mode="fifo"):
+    """
+    Recalcula real_profits e o restante de cada lote a partir de filled_orders,
+    com o mesmo casamento do bot (LOT_MATCHING):
+    - 'fifo' : passada vetorizada única (numpy)
+    - 'level': replay dos lotes pelo LotLedger (heaps, O(n log n))
+    Só as BUYs de filled_orders cujo restante mudou são regravadas (tabela temporária
+    + um UPDATE ... FROM); execuções arquivadas entram no cálculo mas não são alteradas.
+    history_table (ex.: 'archive.filled_orders_history') inclui as execuções arquivadas.
+    """
+    if mode not in MATCH_MODES:
+        raise ValueError(f"LOT_MATCHING inválido: {mode}. Use um de {MATCH_MODES}")
+
+    cursor = conn.cursor()
+    columns = "id, side, price, amount, COALESCE(fee_quote, fee, 0.0), order_id, timestamp, grid_index"
+    sql = (
+        f"SELECT {columns}, COALESCE(remaining_amount, amount), used_in_cycle, 0 FROM filled_orders"
+    )
+    if history_table:
+        sql += f" UNION ALL SELECT {columns}, NULL, NULL, 1 FROM {history_table}"
+    cursor.execute(sql + " ORDER BY id ASC")
+    rows = cursor.fetchall()
+    buys = [r for r in rows if r[1] == 'BUY']
+
+    if mode == "fifo":
+        cycles, remaining = _fifo_pass(buys, [r for r in rows if r[1] == 'SELL'])
+    else:
+        cycles, remaining = _replay_pass(rows, mode)
+
+    cursor.execute("DELETE FROM real_profits")
+    out = [
+        (sell[5], c["gross"], c["net"], c["buy_price"], float(sell[2]), c["qty"], c["buy_fee"], c["sell_fee"], sell[6])
+        for sell, c in cycles
+    ]
+    cursor.executemany('''
+        INSERT INTO real_profits
+        (order_id, gross_profit, net_profit, buy_price, sell_price, amount, buy_fee, sell_fee, timestamp)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', out)
+
+    changed = []
+    for buy, rest in zip(buys, remaining):
+        used = 0 if rest > LOT_EPSILON else 1
+        if buy[10] or (abs(buy[8] - rest) <= LOT_EPSILON and buy[9] == used):
+            continue
+        changed.append((buy[0], rest, used))
+    if changed:
+        cursor.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS lot_rebuild (id INTEGER PRIMARY KEY, remaining REAL, used INTEGER)"
+        )
+        cursor.execute("DELETE FROM lot_rebuild")
+        cursor.executemany("INSERT INTO lot_rebuild (id, remaining, used) VALUES (?, ?, ?)", changed)
+        cursor.execute('''
+            UPDATE filled_orders SET remaining_amount = r.remaining, used_in_cycle = r.used
+            FROM lot_rebuild AS r WHERE filled_orders.id = r.id
+        ''')
+        cursor.execute("DROP TABLE lot_rebuild")
+    conn.commit()
+
+    profit_rollups.backfill(conn, symbol)
+    return len(out)
+
+
+# ==========================================
+# CLI: python lot_ledger.py grid_data.db [SYMBOL] [ARQUIVO_DB]
+# (modo de casamento do LOT_MATCHING do .env, como nos bots)
+# ==========================================
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Uso: python lot_ledger.py <banco.db> [SYMBOL] [arquivo.db]")
+        sys.exit(1)
+
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    db_path = sys.argv[1]
+    symbol = sys.argv[2] if len(sys.argv) > 2 else "BTC/USDT"
+    mode = os.getenv('LOT_MATCHING', 'level').lower()
+    conn = sqlite3.connect(db_path, timeout=15)
+    ensure_lot_columns(conn.cursor())
+    ensure_fee_columns(conn.cursor(), *symbol.split('/'))
+
+    history = None
+    if len(sys.argv) > 3:
+        conn.execute("ATTACH DATABASE ? AS archive", (sys.argv[3],))
+        history = "archive.filled_orders_history"
+
+    started = datetime.now()
+    n = rebuild_real_profits(conn, symbol, history, mode=mode)
+    conn.close()
+    print(f"{n} ciclos reconstruídos ({mode}) em {(datetime.now() - started).total_seconds():.2f}s")
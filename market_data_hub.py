@@ -0,0 +1,307 @@
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+
+from dotenv import load_dotenv
+
+from fast_start import ccxt
+from http_transport import session_options, shared_session, use_session
+from log_setup import setup_logging
+from metrics import MetricsRegistry, start_http_server
+
+
+# ==========================================
+# HUB DE DADOS DE MERCADO (UM FEED PARA TODOS OS BOTS)
+# ==========================================
+# Um único processo consulta a Binance (fetch_tickers em lote + candles por
+# par/timeframe) e publica o último estado num socket Unix local.
+# Protocolo: uma linha JSON por pedido, uma linha JSON por resposta.
+#   {"op": "ticker", "symbol": "BTC/USDT"}
+#   {"op": "ohlcv", "symbol": "BTC/USDT", "timeframe": "1h", "limit": 100}
+# Pedidos de pares ainda não acompanhados inscrevem o par e respondem
+# "subscribed"; o cliente usa a exchange direta até o hub ter o dado.
+
+DEFAULT_SOCKET = "/tmp/cripto_market_hub.sock"
+MAX_OHLCV_LIMIT = 1000
+
+
+class MarketDataHub:
+    def __init__(self, exchange, logger, symbols=(), ticker_interval=2.0, ohlcv_interval=10.0, metrics=None):
+        self.exchange = exchange
+        self.logger = logger
+        self.ticker_interval = float(ticker_interval)
+        self.ohlcv_interval = float(ohlcv_interval)
+
+        self._lock = threading.Lock()
+        self.symbols = set(symbols)
+        self.candle_keys = {}       # (symbol, timeframe) -> maior limit pedido
+        self.tickers = {}           # symbol -> (monotonic, bytes JSON)
+        self.candles = {}           # (symbol, timeframe) -> (monotonic, lista)
+        self._candles_due = {}
+        self._stop = threading.Event()
+
+        self._upstream = self._requests = None
+        if metrics is not None:
+            self._upstream = metrics.counter("upstream_calls", "Chamadas do hub à exchange", ("method", "status"))
+            self._requests = metrics.counter("hub_requests", "Pedidos atendidos pelo hub", ("op", "status"))
+
+    # --------------------------------------
+    # UPSTREAM
+    # --------------------------------------
+    def _call(self, method, *args, **kwargs):
+        try:
+            result = getattr(self.exchange, method)(*args, **kwargs)
+            if self._upstream:
+                self._upstream.inc(method=method, status="ok")
+            return result
+        except Exception as e:
+            if self._upstream:
+                self._upstream.inc(method=method, status="error")
+            self.logger.error(f"Erro upstream {method}: {e}")
+            return None
+
+    def poll_tickers(self):
+        with self._lock:
+            symbols = sorted(self.symbols)
+        if not symbols:
+            return
+        # Uma chamada em lote para todos os pares (ticker + topo do livro)
+        tickers = self._call("fetch_tickers", symbols)
+        if not tickers:
+            return
+        now = time.monotonic()
+        with self._lock:
+            for symbol in symbols:
+                ticker = tickers.get(symbol)
+                if ticker:
+                    ticker.pop("info", None)
+                    self.tickers[symbol] = (now, json.dumps(ticker, separators=(",", ":")).encode())
+
+    def poll_candles(self):
+        now = time.monotonic()
+        with self._lock:
+            due = [(key, limit) for key, limit in self.candle_keys.items()
+                   if self._candles_due.get(key, 0.0) <= now]
+        for (symbol, timeframe), limit in due:
+            self._candles_due[(symbol, timeframe)] = now + self.ohlcv_interval
+            ohlcv = self._call("fetch_ohlcv", symbol, timeframe, limit=limit)
+            if ohlcv:
+                with self._lock:
+                    self.candles[(symbol, timeframe)] = (time.monotonic(), ohlcv)
+
+    def run_upstream(self):
+        while not self._stop.is_set():
+            started = time.monotonic()
+            self.poll_tickers()
+            self.poll_candles()
+            self._stop.wait(max(0.0, self.ticker_interval - (time.monotonic() - started)))
+
+    def stop(self):
+        self._stop.set()
+
+    # --------------------------------------
+    # PEDIDOS DOS BOTS
+    # --------------------------------------
+    def handle(self, request):
+        op = request.get("op")
+        symbol = request.get("symbol")
+
+        if op == "ticker":
+            with self._lock:
+                entry = self.tickers.get(symbol)
+                if entry is None:
+                    self.symbols.add(symbol)
+            if entry is None:
+                return self._reply(op, b'{"ok":false,"error":"subscribed"}')
+            age = time.monotonic() - entry[0]
+            return self._reply(op, b'{"ok":true,"age":%.4f,"data":%s}' % (age, entry[1]))
+
+        if op == "ohlcv":
+            timeframe = request.get("timeframe", "1m")
+            limit = min(int(request.get("limit") or 100), MAX_OHLCV_LIMIT)
+            key = (symbol, timeframe)
+            with self._lock:
+                if self.candle_keys.get(key, 0) < limit:
+                    self.candle_keys[key] = limit
+                    self._candles_due[key] = 0.0
+                entry = self.candles.get(key)
+            if entry is None or len(entry[1]) < limit:
+                return self._reply(op, b'{"ok":false,"error":"subscribed"}')
+            age = time.monotonic() - entry[0]
+            data = json.dumps(entry[1][-limit:], separators=(",", ":")).encode()
+            return self._reply(op, b'{"ok":true,"age":%.4f,"data":%s}' % (age, data))
+
+        return self._reply(op, b'{"ok":false,"error":"op desconhecida"}')
+
+    def _reply(self, op, body):
+        if self._requests:
+            self._requests.inc(op=str(op), status="ok" if body.startswith(b'{"ok":true') else "miss")
+        return body + b"\n"
+
+    def serve(self, socket_path):
+        hub = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    try:
+                        response = hub.handle(json.loads(line))
+                    except Exception as e:
+                        response = json.dumps({"ok": False, "error": str(e)}).encode() + b"\n"
+                    self.wfile.write(response)
+                    self.wfile.flush()
+
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = socketserver.ThreadingUnixStreamServer(socket_path, Handler)
+        server.daemon_threads = True
+        os.chmod(socket_path, 0o660)
+        return server
+
+
+# ==========================================
+# CLIENTE (USADO PELOS BOTS)
+# ==========================================
+
+class MarketDataClient:
+    """
+    Conexão persistente com o hub. Falhas não travam o bot: após um erro,
+    o hub só é tentado de novo depois de retry_seconds.
+    """
+
+    def __init__(self, socket_path, logger, timeout=0.5, retry_seconds=30.0):
+        self.socket_path = socket_path
+        self.logger = logger
+        self.timeout = float(timeout)
+        self.retry_seconds = float(retry_seconds)
+        self._sock = None
+        self._file = None
+        self._lock = threading.Lock()
+        self._retry_at = 0.0
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self._sock = sock
+        self._file = sock.makefile("rb")
+
+    def _close(self):
+        for obj in (self._file, self._sock):
+            try:
+                if obj:
+                    obj.close()
+            except OSError:
+                pass
+        self._sock = self._file = None
+
+    def request(self, payload):
+        """
+        Retorna (data, age) ou None se o hub não tiver o dado / estiver fora.
+        """
+        if time.monotonic() < self._retry_at:
+            return None
+        with self._lock:
+            try:
+                if self._sock is None:
+                    self._connect()
+                self._sock.sendall(json.dumps(payload, separators=(",", ":")).encode() + b"\n")
+                line = self._file.readline()
+                if not line:
+                    raise ConnectionError("hub fechou a conexão")
+            except (OSError, ConnectionError) as e:
+                self._close()
+                self._retry_at = time.monotonic() + self.retry_seconds
+                self.logger.warning(f"Hub de mercado indisponível ({e}); usando a exchange direto.")
+                return None
+
+        response = json.loads(line)
+        if not response.get("ok"):
+            return None
+        return response["data"], response["age"]
+
+
+class HubExchange:
+    """
+    Proxy da exchange: fetch_ticker / fetch_ohlcv vêm do hub quando o dado é recente;
+    caso contrário (ou para qualquer outro método) vai direto à exchange.
+    """
+
+    def __init__(self, client, hub, max_ticker_age=5.0, max_ohlcv_age=30.0):
+        self._client = client
+        self._hub = hub
+        self.max_ticker_age = float(max_ticker_age)
+        self.max_ohlcv_age = float(max_ohlcv_age)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    def fetch_ticker(self, symbol, params=None):
+        if not params:
+            result = self._hub.request({"op": "ticker", "symbol": symbol})
+            if result and result[1] <= self.max_ticker_age:
+                return result[0]
+        if params:
+            return self._client.fetch_ticker(symbol, params)
+        return self._client.fetch_ticker(symbol)
+
+    def fetch_ohlcv(self, symbol, timeframe="1m", since=None, limit=None, params=None):
+        if since is None and not params:
+            result = self._hub.request({"op": "ohlcv", "symbol": symbol, "timeframe": timeframe, "limit": limit or 100})
+            if result and result[1] <= self.max_ohlcv_age:
+                return result[0]
+        kwargs = {"limit": limit}
+        if since is not None:
+            kwargs["since"] = since
+        if params:
+            kwargs["params"] = params
+        return self._client.fetch_ohlcv(symbol, timeframe, **kwargs)
+
+
+# ==========================================
+# PROCESSO DO HUB: python market_data_hub.py
+# ==========================================
+def main():
+    load_dotenv(dotenv_path=".env", override=True)
+    logger = setup_logging("MarketDataHub", os.getenv("MARKET_HUB_LOG_FILE", "market_hub.log"), prefix="[HUB] ")
+
+    socket_path = os.getenv("MARKET_HUB_SOCKET") or DEFAULT_SOCKET
+    symbols = [s.strip() for s in os.getenv("MARKET_HUB_SYMBOLS", "BTC/USDT,ADA/USDT").split(",") if s.strip()]
+    metrics_port = int(os.getenv("MARKET_HUB_METRICS_PORT", 9104))
+
+    metrics = MetricsRegistry(prefix="markethub_")
+    exchange = ccxt.binance({'enableRateLimit': True, 'options': {'defaultType': 'spot'}})
+    use_session(exchange, shared_session("binance", metrics, **session_options(os.environ)))
+
+    hub = MarketDataHub(
+        exchange, logger, symbols,
+        ticker_interval=float(os.getenv("MARKET_HUB_TICKER_SECONDS", 2)),
+        ohlcv_interval=float(os.getenv("MARKET_HUB_OHLCV_SECONDS", 10)),
+        metrics=metrics,
+    )
+    if metrics_port:
+        try:
+            start_http_server(metrics, metrics_port)
+        except OSError as e:
+            logger.error(f"Não foi possível abrir o endpoint de métricas: {e}")
+
+    server = hub.serve(socket_path)
+    threading.Thread(target=hub.run_upstream, name="hub-upstream", daemon=True).start()
+    logger.info(f"Hub de mercado em {socket_path} | pares: {', '.join(symbols)}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        hub.stop()
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+import bisect
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+# ==========================================
+# MÉTRICAS
+# ==========================================
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def _fmt_labels(self, key, extra=None):
+        pairs = list(zip(self.labelnames, key))
+        if extra:
+            pairs.append(extra)
+        if not pairs:
+            return ""
+        inner = ",".join(f'{k}="{v}"' for k, v in pairs)
+        return "{" + inner + "}"
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name + "_total", key, None, value
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount=1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name, key, None, value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][idx] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def samples(self):
+        with self._lock:
+            items = [(k, (list(v[0]), v[1], v[2])) for k, v in self._values.items()]
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, c in zip(self.buckets, counts):
+                cumulative += c
+                yield self.name + "_bucket", key, ("le", repr(bound)), cumulative
+            yield self.name + "_bucket", key, ("le", "+Inf"), count
+            yield self.name + "_sum", key, None, total
+            yield self.name + "_count", key, None, count
+
+
+class MetricsRegistry:
+    """
+    Registro de métricas em memória (contadores, gauges e histogramas com labels).
+    Operações no loop são um lookup de dict + lock, custo desprezível.
+    """
+
+    def __init__(self, prefix=""):
+        self.prefix = prefix
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help_text, labelnames, **kwargs):
+        full = self.prefix + name
+        with self._lock:
+            metric = self._metrics.get(full)
+            if metric is None:
+                metric = self._metrics[full] = cls(full, help_text, labelnames, **kwargs)
+            return metric
+
+    def counter(self, name, help_text="", labelnames=()):
+        return self._get(Counter, name, help_text, labelnames)
+
+    def gauge(self, name, help_text="", labelnames=()):
+        return self._get(Gauge, name, help_text, labelnames)
+
+    def histogram(self, name, help_text="", labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get(Histogram, name, help_text, labelnames, buckets=buckets)
+
+    def metrics(self):
+        with self._lock:
+            return list(self._metrics.values())
+
+    def render_prometheus(self):
+        """
+        Exporta no formato texto do Prometheus (0.0.4).
+        """
+        lines = []
+        for metric in self.metrics():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for sample_name, key, extra, value in metric.samples():
+                lines.append(f"{sample_name}{metric._fmt_labels(key, extra)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        """
+        Lista (nome, labels_json, valor) de todas as séries; histogramas viram _sum/_count.
+        """
+        rows = []
+        for metric in self.metrics():
+            for sample_name, key, extra, value in metric.samples():
+                if extra is not None:
+                    continue
+                labels = dict(zip(metric.labelnames, key))
+                rows.append((sample_name, json.dumps(labels, separators=(',', ':')), float(value)))
+        return rows
+
+
+# ==========================================
+# EXPORTAÇÃO (HTTP / SQLITE)
+# ==========================================
+
+def start_http_server(registry, port, host="127.0.0.1"):
+    """
+    Sobe o endpoint /metrics (texto Prometheus) em thread daemon.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/metrics", "/"):
+                self.send_response(404)
+                self.end_headers()
+                return
+            body = registry.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    thread = threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True)
+    thread.start()
+    return server
+
+
+class SQLiteSnapshotter:
+    """
+    Grava snapshots periódicos do registro na tabela metrics_snapshots,
+    com conexão própria e fora da thread do loop.
+    """
+
+    def __init__(self, registry, db_name, interval=60.0, logger=None):
+        self.registry = registry
+        self.db_name = db_name
+        self.interval = float(interval)
+        self.logger = logger
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-snapshot", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        conn = sqlite3.connect(self.db_name, timeout=15)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS metrics_snapshots (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TEXT,
+                name TEXT,
+                labels TEXT,
+                value REAL
+            )
+        ''')
+        conn.commit()
+
+        while not self._stop.wait(self.interval):
+            try:
+                ts = time.strftime("%Y-%m-%dT%H:%M:%S")
+                rows = [(ts, n, l, v) for n, l, v in self.registry.snapshot()]
+                conn.executemany(
+                    "INSERT INTO metrics_snapshots (timestamp, name, labels, value) VALUES (?, ?, ?, ?)",
+                    rows
+                )
+                conn.commit()
+            except Exception as e:
+                if self.logger:
+                    self.logger.error(f"Erro ao gravar snapshot de métricas: {e}")
+        conn.close()
+
+
+# ==========================================
+# EXCHANGE INSTRUMENTADA
+# ==========================================
+
+class InstrumentedExchange:
+    """
+    Proxy que mede cada chamada à exchange: contador por método/resultado
+    e histograma de latência por método.
+    """
+
+    def __init__(self, client, registry):
+        self._client = client
+        self._requests = registry.counter(
+            "exchange_requests", "Chamadas à exchange por método e resultado", ("method", "status")
+        )
+        self._latency = registry.histogram(
+            "exchange_request_seconds", "Latência das chamadas à exchange", ("method",)
+        )
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if name.startswith('_') or not callable(attr) or name.endswith('_to_precision'):
+            return attr
+
+        def instrumented(*args, **kwargs):
+            t0 = time.perf_counter()
+            status = "ok"
+            try:
+                return attr(*args, **kwargs)
+            except Exception:
+                status = "error"
+                raise
+            finally:
+                self._latency.observe(time.perf_counter() - t0, method=name)
+                self._requests.inc(method=name, status=status)
+
+        return instrumented
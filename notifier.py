@@ -0,0 +1,106 @@
+import queue
+import threading
+
+import requests
+
+
+# ==========================================
+# TELEGRAM ASSÍNCRONO (FILA + THREAD)
+# ==========================================
+
+class TelegramNotifier:
+    """
+    Envia mensagens ao Telegram a partir de uma fila consumida em background,
+    para que a latência da API não caia na thread de trading.
+    """
+
+    def __init__(self, token, chat_id, logger, prefix="", parse_mode=None, timeout=5,
+                 max_queue=1000, metrics=None, session=None):
+        self.token = token
+        self.chat_id = chat_id
+        self.logger = logger
+        self.prefix = prefix
+        self.parse_mode = parse_mode
+        self.timeout = timeout
+        # Session com pool keep-alive (http_transport); sem ela, uma conexão nova por mensagem
+        self.session = session
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stopped = False
+
+        self._depth = self._sent = self._latency = None
+        if metrics is not None:
+            self._depth = metrics.gauge("telegram_queue_depth", "Mensagens aguardando envio ao Telegram")
+            self._sent = metrics.counter("telegram_messages", "Mensagens Telegram por resultado", ("status",))
+            self._latency = metrics.histogram("telegram_send_seconds", "Latência do envio ao Telegram")
+
+        self._thread = threading.Thread(target=self._worker, name="telegram", daemon=True)
+        self._thread.start()
+
+    @property
+    def enabled(self):
+        return bool(self.token and self.chat_id)
+
+    def send(self, message):
+        if not self.enabled or self._stopped:
+            return
+        try:
+            self._queue.put_nowait(f"{self.prefix}{message}")
+        except queue.Full:
+            self.logger.error("Fila do Telegram cheia. Mensagem descartada.")
+            if self._sent:
+                self._sent.inc(status="dropped")
+        if self._depth:
+            self._depth.set(self._queue.qsize())
+
+    def _post(self, text):
+        url = f"https://api.telegram.org/bot{self.token}/sendMessage"
+        payload = {"chat_id": self.chat_id, "text": text}
+        if self.parse_mode:
+            payload["parse_mode"] = self.parse_mode
+        (self.session or requests).post(url, json=payload, timeout=self.timeout)
+
+    def _worker(self):
+        while True:
+            text = self._queue.get()
+            if text is None:
+                self._queue.task_done()
+                return
+            try:
+                if self._latency:
+                    with self._latency.time():
+                        self._post(text)
+                else:
+                    self._post(text)
+                if self._sent:
+                    self._sent.inc(status="ok")
+            except Exception as e:
+                self.logger.error(f"Erro Telegram: {e}")
+                if self._sent:
+                    self._sent.inc(status="error")
+            finally:
+                self._queue.task_done()
+                if self._depth:
+                    self._depth.set(self._queue.qsize())
+
+    def flush(self, timeout=None):
+        """
+        Aguarda o envio das mensagens pendentes (ex.: antes de encerrar o processo).
+        """
+        done = threading.Event()
+
+        def wait():
+            self._queue.join()
+            done.set()
+
+        threading.Thread(target=wait, daemon=True).start()
+        return done.wait(timeout)
+
+    def stop(self, timeout=1.0):
+        """
+        Encerra a thread depois das mensagens já enfileiradas (descarte do bot no supervisor).
+        """
+        self._stopped = True
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            self.logger.error("Fila do Telegram cheia ao encerrar. Mensagens pendentes descartadas.")
@@ -0,0 +1,187 @@
+import hashlib
+import time
+from datetime import datetime
+
+
+# ==========================================
+# LOG DE INTENÇÕES DE ORDEM (WRITE-AHEAD)
+# ==========================================
+# Toda ordem é gravada como PENDING (com um newClientOrderId determinístico)
+# ANTES do envio à exchange. Depois do envio:
+# - sucesso         -> PLACED (mesma transação que grava active_grids)
+# - rejeição        -> FAILED
+# - timeout / queda -> continua PENDING e é resolvida por clientOrderId
+# Um crash entre o envio e a gravação nunca deixa ordem "órfã" nem gera duplicata.
+
+CLIENT_ID_PREFIX = "gi"
+LOOKUP_MARGIN_MS = 60_000      # folga para relógio/latência na busca por período
+LOOKUP_LIMIT = 1000
+
+
+def ensure_intent_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS order_intents (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            client_id TEXT UNIQUE,
+            symbol TEXT,
+            grid_index INTEGER,
+            side TEXT,
+            generation INTEGER,
+            price REAL,
+            amount REAL,
+            status TEXT,
+            order_id TEXT,
+            error TEXT,
+            created_ms INTEGER,
+            updated_at TEXT
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_order_intents_status ON order_intents (status)")
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_order_intents_level ON order_intents (symbol, grid_index, side, generation)"
+    )
+
+
+def client_order_id(symbol, grid_index, side, generation):
+    """
+    ID determinístico (<= 36 caracteres, alfabeto aceito pela Binance):
+    a mesma intenção sempre gera o mesmo ID, então um reenvio nunca vira ordem nova.
+    """
+    key = f"{symbol}|{grid_index}|{side}|{generation}".encode()
+    return CLIENT_ID_PREFIX + hashlib.sha1(key).hexdigest()[:30]
+
+
+class OrderIntentLog:
+    """
+    Estado em memória: geração atual por (grid_index, side) e intenções PENDING.
+    Os métodos não fazem commit; o bot comita junto com active_grids.
+    """
+
+    def __init__(self, conn, symbol, logger):
+        self.conn = conn
+        self.cursor = conn.cursor()
+        self.symbol = symbol
+        self.logger = logger
+        self.generations = {}     # (grid_index, side) -> última geração usada
+        self.pending = {}         # client_id -> (grid_index, side, price, amount, created_ms)
+
+    def load(self):
+        self.cursor.execute('''
+            SELECT grid_index, side, MAX(generation) FROM order_intents
+            WHERE symbol=? GROUP BY grid_index, side
+        ''', (self.symbol,))
+        self.generations = {(r[0], r[1]): r[2] for r in self.cursor.fetchall()}
+
+        self.cursor.execute('''
+            SELECT client_id, grid_index, side, price, amount, created_ms FROM order_intents
+            WHERE symbol=? AND status='PENDING'
+        ''', (self.symbol,))
+        self.pending = {r[0]: tuple(r[1:]) for r in self.cursor.fetchall()}
+        return len(self.pending)
+
+    def export_state(self):
+        return {
+            "generations": [[k[0], k[1], g] for k, g in self.generations.items()],
+            "pending": self.pending,
+        }
+
+    def restore_state(self, state):
+        self.generations = {(r[0], r[1]): r[2] for r in state["generations"]}
+        self.pending = {cid: tuple(p) for cid, p in state["pending"].items()}
+        return len(self.pending)
+
+    def seed(self, state):
+        """
+        DB novo (migração de host): grava a última geração de cada nível e as
+        intenções PENDING, para que os próximos clientOrderId não repitam os antigos.
+        """
+        now = datetime.now().isoformat()
+        pending = {(p[0], p[1]): (cid, p) for cid, p in state["pending"].items()}
+        for grid_index, side, generation in state["generations"]:
+            cid, p = pending.get((grid_index, side), (None, None))
+            if cid is not None and cid == client_order_id(self.symbol, grid_index, side, generation):
+                price, amount, created_ms, status = p[2], p[3], p[4], 'PENDING'
+            else:
+                cid = client_order_id(self.symbol, grid_index, side, generation)
+                price, amount, created_ms, status = None, None, int(time.time() * 1000), 'PLACED'
+            self.cursor.execute('''
+                INSERT OR IGNORE INTO order_intents
+                (client_id, symbol, grid_index, side, generation, price, amount, status, created_ms, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (cid, self.symbol, grid_index, side, generation, price, amount, status, created_ms, now))
+
+    def has_pending(self, grid_index, side):
+        return any(p[0] == grid_index and p[1] == side for p in self.pending.values())
+
+    # --------------------------------------
+    # CICLO DE VIDA
+    # --------------------------------------
+    def begin(self, grid_index, side, price, amount):
+        """
+        Registra e COMITA a intenção antes do envio. Retorna o clientOrderId.
+        """
+        generation = self.generations.get((grid_index, side), 0) + 1
+        client_id = client_order_id(self.symbol, grid_index, side, generation)
+        created_ms = int(time.time() * 1000)
+        self.cursor.execute('''
+            INSERT INTO order_intents
+            (client_id, symbol, grid_index, side, generation, price, amount, status, created_ms, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, 'PENDING', ?, ?)
+        ''', (client_id, self.symbol, grid_index, side, generation, float(price), float(amount),
+              created_ms, datetime.now().isoformat()))
+        self.conn.commit()
+        self.generations[(grid_index, side)] = generation
+        self.pending[client_id] = (grid_index, side, float(price), float(amount), created_ms)
+        return client_id
+
+    def placed(self, client_id, order_id):
+        self._finish(client_id, 'PLACED', order_id=order_id)
+
+    def failed(self, client_id, error):
+        self._finish(client_id, 'FAILED', error=str(error)[:500])
+
+    def _finish(self, client_id, status, order_id=None, error=None):
+        self.cursor.execute(
+            "UPDATE order_intents SET status=?, order_id=?, error=?, updated_at=? WHERE client_id=?",
+            (status, order_id, error, datetime.now().isoformat(), client_id)
+        )
+        self.pending.pop(client_id, None)
+
+    # --------------------------------------
+    # RESOLUÇÃO (REINÍCIO / TIMEOUT)
+    # --------------------------------------
+    def lookup(self, exchange):
+        """
+        Busca em lote as ordens das intenções PENDING: fetch_orders a partir da mais antiga
+        (uma chamada; pagina só se houver mais de LOOKUP_LIMIT ordens no período).
+        Retorna {client_id: ordem ccxt} apenas para os IDs pendentes encontrados.
+        """
+        if not self.pending:
+            return {}
+        wanted = set(self.pending)
+        since = min(p[4] for p in self.pending.values()) - LOOKUP_MARGIN_MS
+        found = {}
+        while True:
+            batch = exchange.fetch_orders(self.symbol, since=since, limit=LOOKUP_LIMIT)
+            for order in batch:
+                cid = order.get('clientOrderId')
+                if cid in wanted:
+                    found[cid] = order
+            if len(batch) < LOOKUP_LIMIT or len(found) == len(wanted):
+                return found
+            since = max(o.get('timestamp') or since for o in batch) + 1
+
+    def prune(self, keep_days=7):
+        """
+        Remove intenções resolvidas antigas, mantendo a última de cada nível
+        (preserva a geração e, portanto, a unicidade dos próximos IDs).
+        """
+        cutoff_ms = int((time.time() - keep_days * 86400) * 1000)
+        self.cursor.execute('''
+            DELETE FROM order_intents
+            WHERE symbol=? AND status != 'PENDING' AND created_ms < ?
+              AND id NOT IN (
+                  SELECT MAX(id) FROM order_intents WHERE symbol=? GROUP BY grid_index, side
+              )
+        ''', (self.symbol, cutoff_ms, self.symbol))
+        return self.cursor.rowcount
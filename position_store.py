@@ -0,0 +1,226 @@
+import sqlite3
+from datetime import datetime
+
+
+# ==========================================
+# ESTADO DAS POSIÇÕES DO TREND BOT (MEMÓRIA + DIÁRIO)
+# ==========================================
+# Uma conexão SQLite aberta durante toda a execução. As posições (uma por par)
+# ficam num dict em memória: leituras no loop não tocam o disco. Cada alteração
+# marca o par como pendente e flush() grava tudo numa transação:
+# - abertura / fechamento de posição -> flush imediato (quantidade e preço reais)
+# - ajuste do stop móvel             -> acumulado e gravado no fim da iteração
+# Um crash entre ajustes perde no máximo o último stop (recalculado no próximo preço).
+# Também guarda o saldo da exchange simulada, que sobrevive a reinícios.
+
+LEGACY_TABLE = "position_state"
+POSITION_FIELDS = ("entry_price", "quantity", "stop_loss", "highest_price", "entry_time")
+
+
+def ensure_position_tables(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS positions (
+            symbol TEXT PRIMARY KEY,
+            entry_price REAL,
+            quantity REAL,
+            stop_loss REAL,
+            highest_price REAL,
+            entry_time TEXT,
+            updated_at TEXT
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS closed_positions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            symbol TEXT,
+            entry_price REAL,
+            exit_price REAL,
+            quantity REAL,
+            entry_time TEXT,
+            exit_time TEXT,
+            reason TEXT,
+            profit_pct REAL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sim_ledger (
+            asset TEXT PRIMARY KEY,
+            free REAL,
+            used REAL,
+            updated_at TEXT
+        )
+    ''')
+
+
+class PositionStore:
+    """
+    Posições abertas {symbol: {...}} em memória; o disco só é escrito no flush().
+    """
+
+    def __init__(self, path, logger, default_symbol, commit_histogram=None):
+        self.logger = logger
+        self.commit_histogram = commit_histogram
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        # WAL: o relatório lê em paralelo (somente leitura) sem bloquear o bot
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # Durável no checkpoint; uma queda de energia perde no máximo o último commit
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        cursor = self.conn.cursor()
+        ensure_position_tables(cursor)
+        self._migrate_legacy(cursor, default_symbol)
+        self.conn.commit()
+
+        cursor.execute(f"SELECT symbol, {', '.join(POSITION_FIELDS)} FROM positions")
+        self.positions = {r[0]: dict(zip(POSITION_FIELDS, r[1:])) for r in cursor.fetchall()}
+        cursor.execute("SELECT asset, free, used FROM sim_ledger")
+        self.sim_balances = {r[0]: (float(r[1]), float(r[2])) for r in cursor.fetchall()}
+
+        # Diário: pares alterados/removidos, trades fechados e saldo simulado pendentes
+        self._dirty = set()
+        self._removed = set()
+        self._closed = []
+        self._sim_pending = None
+
+    def _migrate_legacy(self, cursor, default_symbol):
+        """
+        Linha única id=1 de versões anteriores -> uma linha em positions (a tabela antiga é removida).
+        """
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (LEGACY_TABLE,))
+        if cursor.fetchone() is None:
+            return
+        cursor.execute(f"PRAGMA table_info({LEGACY_TABLE})")
+        has_symbol = 'symbol' in [row[1] for row in cursor.fetchall()]
+        cursor.execute(f'''
+            SELECT in_position, entry_price, quantity, stop_loss, highest_price, entry_time,
+                   {'symbol' if has_symbol else "''"}
+            FROM {LEGACY_TABLE} WHERE id=1
+        ''')
+        row = cursor.fetchone()
+        if row and row[0]:
+            symbol = row[6] or default_symbol
+            cursor.execute('''
+                INSERT OR REPLACE INTO positions
+                (symbol, entry_price, quantity, stop_loss, highest_price, entry_time, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (symbol, *row[1:6], datetime.now().isoformat()))
+            self.logger.info(f"Posição aberta em {symbol} migrada de {LEGACY_TABLE} para positions.")
+        cursor.execute(f"DROP TABLE {LEGACY_TABLE}")
+
+    # --------------------------------------
+    # LEITURA (MEMÓRIA)
+    # --------------------------------------
+    def get(self, symbol):
+        return self.positions.get(symbol)
+
+    def symbols(self):
+        return list(self.positions)
+
+    def exposure_usd(self, prices):
+        """
+        Valor das posições abertas; prices: {symbol: último preço} (sem preço, vale o de entrada).
+        """
+        return sum(p['quantity'] * prices.get(s, p['entry_price']) for s, p in self.positions.items())
+
+    # --------------------------------------
+    # ALTERAÇÕES (DIÁRIO)
+    # --------------------------------------
+    def open_position(self, symbol, entry_price, quantity, stop_loss, entry_time):
+        self.positions[symbol] = {
+            'entry_price': float(entry_price),
+            'quantity': float(quantity),
+            'stop_loss': float(stop_loss),
+            'highest_price': float(entry_price),
+            'entry_time': entry_time,
+        }
+        self._dirty.add(symbol)
+        self._removed.discard(symbol)
+        self.flush()
+
+    def update_position(self, symbol, **fields):
+        """
+        Ajuste em memória (stop móvel); vai para o disco no próximo flush().
+        """
+        self.positions[symbol].update(fields)
+        self._dirty.add(symbol)
+
+    def close_position(self, symbol, exit_price, reason):
+        """
+        Remove a posição e registra o trade fechado. Retorna a posição removida.
+        """
+        position = self.positions.pop(symbol)
+        entry = position['entry_price']
+        profit = (exit_price - entry) / entry * 100 if entry else 0.0
+        self._closed.append((
+            symbol, entry, float(exit_price), position['quantity'], position['entry_time'],
+            datetime.now().strftime("%Y-%m-%d %H:%M:%S"), reason, profit,
+        ))
+        self._dirty.discard(symbol)
+        self._removed.add(symbol)
+        self.flush()
+        return dict(position, profit_pct=profit)
+
+    def save_sim_balances(self, free, used):
+        """
+        Saldo da exchange simulada (gravado junto com o próximo flush).
+        """
+        assets = set(free) | set(used)
+        self.sim_balances = {a: (float(free.get(a, 0.0)), float(used.get(a, 0.0))) for a in assets}
+        self._sim_pending = dict(self.sim_balances)
+
+    # --------------------------------------
+    # FLUSH (UMA TRANSAÇÃO)
+    # --------------------------------------
+    @property
+    def pending(self):
+        return bool(self._dirty or self._removed or self._closed or self._sim_pending is not None)
+
+    def flush(self):
+        if not self.pending:
+            return
+        now = datetime.now().isoformat()
+        upserts = [
+            (s, *(self.positions[s][f] for f in POSITION_FIELDS), now) for s in self._dirty
+        ]
+        try:
+            if self.commit_histogram is not None:
+                with self.commit_histogram.time():
+                    self._write(upserts, now)
+            else:
+                self._write(upserts, now)
+        except sqlite3.Error as e:
+            # Memória continua valendo; o diário fica pendente e o próximo flush tenta de novo
+            self.conn.rollback()
+            self.logger.error(f"Erro ao gravar estado das posições: {e}")
+            return
+        self._dirty.clear()
+        self._removed.clear()
+        self._closed.clear()
+        self._sim_pending = None
+
+    def _write(self, upserts, now):
+        cursor = self.conn.cursor()
+        if upserts:
+            cursor.executemany('''
+                INSERT OR REPLACE INTO positions
+                (symbol, entry_price, quantity, stop_loss, highest_price, entry_time, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', upserts)
+        if self._removed:
+            cursor.executemany("DELETE FROM positions WHERE symbol=?", [(s,) for s in self._removed])
+        if self._closed:
+            cursor.executemany('''
+                INSERT INTO closed_positions
+                (symbol, entry_price, exit_price, quantity, entry_time, exit_time, reason, profit_pct)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', self._closed)
+        if self._sim_pending is not None:
+            cursor.execute("DELETE FROM sim_ledger")
+            cursor.executemany(
+                "INSERT INTO sim_ledger (asset, free, used, updated_at) VALUES (?, ?, ?, ?)",
+                [(a, free, used, now) for a, (free, used) in self._sim_pending.items()]
+            )
+        self.conn.commit()
+
+    def close(self):
+        self.flush()
+        self.conn.close()
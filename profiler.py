@@ -0,0 +1,247 @@
+import functools
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+
+# ==========================================
+# PROFILER POR AMOSTRAGEM
+# ==========================================
+
+class SamplingProfiler:
+    """
+    Amostra periodicamente a pilha de uma thread (sys._current_frames) em uma
+    thread separada. Custo proporcional à taxa de amostragem, não ao código medido.
+    Gera:
+    - <base>.collapsed : formato "a;b;c N" (flamegraph.pl / speedscope / inferno)
+    - <base>.txt       : resumo por função (amostras próprias e inclusivas)
+    """
+
+    def __init__(self, thread_id, interval=0.01):
+        self.thread_id = thread_id
+        self.interval = float(interval)
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def _frame_name(frame):
+        code = frame.f_code
+        return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+    def _sample(self):
+        frame = sys._current_frames().get(self.thread_id)
+        if frame is None:
+            return
+        stack = []
+        while frame is not None:
+            stack.append(self._frame_name(frame))
+            frame = frame.f_back
+        stack.reverse()
+        self.stacks[tuple(stack)] += 1
+        self.samples += 1
+
+    def _run(self, duration):
+        deadline = time.monotonic() + duration
+        while not self._stop.is_set() and time.monotonic() < deadline:
+            self._sample()
+            self._stop.wait(self.interval)
+
+    def start(self, duration):
+        self._thread = threading.Thread(target=self._run, args=(duration,), name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def join(self, timeout=None):
+        if self._thread:
+            self._thread.join(timeout)
+
+    def write(self, base_path):
+        collapsed_path = base_path + ".collapsed"
+        summary_path = base_path + ".txt"
+
+        with open(collapsed_path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(";".join(stack) + f" {count}\n")
+
+        own = Counter()
+        inclusive = Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for name in set(stack):
+                inclusive[name] += count
+
+        total = max(self.samples, 1)
+        with open(summary_path, "w") as f:
+            f.write(f"Amostras: {self.samples} (intervalo {self.interval * 1000:.1f} ms)\n\n")
+            f.write(f"{'própria%':>9} {'inclusiva%':>11}  função\n")
+            for name, count in inclusive.most_common():
+                f.write(f"{own[name] / total * 100:9.2f} {count / total * 100:11.2f}  {name}\n")
+
+        return collapsed_path, summary_path
+
+
+class ProfilerControl:
+    """
+    Liga o SamplingProfiler por N segundos na thread do loop, disparado por
+    SIGUSR1 ou pela existência de um arquivo de controle (conteúdo opcional = segundos).
+    poll() deve ser chamado uma vez por iteração do loop.
+    """
+
+    def __init__(self, logger, trigger_file="profile.trigger", output_dir="profiles",
+                 default_seconds=30, interval_ms=10, name="bot"):
+        self.logger = logger
+        self.trigger_file = trigger_file
+        self.output_dir = output_dir
+        self.default_seconds = float(default_seconds)
+        self.interval = float(interval_ms) / 1000.0
+        self.name = name
+        self.thread_id = threading.get_ident()
+        self._requested = None
+        self._profiler = None
+
+        if hasattr(signal, "SIGUSR1"):
+            try:
+                signal.signal(signal.SIGUSR1, self._on_signal)
+            except ValueError:
+                # signal só pode ser registrado na thread principal
+                pass
+
+    def _on_signal(self, _signum, _frame):
+        self._requested = self.default_seconds
+
+    def _check_trigger_file(self):
+        if not self.trigger_file or not os.path.exists(self.trigger_file):
+            return
+        try:
+            with open(self.trigger_file) as f:
+                content = f.read().strip()
+            os.remove(self.trigger_file)
+            self._requested = float(content) if content else self.default_seconds
+        except (OSError, ValueError) as e:
+            self.logger.error(f"Arquivo de controle do profiler inválido: {e}")
+
+    def poll(self):
+        if self._profiler is not None and not self._profiler.running:
+            self._finish()
+
+        self._check_trigger_file()
+        if self._requested and self._profiler is None:
+            seconds, self._requested = self._requested, None
+            # Perfila a thread que roda o loop (a que chama poll)
+            self.thread_id = threading.get_ident()
+            self._profiler = SamplingProfiler(self.thread_id, self.interval).start(seconds)
+            self.logger.info(f"Profiler ligado por {seconds:.0f}s")
+
+    def _finish(self):
+        profiler, self._profiler = self._profiler, None
+        os.makedirs(self.output_dir, exist_ok=True)
+        base = os.path.join(self.output_dir, f"{self.name}_{time.strftime('%Y%m%d_%H%M%S')}")
+        collapsed, summary = profiler.write(base)
+        self.logger.info(f"Profiler concluído ({profiler.samples} amostras): {collapsed} | {summary}")
+
+
+# ==========================================
+# TIMERS POR FASE DO LOOP
+# ==========================================
+
+class PhaseTimer:
+    """
+    Acumula tempo exclusivo por fase dentro de uma iteração do loop.
+    Fases aninhadas pausam a fase externa (ex.: order_placement dentro de fill_handling).
+    """
+
+    def __init__(self, logger, metrics=None, slow_seconds=5.0):
+        self.logger = logger
+        self.slow_seconds = float(slow_seconds)
+        self._totals = defaultdict(float)
+        self._stack = []
+        self._iteration_start = time.perf_counter()
+        self._histogram = None
+        if metrics is not None:
+            self._histogram = metrics.histogram(
+                "phase_seconds", "Tempo exclusivo por fase em cada iteração", ("phase",)
+            )
+
+    def begin_iteration(self):
+        self._stack.clear()
+        self._totals.clear()
+        self._iteration_start = time.perf_counter()
+
+    def start(self, name):
+        now = time.perf_counter()
+        if self._stack:
+            parent, started = self._stack[-1]
+            self._totals[parent] += now - started
+        self._stack.append((name, now))
+
+    def stop(self, name=None):
+        if not self._stack:
+            return
+        now = time.perf_counter()
+        current, started = self._stack.pop()
+        self._totals[current] += now - started
+        if self._stack:
+            parent, _ = self._stack[-1]
+            self._stack[-1] = (parent, now)
+
+    @contextmanager
+    def phase(self, name):
+        self.start(name)
+        try:
+            yield
+        finally:
+            self.stop(name)
+
+    def end_iteration(self):
+        """
+        Fecha a iteração: publica as fases no histograma e loga o detalhamento se foi lenta.
+        """
+        while self._stack:
+            self.stop()
+
+        now = time.perf_counter()
+        elapsed = now - self._iteration_start
+        totals = dict(self._totals)
+
+        if self._histogram is not None:
+            for name, seconds in totals.items():
+                self._histogram.observe(seconds, phase=name)
+
+        if elapsed >= self.slow_seconds:
+            other = max(0.0, elapsed - sum(totals.values()))
+            parts = " | ".join(
+                f"{name}={seconds * 1000:.0f}ms" for name, seconds in sorted(totals.items(), key=lambda kv: -kv[1])
+            )
+            self.logger.warning(f"Iteração lenta: {elapsed * 1000:.0f}ms -> {parts} | outros={other * 1000:.0f}ms")
+
+        self._totals.clear()
+        return totals, elapsed
+
+
+def phase_timed(name):
+    """
+    Decorator para métodos de bots que têm self.phases (PhaseTimer).
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            phases = getattr(self, "phases", None)
+            if phases is None:
+                return fn(self, *args, **kwargs)
+            with phases.phase(name):
+                return fn(self, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,244 @@
+import sqlite3
+from datetime import datetime, timedelta
+
+
+# ==========================================
+# ROLLUPS DE LUCRO (HORA / DIA / TOTAL)
+# ==========================================
+# Cada inserção em real_profits / profits atualiza, na MESMA transação,
+# uma linha por período. Relatórios leem poucas linhas pré-agregadas
+# em vez de varrer as tabelas de histórico.
+
+PERIODS = {
+    'hour': 'profit_rollup_hourly',
+    'day': 'profit_rollup_daily',
+    'total': 'profit_rollup_total',
+}
+
+
+def ensure_rollup_tables(cursor):
+    for table in PERIODS.values():
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                bucket TEXT,
+                symbol TEXT,
+                trades INTEGER DEFAULT 0,
+                gross_sum REAL DEFAULT 0.0,
+                net_sum REAL DEFAULT 0.0,
+                fee_sum REAL DEFAULT 0.0,
+                gross_min REAL,
+                gross_max REAL,
+                net_min REAL,
+                net_max REAL,
+                est_trades INTEGER DEFAULT 0,
+                est_profit_sum REAL DEFAULT 0.0,
+                PRIMARY KEY (bucket, symbol)
+            )
+        ''')
+
+
+def _buckets(ts: datetime):
+    return {
+        'hour': ts.strftime("%Y-%m-%dT%H"),
+        'day': ts.strftime("%Y-%m-%d"),
+        'total': 'all',
+    }
+
+
+def record_real_profit(cursor, symbol, ts: datetime, gross, net, fees):
+    """
+    Soma um ciclo de real_profits nos rollups. Não faz commit.
+    """
+    for period, bucket in _buckets(ts).items():
+        cursor.execute(f'''
+            INSERT INTO {PERIODS[period]}
+                (bucket, symbol, trades, gross_sum, net_sum, fee_sum,
+                 gross_min, gross_max, net_min, net_max, est_trades, est_profit_sum)
+            VALUES (?, ?, 1, ?, ?, ?, ?, ?, ?, ?, 0, 0.0)
+            ON CONFLICT(bucket, symbol) DO UPDATE SET
+                trades = trades + 1,
+                gross_sum = gross_sum + excluded.gross_sum,
+                net_sum = net_sum + excluded.net_sum,
+                fee_sum = fee_sum + excluded.fee_sum,
+                gross_min = MIN(COALESCE(gross_min, excluded.gross_min), excluded.gross_min),
+                gross_max = MAX(COALESCE(gross_max, excluded.gross_max), excluded.gross_max),
+                net_min = MIN(COALESCE(net_min, excluded.net_min), excluded.net_min),
+                net_max = MAX(COALESCE(net_max, excluded.net_max), excluded.net_max)
+        ''', (bucket, symbol, gross, net, fees, gross, gross, net, net))
+
+
+def record_estimated_profit(cursor, symbol, ts: datetime, profit):
+    """
+    Soma um registro da tabela profits (lucro bruto estimado) nos rollups. Não faz commit.
+    """
+    for period, bucket in _buckets(ts).items():
+        cursor.execute(f'''
+            INSERT INTO {PERIODS[period]} (bucket, symbol, est_trades, est_profit_sum)
+            VALUES (?, ?, 1, ?)
+            ON CONFLICT(bucket, symbol) DO UPDATE SET
+                est_trades = est_trades + 1,
+                est_profit_sum = est_profit_sum + excluded.est_profit_sum
+        ''', (bucket, symbol, profit))
+
+
+# --------------------------------------
+# BACKFILL (UMA VEZ)
+# --------------------------------------
+def _has_table(cursor, name):
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (name,))
+    return cursor.fetchone() is not None
+
+
+def backfill(conn: sqlite3.Connection, symbol):
+    """
+    Recalcula todos os rollups a partir de real_profits e profits.
+    Aceita timestamps com separador 'T' (isoformat) ou espaço (adapter do sqlite3).
+    """
+    cursor = conn.cursor()
+    ensure_rollup_tables(cursor)
+
+    bucket_expr = {
+        'hour': "substr(replace(timestamp, ' ', 'T'), 1, 13)",
+        'day': "substr(timestamp, 1, 10)",
+        'total': "'all'",
+    }
+
+    for period, table in PERIODS.items():
+        cursor.execute(f"DELETE FROM {table} WHERE symbol=?", (symbol,))
+        expr = bucket_expr[period]
+
+        if _has_table(cursor, 'real_profits'):
+            cursor.execute(f'''
+                INSERT INTO {table}
+                    (bucket, symbol, trades, gross_sum, net_sum, fee_sum,
+                     gross_min, gross_max, net_min, net_max, est_trades, est_profit_sum)
+                SELECT {expr}, ?, COUNT(*),
+                       COALESCE(SUM(gross_profit), 0.0), COALESCE(SUM(net_profit), 0.0),
+                       COALESCE(SUM(COALESCE(buy_fee, 0.0) + COALESCE(sell_fee, 0.0)), 0.0),
+                       MIN(gross_profit), MAX(gross_profit), MIN(net_profit), MAX(net_profit),
+                       0, 0.0
+                FROM real_profits
+                WHERE timestamp IS NOT NULL
+                GROUP BY 1
+            ''', (symbol,))
+
+        if _has_table(cursor, 'profits'):
+            cursor.execute(f'''
+                INSERT INTO {table} (bucket, symbol, est_trades, est_profit_sum)
+                SELECT {expr}, ?, COUNT(*), COALESCE(SUM(profit_usdt), 0.0)
+                FROM profits
+                WHERE timestamp IS NOT NULL
+                GROUP BY 1
+                ON CONFLICT(bucket, symbol) DO UPDATE SET
+                    est_trades = excluded.est_trades,
+                    est_profit_sum = excluded.est_profit_sum
+            ''', (symbol,))
+
+    conn.commit()
+
+
+def backfill_if_empty(conn: sqlite3.Connection, symbol):
+    """
+    Executa o backfill apenas se os rollups ainda não existem mas há histórico.
+    Retorna True se o backfill rodou.
+    """
+    cursor = conn.cursor()
+    ensure_rollup_tables(cursor)
+    cursor.execute(f"SELECT 1 FROM {PERIODS['total']} LIMIT 1")
+    if cursor.fetchone():
+        return False
+
+    has_history = False
+    for source in ('real_profits', 'profits'):
+        if _has_table(cursor, source):
+            cursor.execute(f"SELECT 1 FROM {source} LIMIT 1")
+            has_history = has_history or cursor.fetchone() is not None
+    if not has_history:
+        conn.commit()
+        return False
+
+    backfill(conn, symbol)
+    return True
+
+
+# --------------------------------------
+# LEITURA
+# --------------------------------------
+_AGG_SQL = '''
+    SELECT COALESCE(SUM(trades), 0), COALESCE(SUM(gross_sum), 0.0), COALESCE(SUM(net_sum), 0.0),
+           COALESCE(SUM(fee_sum), 0.0), MIN(gross_min), MAX(gross_max), MIN(net_min), MAX(net_max),
+           COALESCE(SUM(est_trades), 0), COALESCE(SUM(est_profit_sum), 0.0)
+    FROM {table}
+    WHERE {where}
+'''
+
+
+def _combine(rows):
+    out = {
+        'trades': 0, 'gross': 0.0, 'net': 0.0, 'fees': 0.0,
+        'gross_min': None, 'gross_max': None, 'net_min': None, 'net_max': None,
+        'est_trades': 0, 'est_profit': 0.0,
+    }
+    for r in rows:
+        out['trades'] += int(r[0] or 0)
+        out['gross'] += float(r[1] or 0.0)
+        out['net'] += float(r[2] or 0.0)
+        out['fees'] += float(r[3] or 0.0)
+        for key, value, pick in (('gross_min', r[4], min), ('gross_max', r[5], max),
+                                 ('net_min', r[6], min), ('net_max', r[7], max)):
+            if value is not None:
+                out[key] = value if out[key] is None else pick(out[key], value)
+        out['est_trades'] += int(r[8] or 0)
+        out['est_profit'] += float(r[9] or 0.0)
+    return out
+
+
+def read_totals(conn: sqlite3.Connection, symbol=None):
+    cursor = conn.cursor()
+    where, params = ("bucket='all'", ())
+    if symbol:
+        where, params = ("bucket='all' AND symbol=?", (symbol,))
+    cursor.execute(_AGG_SQL.format(table=PERIODS['total'], where=where), params)
+    return _combine([cursor.fetchone()])
+
+
+def read_window(conn: sqlite3.Connection, since: datetime, until: datetime = None, symbol=None):
+    """
+    Agrega uma janela arbitrária (granularidade de 1 hora):
+    dias completos vêm da tabela diária e as bordas da tabela horária.
+    """
+    until = until or datetime.now()
+    cursor = conn.cursor()
+    sym_sql, sym_params = ("", ())
+    if symbol:
+        sym_sql, sym_params = (" AND symbol=?", (symbol,))
+
+    first_full_day = (since + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    if since == since.replace(hour=0, minute=0, second=0, microsecond=0):
+        first_full_day = since
+    last_full_day = until.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    rows = []
+    hour = lambda ts: ts.strftime("%Y-%m-%dT%H")
+
+    if first_full_day < last_full_day:
+        cursor.execute(
+            _AGG_SQL.format(table=PERIODS['day'], where="bucket >= ? AND bucket < ?" + sym_sql),
+            (first_full_day.strftime("%Y-%m-%d"), last_full_day.strftime("%Y-%m-%d")) + sym_params
+        )
+        rows.append(cursor.fetchone())
+        # Borda inicial não inclui a hora 00 do primeiro dia completo (já está na tabela diária)
+        edges = [(since, first_full_day, "<"), (last_full_day, until, "<=")]
+    else:
+        edges = [(since, until, "<=")]
+
+    for start, end, op in edges:
+        if start >= end:
+            continue
+        cursor.execute(
+            _AGG_SQL.format(table=PERIODS['hour'], where=f"bucket >= ? AND bucket {op} ?" + sym_sql),
+            (hour(start), hour(end)) + sym_params
+        )
+        rows.append(cursor.fetchone())
+
+    return _combine(rows)
@@ -1,10 +1,15 @@
+import glob
 import os
 import sqlite3
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
-import requests
 from dotenv import load_dotenv
 
+import profit_rollups
+from http_transport import session_options, shared_session
+from equity_tracker import read_drawdown
+
 # ======================================================
 # CONFIG / ENV
 # ======================================================
@@ -14,6 +19,27 @@ load_dotenv(dotenv_path=".env", override=True)
 TG_TOKEN = os.getenv("TELEGRAM_TOKEN")
 TG_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
 DB_NAME = "grid_data.db"
+SYMBOL = os.getenv("SYMBOL", "BTC/USDT")
+
+# Bancos de todos os bots do host (descobertos por glob)
+REPORT_DB_DIR = os.getenv("REPORT_DB_DIR", ".")
+REPORT_DB_GLOBS = os.getenv("REPORT_DB_GLOBS", "grid_data*.db,trend_data*.db").split(",")
+
+# Bots conhecidos: nome amigável, símbolo e limite de exposição (para utilização de capital)
+KNOWN_BOTS = {
+    "grid_data.db": {
+        "name": "GRID BTC", "kind": "grid",
+        "symbol": SYMBOL, "cap": float(os.getenv("MAX_BTC_USD", 12)),
+    },
+    "grid_data_ada.db": {
+        "name": "GRID ADA", "kind": "grid",
+        "symbol": os.getenv("ADA_SYMBOL", "ADA/USDT"), "cap": float(os.getenv("ADA_MAX_USD", 9)),
+    },
+    "trend_data.db": {
+        "name": "TREND", "kind": "trend",
+        "symbol": os.getenv("SYMBOL_TREND", "BTC/USDT"), "cap": None,
+    },
+}
 
 
 # ======================================================
@@ -27,7 +53,7 @@ def telegram_send(msg: str):
 
     url = f"https://api.telegram.org/bot{TG_TOKEN}/sendMessage"
     try:
-        requests.post(
+        shared_session("telegram", **session_options(os.environ)).post(
             url,
             json={
                 "chat_id": TG_CHAT_ID,
@@ -45,8 +71,46 @@ def telegram_send(msg: str):
 # DB HELPERS
 # ======================================================
 
-def open_conn():
-    return sqlite3.connect(DB_NAME, timeout=15, check_same_thread=False)
+def open_conn(path=DB_NAME):
+    return sqlite3.connect(path, timeout=15, check_same_thread=False)
+
+
+def open_conn_ro(path):
+    """
+    Conexão somente leitura: não bloqueia o bot (WAL) e nunca escreve no banco dele.
+    """
+    uri = f"file:{os.path.abspath(path)}?mode=ro"
+    return sqlite3.connect(uri, uri=True, timeout=15, check_same_thread=False)
+
+
+def discover_bot_dbs():
+    """
+    Lista os bancos de bots encontrados em REPORT_DB_DIR.
+    """
+    paths = set()
+    for pattern in REPORT_DB_GLOBS:
+        paths.update(glob.glob(os.path.join(REPORT_DB_DIR, pattern.strip())))
+
+    bots = []
+    for path in sorted(paths):
+        filename = os.path.basename(path)
+        # Bancos de histórico (grid_archive) não são bots
+        if filename.endswith("_archive.db"):
+            continue
+        info = dict(KNOWN_BOTS.get(filename) or {
+            "name": os.path.splitext(filename)[0].upper(),
+            "kind": "trend" if filename.startswith("trend") else "grid",
+            "symbol": None, "cap": None,
+        })
+        info["path"] = path
+        bots.append(info)
+    return bots
+
+
+def _has_table(conn, name):
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (name,))
+    return cursor.fetchone() is not None
 
 
 def ensure_real_profits_table(conn: sqlite3.Connection):
@@ -74,150 +138,266 @@ def ensure_real_profits_table(conn: sqlite3.Connection):
     conn.commit()
 
 
+def ensure_rollups(conn: sqlite3.Connection, symbol=SYMBOL):
+    """
+    Garante as tabelas de rollup; na primeira execução reconstrói a partir do histórico.
+    """
+    profit_rollups.backfill_if_empty(conn, symbol)
+
+
+def prepare_grid_db(bot):
+    """
+    Bancos de versões antigas ainda sem rollups: cria e faz o backfill uma única vez
+    (única escrita feita pelo relatório).
+    """
+    conn = open_conn_ro(bot["path"])
+    try:
+        ready = _has_table(conn, profit_rollups.PERIODS["total"])
+    finally:
+        conn.close()
+
+    if not ready:
+        conn = open_conn(bot["path"])
+        try:
+            ensure_real_profits_table(conn)
+            ensure_rollups(conn, bot["symbol"] or SYMBOL)
+        finally:
+            conn.close()
+
+
 # ======================================================
 # CÁLCULOS DE LUCRO
 # ======================================================
 
 def get_gross_stats(conn: sqlite3.Connection, since: datetime):
     """
-    Usa a tabela 'profits' para lucro bruto.
+    Lucro bruto estimado (tabela 'profits'), lido dos rollups pré-agregados.
     """
-    cursor = conn.cursor()
-
-    # Total bruto histórico
-    cursor.execute("""
-        SELECT 
-            COALESCE(SUM(profit_usdt), 0.0) AS total_profit,
-            COUNT(*) AS total_trades
-        FROM profits
-    """)
-    total_profit, total_trades = cursor.fetchone()
-
-    # Bruto últimas 24h
-    cursor.execute("""
-        SELECT 
-            COALESCE(SUM(profit_usdt), 0.0) AS profit_24h,
-            COUNT(*) AS trades_24h
-        FROM profits
-        WHERE timestamp >= ?
-    """, (since.strftime("%Y-%m-%d %H:%M:%S"),))
-    profit_24h, trades_24h = cursor.fetchone()
+    totals = profit_rollups.read_totals(conn)
+    window = profit_rollups.read_window(conn, since)
 
     return {
-        "total_profit": float(total_profit or 0.0),
-        "total_trades": int(total_trades or 0),
-        "profit_24h": float(profit_24h or 0.0),
-        "trades_24h": int(trades_24h or 0),
+        "total_profit": totals["est_profit"],
+        "total_trades": totals["est_trades"],
+        "profit_24h": window["est_profit"],
+        "trades_24h": window["est_trades"],
     }
 
 
 def get_net_stats(conn: sqlite3.Connection, since: datetime):
     """
-    Usa a tabela 'real_profits' para lucro líquido REAL (com taxas).
+    Lucro líquido REAL (tabela 'real_profits'), lido dos rollups pré-agregados.
     Se ainda não tiver dados, tudo vem 0.
     """
-    cursor = conn.cursor()
-
-    # Total histórico
-    cursor.execute("""
-        SELECT 
-            COALESCE(SUM(gross_profit), 0.0) AS total_gross,
-            COALESCE(SUM(net_profit),   0.0) AS total_net,
-            COUNT(*) AS total_trades
-        FROM real_profits
-    """)
-    total_gross, total_net, total_trades = cursor.fetchone()
-
-    # Últimas 24h
-    cursor.execute("""
-        SELECT 
-            COALESCE(SUM(gross_profit), 0.0) AS gross_24h,
-            COALESCE(SUM(net_profit),   0.0) AS net_24h,
-            COUNT(*) AS trades_24h
-        FROM real_profits
-        WHERE timestamp >= ?
-    """, (since.strftime("%Y-%m-%d %H:%M:%S"),))
-    gross_24h, net_24h, trades_24h = cursor.fetchone()
-
-    # Melhor / pior trade (por net_profit)
-    cursor.execute("""
-        SELECT 
-            COALESCE(MAX(net_profit), 0.0) AS best,
-            COALESCE(MIN(net_profit), 0.0) AS worst
-        FROM real_profits
-    """)
-    best_trade, worst_trade = cursor.fetchone()
+    totals = profit_rollups.read_totals(conn)
+    window = profit_rollups.read_window(conn, since)
 
     # Média por trade (líquido)
     avg_net = 0.0
-    if total_trades and total_trades > 0:
-        avg_net = float(total_net) / int(total_trades)
+    if totals["trades"] > 0:
+        avg_net = totals["net"] / totals["trades"]
 
     return {
-        "total_gross": float(total_gross or 0.0),
-        "total_net": float(total_net or 0.0),
-        "total_trades": int(total_trades or 0),
-        "gross_24h": float(gross_24h or 0.0),
-        "net_24h": float(net_24h or 0.0),
-        "trades_24h": int(trades_24h or 0),
-        "best_trade": float(best_trade or 0.0),
-        "worst_trade": float(worst_trade or 0.0),
-        "avg_net": float(avg_net or 0.0),
+        "total_gross": totals["gross"],
+        "total_net": totals["net"],
+        "total_trades": totals["trades"],
+        "gross_24h": window["gross"],
+        "net_24h": window["net"],
+        "trades_24h": window["trades"],
+        "best_trade": float(totals["net_max"] or 0.0),
+        "worst_trade": float(totals["net_min"] or 0.0),
+        "avg_net": float(avg_net),
     }
 
 
 # ======================================================
-# MONTAR RELATÓRIO
+# PORTFÓLIO (TODOS OS BOTS)
 # ======================================================
 
-def build_report():
-    now = datetime.now()
-    since_24h = now - timedelta(days=1)
+def get_grid_exposure(conn: sqlite3.Connection):
+    """
+    Capital alocado no grid (a preço de custo):
+    - BUYs OPEN (USDT reservado)
+    - BUYs FILLED ainda não vendidas (inventário)
+    """
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT COALESCE(SUM(amount * price), 0.0)
+        FROM active_grids WHERE side='BUY' AND status='OPEN'
+    """)
+    open_buys = float(cursor.fetchone()[0] or 0.0)
+
+    # Lotes parcialmente vendidos: conta só a quantidade restante
+    cursor.execute("PRAGMA table_info(filled_orders)")
+    qty_col = "amount"
+    if "remaining_amount" in [r[1] for r in cursor.fetchall()]:
+        qty_col = "COALESCE(remaining_amount, amount)"
+    cursor.execute(f"""
+        SELECT COALESCE(SUM({qty_col} * price), 0.0)
+        FROM filled_orders WHERE side='BUY' AND used_in_cycle=0
+    """)
+    inventory = float(cursor.fetchone()[0] or 0.0)
+    return open_buys + inventory
+
+
+def get_trend_exposure(conn: sqlite3.Connection):
+    cursor = conn.cursor()
+    # Uma linha por posição aberta (position_state id=1: bancos que o bot ainda não migrou)
+    if _has_table(conn, "positions"):
+        cursor.execute("SELECT COUNT(*), COALESCE(SUM(entry_price * quantity), 0.0) FROM positions")
+        count, exposure = cursor.fetchone()
+        return float(exposure), count > 0
+    cursor.execute("SELECT in_position, entry_price, quantity FROM position_state WHERE id=1")
+    row = cursor.fetchone()
+    if not row or not row[0]:
+        return 0.0, False
+    return float(row[1] or 0.0) * float(row[2] or 0.0), True
+
+
+def collect_bot_stats(bot, since: datetime):
+    """
+    Coleta os números de um bot (roda em paralelo, uma conexão somente leitura por bot).
+    Grid: lê só os rollups + duas somas sobre ordens abertas, custo independe do histórico.
+    """
+    result = dict(bot)
+    result.update({
+        "gross": None, "net": None, "fees_total": 0.0, "fees_24h": 0.0,
+        "exposure": 0.0, "utilization": None, "in_position": None, "equity": None, "error": None,
+    })
 
     try:
-        conn = open_conn()
+        if bot["kind"] == "grid":
+            prepare_grid_db(bot)
+
+        conn = open_conn_ro(bot["path"])
+        try:
+            if bot["kind"] == "grid":
+                result["gross"] = get_gross_stats(conn, since)
+                result["net"] = get_net_stats(conn, since)
+                result["fees_total"] = profit_rollups.read_totals(conn)["fees"]
+                result["fees_24h"] = profit_rollups.read_window(conn, since)["fees"]
+                result["exposure"] = get_grid_exposure(conn)
+                if _has_table(conn, "equity_snapshots"):
+                    result["equity"] = read_drawdown(conn, since)
+            else:
+                result["exposure"], result["in_position"] = get_trend_exposure(conn)
+        finally:
+            conn.close()
     except Exception as e:
-        return f"⚠️ Erro ao conectar no banco `{DB_NAME}`:\n{e}"
+        result["error"] = str(e)
 
-    try:
-        ensure_real_profits_table(conn)
+    if bot.get("cap"):
+        result["utilization"] = result["exposure"] / bot["cap"] * 100
 
-        gross = get_gross_stats(conn, since_24h)
-        net = get_net_stats(conn, since_24h)
+    return result
 
+
+def collect_portfolio(since: datetime):
+    """
+    Consulta todos os bancos em paralelo (threads: sqlite3 libera o GIL durante as queries).
+    """
+    bots = discover_bot_dbs()
+    if not bots:
+        return []
+    with ThreadPoolExecutor(max_workers=len(bots)) as pool:
+        return list(pool.map(lambda bot: collect_bot_stats(bot, since), bots))
+
+
+# ======================================================
+# MONTAR RELATÓRIO
+# ======================================================
+
+def _bot_section(stats):
+    lines = [f"🤖 *{stats['name']}*" + (f" ({stats['symbol']})" if stats.get("symbol") else "")]
+
+    if stats["error"]:
+        lines.append(f"⚠️ Erro ao consultar `{os.path.basename(stats['path'])}`: {stats['error']}")
+        return lines
+
+    if stats["kind"] == "grid":
+        gross, net = stats["gross"], stats["net"]
+        lines.append(f"• Bruto estimado: `{gross['total_profit']:.4f}` USDT em `{gross['total_trades']}` trades "
+                     f"(24h: `{gross['profit_24h']:.4f}` em `{gross['trades_24h']}`)")
+        lines.append(f"• Líquido real: `{net['total_net']:.4f}` USDT em `{net['total_trades']}` trades "
+                     f"(24h: `{net['net_24h']:.4f}` em `{net['trades_24h']}`)")
+        lines.append(f"• Bruto real (com taxas): `{net['total_gross']:.4f}` USDT (24h: `{net['gross_24h']:.4f}`)")
+        lines.append(f"• Taxas: `{stats['fees_total']:.4f}` USDT (24h: `{stats['fees_24h']:.4f}`)")
+        lines.append(f"• Lucro médio por trade (líquido): `{net['avg_net']:.4f}` USDT")
+        lines.append(f"• Melhor / pior trade (líquido): `{net['best_trade']:.4f}` / `{net['worst_trade']:.4f}` USDT")
+        if stats["equity"]:
+            eq = stats["equity"]
+            lines.append(f"• PnL não realizado: `{eq['unrealized']:.4f}` USDT "
+                         f"(inventário `{eq['qty']:.6f}` a `{eq['avg_cost']:.2f}`)")
+            lines.append(f"• Drawdown 24h: `{eq['drawdown_window']:.4f}` USDT | máximo: `{eq['max_drawdown']:.4f}` USDT")
+    else:
+        status = "EM POSIÇÃO" if stats["in_position"] else "fora de posição"
+        lines.append(f"• Status: {status}")
+        lines.append("• _Sem histórico de trades no banco (PnL não disponível)_")
+
+    exposure = f"• Exposição: `{stats['exposure']:.2f}` USDT"
+    if stats["utilization"] is not None:
+        exposure += f" de `{stats['cap']:.2f}` (`{stats['utilization']:.1f}%` do limite)"
+    lines.append(exposure)
+    return lines
+
+
+def build_report():
+    now = datetime.now()
+    since_24h = now - timedelta(days=1)
+
+    try:
+        portfolio = collect_portfolio(since_24h)
     except Exception as e:
-        conn.close()
         return f"⚠️ Erro ao consultar dados de lucro:\n{e}"
 
-    conn.close()
+    if not portfolio:
+        return f"⚠️ Nenhum banco de bot encontrado em `{REPORT_DB_DIR}`"
 
     date_str = now.strftime("%d/%m/%Y %H:%M")
 
     msg_lines = []
 
-    msg_lines.append(f"📊 *Relatório Diário do Grid*")
+    msg_lines.append(f"📊 *Relatório Diário do Portfólio*")
     msg_lines.append(f"🕒 _Gerado em {date_str}_")
     msg_lines.append("")
 
-    # ---------------- BRUTO ----------------
-    msg_lines.append("🔹 *Lucro BRUTO (sem taxas)*")
-    msg_lines.append(f"• Total histórico: `{gross['total_profit']:.4f}` USDT em `{gross['total_trades']}` trades")
-    msg_lines.append(f"• Últimas 24h: `{gross['profit_24h']:.4f}` USDT em `{gross['trades_24h']}` trades")
-    msg_lines.append("")
-
-    # ---------------- LÍQUIDO ----------------
-    msg_lines.append("🟢 *Lucro LÍQUIDO REAL (com taxas)*")
-    msg_lines.append(f"• Total bruto com taxas: `{net['total_gross']:.4f}` USDT")
-    msg_lines.append(f"• Total líquido: `{net['total_net']:.4f}` USDT em `{net['total_trades']}` trades")
-    msg_lines.append(f"• Últimas 24h (bruto): `{net['gross_24h']:.4f}` USDT")
-    msg_lines.append(f"• Últimas 24h (líquido): `{net['net_24h']:.4f}` USDT em `{net['trades_24h']}` trades")
-    msg_lines.append(f"• Lucro médio por trade (líquido): `{net['avg_net']:.4f}` USDT")
-    msg_lines.append(f"• Melhor trade (líquido): `{net['best_trade']:.4f}` USDT")
-    msg_lines.append(f"• Pior trade (líquido): `{net['worst_trade']:.4f}` USDT")
+    # ---------------- POR BOT ----------------
+    for stats in portfolio:
+        msg_lines.extend(_bot_section(stats))
+        msg_lines.append("")
+
+    # ---------------- TOTAL ----------------
+    ok = [s for s in portfolio if not s["error"]]
+    grids = [s for s in ok if s["kind"] == "grid"]
+
+    total_net = sum(s["net"]["total_net"] for s in grids)
+    total_gross = sum(s["net"]["total_gross"] for s in grids)
+    total_trades = sum(s["net"]["total_trades"] for s in grids)
+    net_24h = sum(s["net"]["net_24h"] for s in grids)
+    trades_24h = sum(s["net"]["trades_24h"] for s in grids)
+    est_profit = sum(s["gross"]["total_profit"] for s in grids)
+    fees_total = sum(s["fees_total"] for s in grids)
+    fees_24h = sum(s["fees_24h"] for s in grids)
+    exposure = sum(s["exposure"] for s in ok)
+    unrealized = sum(s["equity"]["unrealized"] for s in grids if s["equity"])
+    capped = [s for s in ok if s["utilization"] is not None]
+    cap_total = sum(s["cap"] for s in capped)
+
+    msg_lines.append("💼 *TOTAL DO PORTFÓLIO*")
+    msg_lines.append(f"• Bruto estimado: `{est_profit:.4f}` USDT")
+    msg_lines.append(f"• Bruto real (com taxas): `{total_gross:.4f}` USDT")
+    msg_lines.append(f"• Líquido real: `{total_net:.4f}` USDT em `{total_trades}` trades")
+    msg_lines.append(f"• Últimas 24h (líquido): `{net_24h:.4f}` USDT em `{trades_24h}` trades")
+    msg_lines.append(f"• Taxas: `{fees_total:.4f}` USDT (24h: `{fees_24h:.4f}`)")
+    msg_lines.append(f"• PnL não realizado: `{unrealized:.4f}` USDT")
+    msg_lines.append(f"• Exposição total: `{exposure:.2f}` USDT")
+    if cap_total > 0:
+        used = sum(s["exposure"] for s in capped)
+        msg_lines.append(f"• Utilização de capital: `{used / cap_total * 100:.1f}%` de `{cap_total:.2f}` USDT")
     msg_lines.append("")
 
     # Aviso se ainda não houver dados líquidos reais
-    if net["total_trades"] == 0:
+    if grids and total_trades == 0:
         msg_lines.append(
             "ℹ️ *Observação:*\n"
             "Ainda não há registros na tabela `real_profits`.\n"
@@ -0,0 +1,439 @@
+import csv
+import threading
+import time
+
+import ccxt
+
+
+# ==========================================
+# FONTES DE PREÇO (AO VIVO / GRAVADO)
+# ==========================================
+
+class LivePriceFeed:
+    """
+    Alimenta o simulador com o ticker real da Binance (somente dados públicos).
+    O volume negociado entre dois ticks é estimado pela variação do baseVolume 24h.
+    """
+    live = True
+
+    def __init__(self, market_client):
+        self.client = market_client
+        self._last_volume = {}
+
+    def next_tick(self, symbol):
+        t = self.client.fetch_ticker(symbol)
+        last = float(t['last'])
+        volume = float(t.get('baseVolume') or 0.0)
+
+        prev_volume = self._last_volume.get(symbol)
+        self._last_volume[symbol] = volume
+        traded = max(0.0, volume - prev_volume) if prev_volume is not None else 0.0
+
+        return {
+            'timestamp': int(t.get('timestamp') or time.time() * 1000),
+            'last': last,
+            'bid': float(t.get('bid') or last),
+            'ask': float(t.get('ask') or last),
+            'bid_qty': float(t.get('bidVolume') or 0.0),
+            'ask_qty': float(t.get('askVolume') or 0.0),
+            'traded': traded,
+        }
+
+
+class RecordedPriceFeed:
+    """
+    Reproduz ticks gravados (lista de dicts ou CSV).
+    Colunas aceitas: timestamp, last, bid, ask, bid_qty, ask_qty, volume, symbol (opcional).
+    'volume' é o volume negociado desde o tick anterior.
+    Ao final da gravação o último tick é mantido.
+    """
+    live = False
+
+    def __init__(self, ticks):
+        self._ticks = {}
+        for t in ticks:
+            symbol = t.get('symbol') or '*'
+            last = float(t['last'])
+            self._ticks.setdefault(symbol, []).append({
+                'timestamp': int(float(t.get('timestamp') or 0)),
+                'last': last,
+                'bid': float(t.get('bid') or last),
+                'ask': float(t.get('ask') or last),
+                'bid_qty': float(t.get('bid_qty') or 0.0),
+                'ask_qty': float(t.get('ask_qty') or 0.0),
+                'traded': float(t.get('volume') or 0.0),
+            })
+        self._pos = {}
+
+    @classmethod
+    def from_csv(cls, path):
+        with open(path, newline='') as f:
+            return cls(list(csv.DictReader(f)))
+
+    def next_tick(self, symbol):
+        key = symbol if symbol in self._ticks else '*'
+        ticks = self._ticks.get(key)
+        if not ticks:
+            raise ccxt.BadSymbol(f"Sem dados gravados para {symbol}")
+
+        pos = self._pos.get(key, 0)
+        tick = ticks[min(pos, len(ticks) - 1)]
+        self._pos[key] = pos + 1
+        return dict(tick)
+
+    def exhausted(self, symbol):
+        key = symbol if symbol in self._ticks else '*'
+        return self._pos.get(key, 0) >= len(self._ticks.get(key, []))
+
+
+# ==========================================
+# EXCHANGE SIMULADA (MOTOR DE CASAMENTO LOCAL)
+# ==========================================
+
+class SimExchange:
+    """
+    Exchange em processo que implementa os métodos ccxt usados pelo GridBot e TrendBot:
+    fetch_ticker, fetch_balance, create_limit_*, create_market_*, fetch_order, cancel_order.
+
+    - Livro próprio com as nossas ordens (posição na fila por nível de preço)
+    - Execução parcial: ao tocar o nível, o volume negociado consome primeiro a fila à frente
+    - Preço atravessando o nível -> execução total como maker
+    - Ordens marketable / a mercado -> taker no melhor preço do outro lado
+    - Saldo virtual com taxas maker/taker (cobradas no ativo recebido, como na Binance)
+    - Latência configurável por chamada
+    Metadados de mercado (load_markets, precisão, fetch_ohlcv) vêm do cliente real.
+    """
+
+    def __init__(self, market_client, feed, balances=None, maker_fee=0.001, taker_fee=0.001,
+                 latency_ms=0, queue_ahead_qty=0.0):
+        self.client = market_client
+        self.feed = feed
+        self.maker_fee = float(maker_fee)
+        self.taker_fee = float(taker_fee)
+        self.latency = float(latency_ms) / 1000.0
+        self.queue_ahead_qty = float(queue_ahead_qty)
+
+        self.free = {k: float(v) for k, v in (balances or {}).items()}
+        self.used = {k: 0.0 for k in self.free}
+
+        self.orders = {}
+        self.ticks = {}
+        self._seq = 0
+        self._lock = threading.RLock()
+
+    # --------------------------------------
+    # DELEGAÇÃO PARA O CLIENTE DE MERCADO
+    # --------------------------------------
+    def __getattr__(self, name):
+        client = self.__dict__.get('client')
+        if client is None:
+            raise AttributeError(name)
+        return getattr(client, name)
+
+    def amount_to_precision(self, symbol, amount):
+        if self.client is None:
+            return f"{float(amount):.8f}"
+        return self.client.amount_to_precision(symbol, amount)
+
+    def price_to_precision(self, symbol, price):
+        if self.client is None:
+            return f"{float(price):.8f}"
+        return self.client.price_to_precision(symbol, price)
+
+    # --------------------------------------
+    # HELPERS
+    # --------------------------------------
+    def _sleep(self):
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+    def _assets(self, symbol):
+        base, quote = symbol.split('/')
+        return base, quote
+
+    def _move(self, asset, free_delta=0.0, used_delta=0.0):
+        self.free[asset] = self.free.get(asset, 0.0) + free_delta
+        self.used[asset] = self.used.get(asset, 0.0) + used_delta
+
+    def _new_order(self, symbol, type_, side, amount, price):
+        self._seq += 1
+        now = int(time.time() * 1000)
+        order = {
+            'id': f"SIM_{now}_{self._seq}",
+            'clientOrderId': None,
+            'timestamp': now,
+            'datetime': ccxt.Exchange.iso8601(now),
+            'lastTradeTimestamp': None,
+            'symbol': symbol,
+            'type': type_,
+            'side': side,
+            'price': price,
+            'amount': amount,
+            'filled': 0.0,
+            'remaining': amount,
+            'cost': 0.0,
+            'average': None,
+            'status': 'open',
+            'fee': None,
+            'fees': [],
+            'trades': [],
+            'queue_ahead': 0.0,
+        }
+        return order
+
+    def _public(self, order):
+        out = dict(order)
+        out.pop('queue_ahead', None)
+        out['fees'] = [dict(f) for f in order['fees']]
+        out['fee'] = dict(order['fee']) if order['fee'] else None
+        return out
+
+    def _fill(self, order, qty, price, maker, ts):
+        """
+        Executa qty da ordem ao preço informado e atualiza saldos e taxas.
+        """
+        if qty <= 0:
+            return
+        base, quote = self._assets(order['symbol'])
+        rate = self.maker_fee if maker else self.taker_fee
+        cost = qty * price
+
+        if order['side'] == 'buy':
+            # Libera a reserva ao preço limite e debita o custo real
+            reserved = qty * (order['price'] if order['type'] == 'limit' else price)
+            self._move(quote, free_delta=reserved - cost, used_delta=-reserved)
+            fee_cost, fee_currency = qty * rate, base
+            self._move(base, free_delta=qty - fee_cost)
+        else:
+            self._move(base, used_delta=-qty)
+            fee_cost, fee_currency = cost * rate, quote
+            self._move(quote, free_delta=cost - fee_cost)
+
+        order['filled'] += qty
+        order['remaining'] = max(0.0, order['amount'] - order['filled'])
+        order['cost'] += cost
+        order['average'] = order['cost'] / order['filled']
+        order['lastTradeTimestamp'] = ts
+        order['trades'].append({
+            'timestamp': ts, 'price': price, 'amount': qty, 'cost': cost,
+            'takerOrMaker': 'maker' if maker else 'taker',
+            'fee': {'cost': fee_cost, 'currency': fee_currency},
+        })
+
+        if order['fees']:
+            order['fees'][0]['cost'] += fee_cost
+        else:
+            order['fees'].append({'cost': fee_cost, 'currency': fee_currency})
+        order['fee'] = dict(order['fees'][0])
+
+        if order['remaining'] <= 1e-12:
+            order['remaining'] = 0.0
+            order['status'] = 'closed'
+
+    def _match(self, symbol, tick):
+        """
+        Casa as ordens limite abertas contra o tick recebido.
+        """
+        for order in self.orders.values():
+            if order['symbol'] != symbol or order['status'] != 'open' or order['type'] != 'limit':
+                continue
+
+            level = order['price']
+            if order['side'] == 'buy':
+                crossed = tick['last'] < level or tick['ask'] < level
+                touched = tick['last'] == level
+            else:
+                crossed = tick['last'] > level or tick['bid'] > level
+                touched = tick['last'] == level
+
+            if crossed:
+                self._fill(order, order['remaining'], level, True, tick['timestamp'])
+            elif touched and tick['traded'] > 0:
+                # Volume no nível consome primeiro a fila à frente
+                available = tick['traded'] - order['queue_ahead']
+                order['queue_ahead'] = max(0.0, order['queue_ahead'] - tick['traded'])
+                if available > 0:
+                    self._fill(order, min(available, order['remaining']), level, True, tick['timestamp'])
+
+    def _advance(self, symbol):
+        tick = self.feed.next_tick(symbol)
+        self.ticks[symbol] = tick
+        self._match(symbol, tick)
+        return tick
+
+    def _current(self, symbol):
+        if self.feed.live or symbol not in self.ticks:
+            return self._advance(symbol)
+        return self.ticks[symbol]
+
+    # --------------------------------------
+    # API ccxt
+    # --------------------------------------
+    def fetch_ticker(self, symbol, params=None):
+        self._sleep()
+        with self._lock:
+            tick = self._advance(symbol)
+        return {
+            'symbol': symbol,
+            'timestamp': tick['timestamp'],
+            'last': tick['last'],
+            'close': tick['last'],
+            'bid': tick['bid'],
+            'ask': tick['ask'],
+            'bidVolume': tick['bid_qty'],
+            'askVolume': tick['ask_qty'],
+        }
+
+    def fetch_order_book(self, symbol, limit=None, params=None):
+        self._sleep()
+        with self._lock:
+            tick = self._current(symbol)
+        return {
+            'symbol': symbol,
+            'timestamp': tick['timestamp'],
+            'nonce': None,
+            'bids': [[tick['bid'], tick['bid_qty']]],
+            'asks': [[tick['ask'], tick['ask_qty']]],
+        }
+
+    def fetch_balance(self, params=None):
+        self._sleep()
+        with self._lock:
+            assets = set(self.free) | set(self.used)
+            balance = {'free': {}, 'used': {}, 'total': {}}
+            for a in assets:
+                free, used = self.free.get(a, 0.0), self.used.get(a, 0.0)
+                balance['free'][a] = free
+                balance['used'][a] = used
+                balance['total'][a] = free + used
+                balance[a] = {'free': free, 'used': used, 'total': free + used}
+        return balance
+
+    def create_order(self, symbol, type, side, amount, price=None, params=None):
+        self._sleep()
+        amount = float(amount)
+        side = side.lower()
+        base, quote = self._assets(symbol)
+
+        with self._lock:
+            tick = self._current(symbol)
+            if type == 'limit':
+                price = float(price)
+                marketable = (side == 'buy' and price >= tick['ask']) or (side == 'sell' and price <= tick['bid'])
+            else:
+                price = tick['ask'] if side == 'buy' else tick['bid']
+                marketable = True
+
+            # Como na Binance: clientOrderId repetido de uma ordem aberta é rejeitado
+            client_id = (params or {}).get('newClientOrderId')
+            if client_id and any(o['clientOrderId'] == client_id and o['status'] == 'open'
+                                 for o in self.orders.values()):
+                raise ccxt.InvalidOrder(f"Duplicate order sent. ({client_id})")
+
+            # Post-only (LIMIT_MAKER): a Binance rejeita a ordem que executaria na hora
+            if marketable and type == 'limit' and params and params.get('postOnly'):
+                raise ccxt.OrderImmediatelyFillable(f"Ordem post-only {side} em {price} cruzaria o livro")
+
+            # Reserva de saldo
+            if side == 'buy':
+                reserve = amount * price
+                if self.free.get(quote, 0.0) < reserve:
+                    raise ccxt.InsufficientFunds(f"Saldo simulado insuficiente de {quote}")
+                self._move(quote, free_delta=-reserve, used_delta=reserve)
+            else:
+                if self.free.get(base, 0.0) < amount:
+                    raise ccxt.InsufficientFunds(f"Saldo simulado insuficiente de {base}")
+                self._move(base, free_delta=-amount, used_delta=amount)
+
+            order = self._new_order(symbol, type, side, amount, price)
+            order['clientOrderId'] = client_id
+
+            if marketable:
+                fill_price = tick['ask'] if side == 'buy' else tick['bid']
+                if side == 'buy' and type == 'limit':
+                    fill_price = min(fill_price, price)
+                self._fill(order, amount, fill_price, False, tick['timestamp'])
+            else:
+                # Entra no fim da fila do nível
+                same_side_qty = tick['bid_qty'] if side == 'buy' else tick['ask_qty']
+                at_touch = price == (tick['bid'] if side == 'buy' else tick['ask'])
+                order['queue_ahead'] = same_side_qty if at_touch and same_side_qty > 0 else self.queue_ahead_qty
+
+            self.orders[order['id']] = order
+            return self._public(order)
+
+    def create_limit_buy_order(self, symbol, amount, price, params=None):
+        return self.create_order(symbol, 'limit', 'buy', amount, price, params)
+
+    def create_limit_sell_order(self, symbol, amount, price, params=None):
+        return self.create_order(symbol, 'limit', 'sell', amount, price, params)
+
+    def create_market_buy_order(self, symbol, amount, params=None):
+        return self.create_order(symbol, 'market', 'buy', amount, None, params)
+
+    def create_market_sell_order(self, symbol, amount, params=None):
+        return self.create_order(symbol, 'market', 'sell', amount, None, params)
+
+    def fetch_order(self, id, symbol=None, params=None):
+        self._sleep()
+        with self._lock:
+            order = self.orders.get(id)
+            if order is None:
+                raise ccxt.OrderNotFound(f"Ordem simulada {id} não encontrada")
+            return self._public(order)
+
+    def fetch_orders(self, symbol=None, since=None, limit=None, params=None):
+        self._sleep()
+        with self._lock:
+            orders = [o for o in self.orders.values()
+                      if (symbol is None or o['symbol'] == symbol) and (since is None or o['timestamp'] >= since)]
+            orders.sort(key=lambda o: o['timestamp'])
+            return [self._public(o) for o in orders[:limit]]
+
+    def cancel_order(self, id, symbol=None, params=None):
+        self._sleep()
+        with self._lock:
+            order = self.orders.get(id)
+            if order is None:
+                raise ccxt.OrderNotFound(f"Ordem simulada {id} não encontrada")
+            if order['status'] != 'open':
+                raise ccxt.OrderNotFound(f"Ordem simulada {id} já está {order['status']}")
+
+            base, quote = self._assets(order['symbol'])
+            if order['side'] == 'buy':
+                reserved = order['remaining'] * order['price']
+                self._move(quote, free_delta=reserved, used_delta=-reserved)
+            else:
+                self._move(base, free_delta=order['remaining'], used_delta=-order['remaining'])
+
+            order['status'] = 'canceled'
+            return self._public(order)
+
+    def fetch_open_orders(self, symbol=None, since=None, limit=None, params=None):
+        return [o for o in self.fetch_orders(symbol, since, None, params) if o['status'] == 'open'][:limit]
+
+    # --------------------------------------
+    # SNAPSHOT (reinício sem perder saldo/ordens simuladas)
+    # --------------------------------------
+    def export_state(self, keep_closed=500):
+        """
+        Saldos, ordens abertas e as últimas `keep_closed` encerradas (para fetch_order pós-reinício).
+        """
+        with self._lock:
+            closed = [o for o in self.orders.values() if o['status'] != 'open']
+            closed.sort(key=lambda o: o['timestamp'])
+            kept = [o for o in self.orders.values() if o['status'] == 'open'] + closed[-keep_closed:]
+            return {
+                'free': dict(self.free),
+                'used': dict(self.used),
+                'orders': [dict(o) for o in kept],
+                'seq': self._seq,
+            }
+
+    def restore_state(self, state):
+        with self._lock:
+            self.free = {k: float(v) for k, v in state['free'].items()}
+            self.used = {k: float(v) for k, v in state['used'].items()}
+            self.orders = {o['id']: dict(o) for o in state['orders']}
+            self._seq = max(self._seq, int(state.get('seq', 0)))
+        return len(self.orders)
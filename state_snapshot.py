@@ -0,0 +1,161 @@
+import hashlib
+import json
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+
+
+# ==========================================
+# SNAPSHOT DO ESTADO EM MEMÓRIA
+# ==========================================
+# Um arquivo por bot com tudo que o loop usa: níveis/ordens do grid, lotes,
+# equity, intenções, metadados do mercado e (em simulação) a exchange simulada.
+# Formato: MAGIC | versão (u16) | sha256 do corpo | zlib(JSON).
+# - captura: no thread do bot (memória + leituras do SQLite local, sem rede)
+# - compressão + escrita atômica (tmp + fsync + rename): thread de fundo
+# - boot: se o SQLite está no mesmo ponto do snapshot, o estado vem do arquivo;
+#   em host novo (DB vazio), o snapshot semeia o DB. Depois, reconciliação
+#   com a exchange confirma as ordens abertas.
+
+MAGIC = b"GBSNAP"
+VERSION = 1
+_HEADER = struct.Struct(">6sH32s")
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+def default_snapshot_path(db_name):
+    return os.path.splitext(db_name)[0] + ".snapshot"
+
+
+def encode_snapshot(state):
+    body = zlib.compress(json.dumps(state, separators=(",", ":"), default=str).encode("utf-8"), 6)
+    return _HEADER.pack(MAGIC, VERSION, hashlib.sha256(body).digest()) + body
+
+
+def decode_snapshot(data):
+    if len(data) < _HEADER.size:
+        raise SnapshotError("arquivo truncado")
+    magic, version, digest = _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise SnapshotError("não é um snapshot")
+    if version != VERSION:
+        raise SnapshotError(f"versão {version} não suportada (esperado {VERSION})")
+    body = data[_HEADER.size:]
+    if hashlib.sha256(body).digest() != digest:
+        raise SnapshotError("checksum inválido")
+    return json.loads(zlib.decompress(body).decode("utf-8"))
+
+
+def write_snapshot(path, state):
+    """
+    Escrita atômica: o arquivo antigo só é substituído quando o novo está completo no disco.
+    Retorna o tamanho gravado.
+    """
+    data = encode_snapshot(state)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return len(data)
+
+
+def read_snapshot(path):
+    """
+    Retorna o estado salvo ou None se o arquivo não existe. SnapshotError se estiver corrompido.
+    """
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    return decode_snapshot(data)
+
+
+class SnapshotWriter:
+    """
+    maybe_capture(collect) roda no thread do bot: a cada `interval` segundos chama
+    collect() e entrega o dict ao thread de escrita (só o snapshot mais recente
+    fica na fila; um mais novo substitui o que ainda não foi gravado).
+    """
+
+    def __init__(self, path, interval, logger, metrics=None):
+        self.path = path
+        self.interval = float(interval)
+        self.logger = logger
+        self._next = 0.0              # primeira captura já na primeira chamada
+        self._queue = queue.Queue(maxsize=1)
+        self._size = self._duration = None
+        if metrics is not None:
+            self._size = metrics.gauge("snapshot_bytes", "Tamanho do último snapshot de estado")
+            self._duration = metrics.histogram("snapshot_write_seconds", "Compressão + escrita do snapshot")
+        self._thread = threading.Thread(target=self._worker, name="snapshot", daemon=True)
+        self._thread.start()
+
+    @property
+    def enabled(self):
+        return bool(self.path) and self.interval > 0
+
+    def maybe_capture(self, collect, force=False):
+        if not self.enabled:
+            return False
+        now = time.monotonic()
+        if not force and now < self._next:
+            return False
+        self._next = now + self.interval
+        self.submit(collect())
+        return True
+
+    def submit(self, state):
+        while True:
+            try:
+                self._queue.put_nowait(state)
+                return
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                    self._queue.task_done()
+                except queue.Empty:
+                    pass
+
+    def _worker(self):
+        while True:
+            state = self._queue.get()
+            if state is None:
+                self._queue.task_done()
+                return
+            started = time.perf_counter()
+            try:
+                size = write_snapshot(self.path, state)
+                if self._size:
+                    self._size.set(size)
+                if self._duration:
+                    self._duration.observe(time.perf_counter() - started)
+            except Exception as e:
+                self.logger.error(f"Erro ao gravar snapshot {self.path}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def flush(self, timeout=5.0):
+        """
+        Aguarda a gravação pendente (ex.: antes de encerrar o processo).
+        """
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def stop(self, timeout=5.0):
+        """
+        Encerra a thread de escrita depois do snapshot pendente (descarte do bot no supervisor).
+        """
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            self.logger.error(f"Snapshot {self.path} ainda gravando ao encerrar; thread de escrita não parada.")
@@ -0,0 +1,232 @@
+import asyncio
+import importlib
+import os
+import signal
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+from accounts import load_accounts
+from http_transport import session_options, shared_session
+from log_setup import setup_logging
+from metrics import MetricsRegistry, start_http_server
+from notifier import TelegramNotifier
+
+
+# ==========================================
+# SUPERVISOR MULTI-CONTA: python supervisor.py
+# ==========================================
+# Um processo para várias sub-contas (accounts.json) no lugar de N cópias dos bots.
+# Cada estratégia de cada conta é um bot comum (GridBot/TrendBot com account=...):
+# start()/step() rodam numa thread própria (código bloqueante: ccxt síncrono e
+# SQLite), e o agendamento — intervalo entre iterações, reinício com backoff
+# após falha, relatório de latência — roda num único event loop asyncio.
+# Isolamento por conta: DATA_DIR próprio (DBs, snapshots, livro de exposição),
+# Session HTTP e orçamento de requisições próprios; uma falha (exceção ou
+# sys.exit na partida) derruba só aquela estratégia, que é recriada.
+
+STRATEGIES = {
+    "grid_btc": ("bot_grid_btc", "GridBot"),
+    "grid_ada": ("bot_grid_ada", "GridBot"),
+    "trend": ("bot_trend", "TrendBot"),
+}
+
+
+class StrategyRunner:
+    def __init__(self, supervisor, account, strategy):
+        self.supervisor = supervisor
+        self.account = account
+        self.strategy = strategy
+        self.labels = {"account": account.name, "strategy": strategy}
+        self.logger = account.logger(strategy)
+        # Uma thread por estratégia: SQLite, profiler e estado do bot sempre na mesma thread
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"{account.name}-{strategy}")
+        self.bot = None
+        self.latencies = []           # iterações desde o último relatório
+
+    # --------------------------------------
+    # NA THREAD DA ESTRATÉGIA
+    # --------------------------------------
+    def _create(self):
+        module, cls = STRATEGIES[self.strategy]
+        bot = None
+        try:
+            # Construtor que falha já fecha o que abriu; falha no start() fecha aqui
+            bot = getattr(importlib.import_module(module), cls)(account=self.account)
+            bot.start()
+        except BaseException as e:
+            if bot is not None:
+                self._close(bot)
+            if isinstance(e, SystemExit):
+                # Os bots encerram o processo em erro fatal de partida; aqui só a estratégia cai
+                raise RuntimeError(f"partida abortada (sys.exit({e.code}))") from None
+            raise
+        return bot
+
+    def _step(self, due):
+        lag = max(0.0, time.monotonic() - due)
+        started = time.perf_counter()
+        delay = self.bot.step()
+        return lag, time.perf_counter() - started, delay
+
+    def _close(self, bot):
+        # Para as threads de fundo do bot e fecha as conexões (TrendBot grava as posições pendentes)
+        try:
+            bot.close()
+        except Exception as e:
+            self.logger.error(f"Erro ao fechar {self.strategy}: {e}")
+
+    def _discard(self):
+        if self.bot is not None:
+            self._close(self.bot)
+        self.bot = None
+
+    # --------------------------------------
+    # NO EVENT LOOP
+    # --------------------------------------
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        sup = self.supervisor
+        backoff = sup.restart_min
+        while True:
+            try:
+                self.bot = await loop.run_in_executor(self.executor, self._create)
+                sup.m_up.set(1, **self.labels)
+                backoff = sup.restart_min
+                due = time.monotonic()
+                while True:
+                    lag, elapsed, delay = await loop.run_in_executor(self.executor, self._step, due)
+                    sup.m_loop.observe(elapsed, **self.labels)
+                    sup.m_lag.observe(lag, **self.labels)
+                    self.latencies.append(elapsed)
+                    due = time.monotonic() + delay
+                    await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                sup.m_up.set(0, **self.labels)
+                sup.m_restarts.inc(**self.labels)
+                msg = f"💥 {self.strategy} da conta {self.account.name} falhou: {e}. Reinício em {backoff:.0f}s."
+                self.logger.error(msg)
+                sup.notify(msg)
+                await loop.run_in_executor(self.executor, self._discard)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, sup.restart_max)
+
+    def take_latencies(self):
+        values, self.latencies = sorted(self.latencies), []
+        return values
+
+
+class Supervisor:
+    def __init__(self, accounts, logger, metrics, notifier=None, report_seconds=300,
+                 restart_min=5, restart_max=300):
+        self.accounts = accounts
+        self.logger = logger
+        self.notifier = notifier
+        self.report_seconds = float(report_seconds)
+        self.restart_min = float(restart_min)
+        self.restart_max = float(restart_max)
+
+        labels = ("account", "strategy")
+        self.m_loop = metrics.histogram("loop_iteration_seconds", "Duração de cada iteração por conta/estratégia", labels)
+        self.m_lag = metrics.histogram(
+            "loop_lag_seconds", "Atraso entre o horário agendado e o início da iteração", labels,
+            buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5),
+        )
+        self.m_up = metrics.gauge("strategy_up", "1 se a estratégia está rodando", labels)
+        self.m_restarts = metrics.counter("strategy_restarts", "Reinícios após falha", labels)
+
+        self.runners = [StrategyRunner(self, a, s) for a in accounts for s in a.strategies]
+
+    def notify(self, message):
+        if self.notifier is not None:
+            self.notifier.send(message)
+
+    def report(self):
+        """
+        Uma linha por conta: p50/máximo da iteração de cada estratégia desde o último relatório.
+        """
+        by_account = {}
+        for runner in self.runners:
+            values = runner.take_latencies()
+            if values:
+                text = (
+                    f"{runner.strategy} p50 {values[len(values) // 2] * 1000:.0f}ms "
+                    f"máx {values[-1] * 1000:.0f}ms ({len(values)} it.)"
+                )
+            else:
+                text = f"{runner.strategy} parado"
+            by_account.setdefault(runner.account.name, []).append(text)
+        for name, parts in by_account.items():
+            self.logger.info(f"⏱️ Latência do loop | conta {name}: {' · '.join(parts)}")
+
+    async def _report_loop(self):
+        while True:
+            await asyncio.sleep(self.report_seconds)
+            self.report()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        tasks = [asyncio.create_task(r.run(), name=f"{r.account.name}/{r.strategy}") for r in self.runners]
+        if self.report_seconds > 0:
+            tasks.append(asyncio.create_task(self._report_loop(), name="report"))
+
+        stop = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except (NotImplementedError, RuntimeError):
+                pass
+
+        summary = ", ".join(f"{a.name} ({'+'.join(a.strategies)})" for a in self.accounts)
+        self.logger.info(f"Supervisor iniciado | contas: {summary}")
+        self.notify(f"🚀 Supervisor iniciado | contas: {summary}")
+        try:
+            await stop.wait()
+        finally:
+            self.logger.info("Encerrando supervisor (aguardando as iterações em andamento)...")
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            for runner in self.runners:
+                runner.executor.shutdown(wait=True, cancel_futures=True)
+
+
+def main():
+    load_dotenv(dotenv_path=".env", override=True)
+    logger = setup_logging("Supervisor", os.getenv("SUPERVISOR_LOG_FILE", "supervisor.log"))
+
+    metrics = MetricsRegistry(prefix="supervisor_")
+    accounts_file = os.getenv("ACCOUNTS_FILE", "accounts.json")
+    try:
+        accounts = load_accounts(accounts_file, STRATEGIES, metrics)
+    except (OSError, ValueError) as e:
+        logger.error(f"Erro ao carregar contas ({accounts_file}): {e}")
+        sys.exit(1)
+
+    metrics_port = int(os.getenv("SUPERVISOR_METRICS_PORT", 9105))
+    if metrics_port:
+        try:
+            start_http_server(metrics, metrics_port)
+            logger.info(f"Métricas em http://127.0.0.1:{metrics_port}/metrics")
+        except OSError as e:
+            logger.error(f"Não foi possível abrir o endpoint de métricas: {e}")
+
+    notifier = TelegramNotifier(
+        os.getenv("TELEGRAM_TOKEN"), os.getenv("TELEGRAM_CHAT_ID"), logger, prefix="[SUPERVISOR] ", metrics=metrics,
+        session=shared_session("telegram", metrics, **session_options(os.environ)),
+    )
+    supervisor = Supervisor(
+        accounts, logger, metrics, notifier,
+        report_seconds=float(os.getenv("SUPERVISOR_REPORT_SECONDS", 300)),
+        restart_min=float(os.getenv("SUPERVISOR_RESTART_MIN_SECONDS", 5)),
+        restart_max=float(os.getenv("SUPERVISOR_RESTART_MAX_SECONDS", 300)),
+    )
+    asyncio.run(supervisor.run())
+
+
+if __name__ == "__main__":
+    main()
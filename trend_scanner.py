@@ -0,0 +1,431 @@
+import argparse
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+
+
+# ==========================================
+# SCANNER MULTI-PAR DO TREND BOT
+# ==========================================
+# Varre centenas de pares USDT de uma vez:
+# - candles num SQLite local (CandleStore); cada varredura só busca o que falta
+#   (fetch_ohlcv com since), em paralelo limitado (TREND_SCAN_CONCURRENCY)
+# - indicadores em matrizes pares × tempo (NumPy): o laço é no tempo, cada passo
+#   atualiza todos os pares juntos — mesmas fórmulas do `ta` e do SuperTrend do
+#   TrendBot (EMA-200, ADX-14, ATR e bandas que "não recuam")
+# - ranking: sinais de compra (virada do SuperTrend com ADX acima do limite)
+#   primeiro, depois tendências de alta acima da EMA-200, por ADX
+#
+# Uso avulso: python trend_scanner.py [--top 20] [--no-fetch]
+
+STABLE_BASES = frozenset({
+    "USDC", "FDUSD", "TUSD", "BUSD", "DAI", "USDP", "PAX", "UST", "USTC", "USDE", "USD1",
+    "EUR", "EURI", "AEUR", "GBP",
+})
+
+TIMEFRAME_UNITS = {"m": 60, "h": 3600, "d": 86400, "w": 604800, "M": 2592000}
+MAX_FETCH_LIMIT = 1000
+
+
+def timeframe_seconds(timeframe):
+    return int(timeframe[:-1]) * TIMEFRAME_UNITS[timeframe[-1]]
+
+
+# ==========================================
+# UNIVERSO DE PARES
+# ==========================================
+
+def usdt_universe(markets, quote="USDT"):
+    """
+    Pares spot ativos cotados em `quote`, sem stablecoins/moedas fiduciárias na base.
+    """
+    return sorted(
+        symbol for symbol, m in markets.items()
+        if m.get("spot", True) and m.get("active") is not False
+        and m.get("quote") == quote and m.get("base") not in STABLE_BASES
+    )
+
+
+def top_by_volume(exchange, symbols, n):
+    """
+    Os `n` pares de maior volume em quote nas últimas 24h (um fetch_tickers para todos).
+    """
+    tickers = exchange.fetch_tickers()
+    volume = {s: float((tickers.get(s) or {}).get("quoteVolume") or 0.0) for s in symbols}
+    return sorted(symbols, key=lambda s: volume[s], reverse=True)[:n]
+
+
+# ==========================================
+# ARMAZÉM LOCAL DE CANDLES
+# ==========================================
+
+class CandleStore:
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS candles (
+                symbol TEXT,
+                timeframe TEXT,
+                ts INTEGER,
+                open REAL,
+                high REAL,
+                low REAL,
+                close REAL,
+                volume REAL,
+                PRIMARY KEY (symbol, timeframe, ts)
+            ) WITHOUT ROWID
+        ''')
+        self.conn.commit()
+
+    def last_timestamps(self, timeframe):
+        cur = self.conn.execute(
+            "SELECT symbol, MAX(ts) FROM candles WHERE timeframe=? GROUP BY symbol", (timeframe,)
+        )
+        return dict(cur.fetchall())
+
+    def save(self, symbol, timeframe, rows):
+        # O último candle ainda está aberto: a próxima busca o sobrescreve
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO candles VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(symbol, timeframe, int(r[0]), r[1], r[2], r[3], r[4], r[5]) for r in rows],
+        )
+
+    def prune(self, timeframe, before_ts):
+        self.conn.execute("DELETE FROM candles WHERE timeframe=? AND ts < ?", (timeframe, int(before_ts)))
+
+    def commit(self):
+        self.conn.commit()
+
+    def load(self, symbols, timeframe, limit):
+        """
+        Últimos `limit` candles de cada par, em ordem cronológica: {symbol: [[ts, o, h, l, c, v], ...]}.
+        """
+        wanted = set(symbols)
+        latest = self.conn.execute("SELECT MAX(ts) FROM candles WHERE timeframe=?", (timeframe,)).fetchone()[0]
+        if latest is None:
+            return {}
+        # Faixa de ts pela chave primária (mais barato que ROW_NUMBER por par)
+        since = latest - (int(limit) - 1) * timeframe_seconds(timeframe) * 1000
+        cur = self.conn.execute(
+            "SELECT symbol, ts, open, high, low, close, volume FROM candles "
+            "WHERE timeframe=? AND ts >= ? ORDER BY symbol, ts", (timeframe, since),
+        )
+        data = {}
+        for row in cur:
+            if row[0] in wanted:
+                data.setdefault(row[0], []).append(row[1:])
+        return data
+
+    def history(self, symbol, timeframe, since=0):
+        cur = self.conn.execute(
+            "SELECT ts, open, high, low, close, volume FROM candles "
+            "WHERE symbol=? AND timeframe=? AND ts >= ? ORDER BY ts", (symbol, timeframe, int(since)),
+        )
+        return cur.fetchall()
+
+    def close(self):
+        self.conn.close()
+
+
+def align(candles, length):
+    """
+    Matrizes pares × tempo com os últimos `length` candles. Ficam de fora pares com
+    histórico curto ou parados (último candle anterior ao mais recente do conjunto).
+    Retorna (symbols, ohlcv) com ohlcv no formato (campo, par, tempo).
+    """
+    latest = max((rows[-1][0] for rows in candles.values() if rows), default=None)
+    symbols = sorted(s for s, rows in candles.items() if len(rows) >= length and rows[-1][0] == latest)
+    if not symbols:
+        return [], np.empty((6, 0, length))
+    data = np.array([candles[s][-length:] for s in symbols], dtype=float)
+    return symbols, np.moveaxis(data, 2, 0)
+
+
+# ==========================================
+# INDICADORES VETORIZADOS (PARES × TEMPO)
+# ==========================================
+# Todas as funções recebem matrizes (pares, tempo) sem NaN e reproduzem o
+# `ta` (EMAIndicator, AverageTrueRange, ADXIndicator) e o
+# TrendBot.calculate_supertrend candle a candle.
+
+def ema(close, window):
+    alpha = 2.0 / (window + 1)
+    out = np.empty_like(close)
+    out[:, 0] = close[:, 0]
+    for t in range(1, close.shape[1]):
+        out[:, t] = out[:, t - 1] + alpha * (close[:, t] - out[:, t - 1])
+    out[:, :window - 1] = np.nan
+    return out
+
+
+def true_range(high, low, close):
+    tr = high - low
+    prev = close[:, :-1]
+    tr[:, 1:] = np.maximum(tr[:, 1:], np.maximum(np.abs(high[:, 1:] - prev), np.abs(low[:, 1:] - prev)))
+    return tr
+
+
+def atr(high, low, close, window):
+    tr = true_range(high, low, close)
+    out = np.zeros_like(tr)
+    out[:, window - 1] = tr[:, :window].mean(axis=1)
+    for t in range(window, tr.shape[1]):
+        out[:, t] = (out[:, t - 1] * (window - 1) + tr[:, t]) / window
+    return out
+
+
+def _wilder_sum(values, window, length):
+    # Soma suavizada do ta: começa com a soma dos `window` primeiros valores (após o 1º candle)
+    out = np.zeros((values.shape[0], length))
+    out[:, 0] = values[:, 1:window + 1].sum(axis=1)
+    for i in range(1, length - 1):
+        out[:, i] = out[:, i - 1] - out[:, i - 1] / window + values[:, window + i]
+    return out
+
+
+def adx(high, low, close, window=14, with_state=False):
+    """
+    with_state=True devolve também as somas suavizadas (TR, +DM, -DM) do último candle,
+    para o intrabar seguir a série a partir dele.
+    """
+    n = high.shape[1]
+    length = n - (window - 1)
+    tr = true_range(high, low, close)
+
+    up = np.zeros_like(high)
+    down = np.zeros_like(high)
+    up[:, 1:] = high[:, 1:] - high[:, :-1]
+    down[:, 1:] = low[:, :-1] - low[:, 1:]
+    pos = np.where((up > down) & (up > 0), up, 0.0)
+    neg = np.where((down > up) & (down > 0), down, 0.0)
+
+    trs = _wilder_sum(tr, window, length)
+    dip = _wilder_sum(pos, window, length)
+    din = _wilder_sum(neg, window, length)
+
+    nonzero = trs != 0
+    di_pos = np.divide(100 * dip, trs, out=np.zeros_like(trs), where=nonzero)
+    di_neg = np.divide(100 * din, trs, out=np.zeros_like(trs), where=nonzero)
+    total = di_pos + di_neg
+    dx = np.divide(100 * np.abs(di_pos - di_neg), total, out=np.zeros_like(total), where=total != 0)
+
+    smooth = np.zeros_like(dx)
+    smooth[:, window] = dx[:, :window].mean(axis=1)
+    for i in range(window + 1, length):
+        smooth[:, i] = (smooth[:, i - 1] * (window - 1) + dx[:, i - 1]) / window
+    out = np.concatenate([np.zeros((high.shape[0], window - 1)), smooth], axis=1)
+    if with_state:
+        # A última posição das somas fica zerada no ta (não entra no ADX); a anterior é a do último candle
+        return out, (trs[:, -2], dip[:, -2], din[:, -2])
+    return out
+
+
+def supertrend(high, low, close, atr_values, multiplier, with_bands=False):
+    hl2 = (high + low) / 2
+    basic_upper = hl2 + multiplier * atr_values
+    basic_lower = hl2 - multiplier * atr_values
+
+    final_upper = np.zeros_like(close)
+    final_lower = np.zeros_like(close)
+    line = np.zeros_like(close)
+    uptrend = np.ones(close.shape, dtype=bool)
+    for i in range(1, close.shape[1]):
+        prev_upper, prev_lower, prev_close = final_upper[:, i - 1], final_lower[:, i - 1], close[:, i - 1]
+        final_upper[:, i] = np.where(
+            (basic_upper[:, i] < prev_upper) | (prev_close > prev_upper), basic_upper[:, i], prev_upper
+        )
+        final_lower[:, i] = np.where(
+            (basic_lower[:, i] > prev_lower) | (prev_close < prev_lower), basic_lower[:, i], prev_lower
+        )
+        uptrend[:, i] = np.where(uptrend[:, i - 1], close[:, i] >= prev_lower, close[:, i] > prev_upper)
+        line[:, i] = np.where(uptrend[:, i], final_lower[:, i], final_upper[:, i])
+    if with_bands:
+        return line, uptrend, final_upper, final_lower
+    return line, uptrend
+
+
+def compute_indicators(high, low, close, period=10, multiplier=3.0, ema_window=200, adx_window=14, window=None):
+    """
+    window: ATR, SuperTrend e ADX só sobre os últimos `window` candles, a mesma janela
+    em que o TrendBot decide (as sementes de Wilder dependem do início da série);
+    a EMA (só ordenação do ranking) usa a série inteira.
+    """
+    ema_values = ema(close, ema_window)
+    if window:
+        high, low, close = high[:, -window:], low[:, -window:], close[:, -window:]
+    atr_values = atr(high, low, close, period)
+    line, uptrend = supertrend(high, low, close, atr_values, multiplier)
+    return {
+        "ema": ema_values,
+        "adx": adx(high, low, close, adx_window),
+        "atr": atr_values,
+        "supertrend": line,
+        "in_uptrend": uptrend,
+    }
+
+
+def rank(symbols, close, indicators, adx_threshold):
+    """
+    Situação de cada par no último candle, do melhor candidato para o pior:
+    sinal de compra do TrendBot > alta acima da EMA-200 > ADX.
+    """
+    if not symbols:
+        return []
+    price = close[:, -1]
+    up = indicators["in_uptrend"]
+    strength = indicators["adx"][:, -1]
+    line = indicators["supertrend"][:, -1]
+    flip = up[:, -1] & ~up[:, -2]
+    signal = flip & (strength > adx_threshold)
+    with np.errstate(invalid="ignore"):
+        above_ema = price > indicators["ema"][:, -1]
+    trending = up[:, -1] & above_ema
+
+    order = np.lexsort((-strength, ~trending, ~signal))
+    return [
+        {
+            "symbol": symbols[i],
+            "price": float(price[i]),
+            "signal": bool(signal[i]),
+            "in_uptrend": bool(up[i, -1]),
+            "above_ema": bool(above_ema[i]),
+            "adx": float(strength[i]),
+            "supertrend": float(line[i]),
+            "stop_pct": float((price[i] - line[i]) / price[i] * 100),
+            "atr_pct": float(indicators["atr"][i, -1] / price[i] * 100),
+        }
+        for i in order
+    ]
+
+
+# ==========================================
+# SCANNER
+# ==========================================
+
+class TrendScanner:
+    def __init__(self, exchange, store, logger, timeframe="1h", candles=300, concurrency=8,
+                 period=10, multiplier=3.0, adx_threshold=25, ema_window=200, adx_window=14, window=100):
+        self.exchange = exchange
+        self.store = store
+        self.logger = logger
+        self.timeframe = timeframe
+        # window: candles em que o bot decide (fetch_ohlcv limit); candles: guardados (EMA do ranking)
+        self.window = int(window)
+        self.candles = max(int(candles), self.window)
+        self.concurrency = max(1, int(concurrency))
+        self.period = period
+        self.multiplier = multiplier
+        self.adx_threshold = adx_threshold
+        self.ema_window = ema_window
+        self.adx_window = adx_window
+
+    def _fetch(self, symbol, since, now_ms, tf_ms):
+        if since is None or now_ms - since >= self.candles * tf_ms:
+            return self.exchange.fetch_ohlcv(symbol, self.timeframe, limit=self.candles)
+        # Incremental: do último candle gravado (ainda aberto na busca anterior) em diante
+        limit = min(MAX_FETCH_LIMIT, int((now_ms - since) // tf_ms) + 2)
+        return self.exchange.fetch_ohlcv(symbol, self.timeframe, since=int(since), limit=limit)
+
+    def refresh(self, symbols):
+        """
+        Atualiza o armazém com os candles que faltam de cada par. Retorna quantos pares falharam.
+        """
+        tf_ms = timeframe_seconds(self.timeframe) * 1000
+        now_ms = int(time.time() * 1000)
+        last = self.store.last_timestamps(self.timeframe)
+        failed = []
+        # Escritas no SQLite só nesta thread; as threads do pool fazem apenas o I/O de rede
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="scan") as pool:
+            futures = {pool.submit(self._fetch, s, last.get(s), now_ms, tf_ms): s for s in symbols}
+            for future in as_completed(futures):
+                symbol = futures[future]
+                try:
+                    rows = future.result()
+                except Exception as e:
+                    failed.append(symbol)
+                    self.logger.debug(f"Scanner: falha ao buscar {symbol}: {e}")
+                    continue
+                if rows:
+                    self.store.save(symbol, self.timeframe, rows)
+        # Mantém só a janela usada (com folga) para o arquivo não crescer sem limite
+        self.store.prune(self.timeframe, now_ms - 2 * self.candles * tf_ms)
+        self.store.commit()
+        if failed:
+            self.logger.warning(f"Scanner: {len(failed)} par(es) sem candles novos ({', '.join(failed[:5])}...)")
+        return len(failed)
+
+    def scan(self, symbols, fetch=True):
+        started = time.perf_counter()
+        if fetch:
+            self.refresh(symbols)
+        fetched = time.perf_counter()
+
+        names, (_ts, _open, high, low, close, _volume) = align(
+            self.store.load(symbols, self.timeframe, self.candles), self.candles
+        )
+        indicators = compute_indicators(
+            high, low, close, self.period, self.multiplier, self.ema_window, self.adx_window, self.window
+        ) if names else {}
+        ranking = rank(names, close, indicators, self.adx_threshold)
+        finished = time.perf_counter()
+
+        signals = sum(1 for r in ranking if r["signal"])
+        self.logger.info(
+            f"🔎 Scanner: {len(names)}/{len(symbols)} pares em {finished - started:.2f}s "
+            f"(busca {fetched - started:.2f}s, leitura + indicadores {finished - fetched:.3f}s) | {signals} sinal(is)"
+        )
+        return ranking
+
+
+def main():
+    from dotenv import load_dotenv
+
+    from fast_start import ccxt
+    from http_transport import session_options, shared_session, use_session
+    from log_setup import setup_logging
+
+    parser = argparse.ArgumentParser(description="Ranking SuperTrend + ADX dos pares USDT")
+    parser.add_argument("--top", type=int, default=20, help="linhas exibidas")
+    parser.add_argument("--no-fetch", action="store_true", help="usa só os candles já gravados")
+    parser.add_argument("--symbols", help="lista separada por vírgula (padrão: pares USDT por volume)")
+    args = parser.parse_args()
+
+    load_dotenv()
+    logger = setup_logging("TrendScanner", os.getenv("TREND_SCANNER_LOG_FILE", "trend_scanner.log"), prefix="[SCAN] ")
+    exchange = ccxt.binance({'enableRateLimit': True, 'options': {'defaultType': 'spot'}})
+    use_session(exchange, shared_session("binance", **session_options(os.environ)))
+
+    store = CandleStore(os.getenv("TREND_CANDLE_DB", os.path.join(os.getenv("DATA_DIR", ""), "candles.db")))
+    scanner = TrendScanner(
+        exchange, store, logger,
+        timeframe=os.getenv("TREND_TIMEFRAME", "1h"),
+        candles=int(os.getenv("TREND_SCAN_CANDLES", 300)),
+        concurrency=int(os.getenv("TREND_SCAN_CONCURRENCY", 8)),
+    )
+    if args.symbols:
+        symbols = [s.strip() for s in args.symbols.split(",") if s.strip()]
+    elif args.no_fetch:
+        symbols = list(store.last_timestamps(scanner.timeframe))
+    else:
+        symbols = usdt_universe(exchange.load_markets())
+        top_volume = int(os.getenv("TREND_SCAN_TOP_VOLUME", 200))
+        if top_volume:
+            symbols = top_by_volume(exchange, symbols, top_volume)
+
+    ranking = scanner.scan(symbols, fetch=not args.no_fetch)
+    for r in ranking[:args.top]:
+        flag = "COMPRA" if r["signal"] else ("alta" if r["in_uptrend"] else "baixa")
+        print(
+            f"{r['symbol']:<14} {r['price']:>14.6g}  {flag:<7} ADX {r['adx']:5.1f}  "
+            f"EMA200 {'acima' if r['above_ema'] else 'abaixo'}  stop {r['stop_pct']:5.2f}%  ATR {r['atr_pct']:.2f}%"
+        )
+    store.close()
+
+
+if __name__ == "__main__":
+    main()